@@ -19,7 +19,7 @@ IMAGE_NAME="ljexport:${GIT_COMMIT}"
 # -----------------------------------------------------------------------------
 usage() {
   cat <<EOF
-Usage: $0 [--dest DIR] [--start YYYY-MM] [--end YYYY-MM] [--clear] [--debug LEVEL] [--no-bw-auto] [--run-tests]   or   $0 DIR
+Usage: $0 [--dest DIR] [--start YYYY-MM] [--end YYYY-MM] [--clear] [--debug LEVEL] [--profile] [--sync] [--offline] [--no-bw-auto] [--run-tests]   or   $0 DIR
 
 Options
   -d, --dest DIR     Host directory where the archive will be written
@@ -28,6 +28,9 @@ Options
   --clear            Delete all contents of the destination folder before backup (for testing),
                     and remove all Docker images/containers with ljexport:* to avoid caching issues
   --debug LEVEL      Set debug level (0=quiet, 1=info, 2=verbose, 3=debug)
+  --profile          Write per-stage cProfile/tracemalloc reports to DEST/profile/
+  --sync             Only fetch posts created/edited since the previous backup in DEST
+  --offline          Rebuild every output from DEST/batch-downloads/ without logging in
   --no-bw-auto       Don't automatically select the only LiveJournal credential from Bitwarden
   --run-tests        Run unit tests before starting the backup
   -h, --help         Show this help and exit
@@ -41,6 +44,9 @@ START_MONTH=""
 END_MONTH=""
 CLEAR_DEST=0
 DEBUG_LEVEL=0
+PROFILE_CLI=0
+SYNC_CLI=0
+OFFLINE_CLI=0
 BW_AUTO_SELECT=1  # Default to true
 RUN_TESTS=0      # Default to false
 while [[ $# -gt 0 ]]; do
@@ -50,6 +56,9 @@ while [[ $# -gt 0 ]]; do
     -e|--end) END_MONTH="$2"; shift 2 ;;
     --clear) CLEAR_DEST=1; shift ;;
     --debug) DEBUG_LEVEL="$2"; shift 2 ;;
+    --profile) PROFILE_CLI=1; shift ;;
+    --sync) SYNC_CLI=1; shift ;;
+    --offline) OFFLINE_CLI=1; shift ;;
     --no-bw-auto) BW_AUTO_SELECT=0; shift ;;
     --run-tests) RUN_TESTS=1; shift ;;
     -h|--help) usage ;;
@@ -77,9 +86,27 @@ DEST="${DEST:-}" # DEST is the main output directory
 START="${START:-}" # Start month (YYYY-MM)
 END="${END:-}"     # End month (YYYY-MM)
 FORMAT="${FORMAT:-json}"
+JOBS="${JOBS:-1}"
 CLEAR="${CLEAR:-false}"
 DEBUG_LEVEL="${DEBUG_LEVEL:-0}"
 RUN_TESTS="${RUN_TESTS:-false}"
+PROFILE="${PROFILE:-false}"
+SYNC="${SYNC:-false}"
+OFFLINE="${OFFLINE:-false}"
+HTTP_RETRIES="${HTTP_RETRIES:-4}"
+DEAD_MEDIA_RECHECK_DAYS="${DEAD_MEDIA_RECHECK_DAYS:-30}"
+EMPTY_MONTH_RECHECK_DAYS="${EMPTY_MONTH_RECHECK_DAYS:-30}"
+MEDIA_MAX_MB="${MEDIA_MAX_MB:-100}"
+API_MAX_KBPS="${API_MAX_KBPS:-0}"
+MEDIA_MAX_KBPS="${MEDIA_MAX_KBPS:-0}"
+MEDIA_WORKERS="${MEDIA_WORKERS:-8}"
+MEDIA_PER_HOST="${MEDIA_PER_HOST:-2}"
+# Output below is piped line by line, so default to single-line status updates
+PROGRESS_MODE="${PROGRESS_MODE:-line}"
+PROGRESS_INTERVAL="${PROGRESS_INTERVAL:-30}"
+[[ $PROFILE_CLI -eq 1 ]] && PROFILE=true
+[[ $SYNC_CLI -eq 1 ]] && SYNC=true
+[[ $OFFLINE_CLI -eq 1 ]] && OFFLINE=true
 
 # Handle BW_AUTO_SELECT from .env if not set by CLI
 if [[ -n "${BW_AUTO_SELECT:-}" ]]; then
@@ -105,7 +132,8 @@ if [[ $DEBUG_LEVEL -eq 3 ]]; then
 fi
 
 # 2. Pull creds from Bitwarden (same logic as before) ------------------------
-if [[ -z "$LJ_USER" || -z "$LJ_PASS" ]]; then
+# An offline rebuild never logs in, so it needs no password
+if [[ "$OFFLINE" != "true" && ( -z "$LJ_USER" || -z "$LJ_PASS" ) ]]; then
   if command -v bw >/dev/null 2>&1 && command -v jq >/dev/null 2>&1; then
     echo "Bitwarden CLI detected."
     BW_FLAGS=()
@@ -144,8 +172,10 @@ if [[ -z "$LJ_USER" || -z "$LJ_PASS" ]]; then
 fi
 
 # 3. Final interactive fallback ---------------------------------------------
-[[ -z "$LJ_USER" ]] && read -rp "LiveJournal username: " LJ_USER
-[[ -z "$LJ_PASS" ]] && { read -rsp "LiveJournal password (app-password if 2-FA): " LJ_PASS; echo; }
+if [[ "$OFFLINE" != "true" ]]; then
+  [[ -z "$LJ_USER" ]] && read -rp "LiveJournal username: " LJ_USER
+  [[ -z "$LJ_PASS" ]] && { read -rsp "LiveJournal password (app-password if 2-FA): " LJ_PASS; echo; }
+fi
 
 # 4. Resolve backup directory ------------------------------------------------
 if [[ -n "$BACKUP_DIR_CLI" ]]; then
@@ -209,7 +239,21 @@ if ! docker run --rm -it \
   -e START_MONTH="$START" \
   -e END_MONTH="$END" \
   -e FORMAT="$FORMAT" \
+  -e JOBS="$JOBS" \
   -e DEBUG_LEVEL="$DEBUG_LEVEL" \
+  -e PROFILE="$PROFILE" \
+  -e SYNC="$SYNC" \
+  -e OFFLINE="$OFFLINE" \
+  -e HTTP_RETRIES="$HTTP_RETRIES" \
+  -e DEAD_MEDIA_RECHECK_DAYS="$DEAD_MEDIA_RECHECK_DAYS" \
+  -e EMPTY_MONTH_RECHECK_DAYS="$EMPTY_MONTH_RECHECK_DAYS" \
+  -e MEDIA_MAX_MB="$MEDIA_MAX_MB" \
+  -e API_MAX_KBPS="$API_MAX_KBPS" \
+  -e MEDIA_MAX_KBPS="$MEDIA_MAX_KBPS" \
+  -e MEDIA_WORKERS="$MEDIA_WORKERS" \
+  -e MEDIA_PER_HOST="$MEDIA_PER_HOST" \
+  -e PROGRESS_MODE="$PROGRESS_MODE" \
+  -e PROGRESS_INTERVAL="$PROGRESS_INTERVAL" \
   -e PYTHONUNBUFFERED=1 \
   -e RUN_TESTS="$RUN_TESTS" \
   -v "$BACKUP_DIR":/backup \
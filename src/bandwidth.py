@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""bandwidth.py
+
+Global bytes-per-second caps, so a backup can run on a shared link without
+saturating it.
+
+There are two budgets, shared by every thread in the process:
+
+    api     LiveJournal API responses (posts, comments, userpic lookups)
+    media   images and userpics, charged chunk by chunk while streaming
+
+``API_MAX_KBPS`` and ``MEDIA_MAX_KBPS`` (env, KB/s) set them; unset or 0
+means unlimited. Each budget is a token bucket holding at most one second
+of traffic: a caller that takes more than is available goes into debt and
+sleeps until the bucket has refilled, so concurrent downloads share the
+budget instead of each getting the full rate.
+"""
+
+# NOTE: This script is now located in src/ and is intended to be run as a module or via Docker.
+# All code is commented for clarity for junior developers.
+
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+from typing import Dict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+BUDGET_ENV = {"api": "API_MAX_KBPS", "media": "MEDIA_MAX_KBPS"}
+
+
+class TokenBucket:
+    def __init__(self, rate: float, sleep=time.sleep, clock=time.monotonic):
+        self.rate = rate  # bytes per second; 0 = unlimited
+        self.sleep = sleep
+        self.clock = clock
+        self.tokens = rate
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def consume(self, nbytes: int) -> float:
+        """Charge *nbytes* to the budget, sleeping if it is overdrawn; returns the wait."""
+        if not self.rate or nbytes <= 0:
+            return 0.0
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= nbytes
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait:
+            self.sleep(wait)
+        return wait
+
+
+_buckets: Dict[str, TokenBucket] = {}
+_lock = threading.Lock()
+
+
+def budget(kind: str) -> TokenBucket:
+    """The process-wide bucket for "api" or "media", sized from the environment."""
+    with _lock:
+        if kind not in _buckets:
+            kbps = float(os.environ.get(BUDGET_ENV[kind]) or 0)
+            if kbps:
+                logger.info("Limiting %s traffic to %s KB/s", kind, kbps)
+            _buckets[kind] = TokenBucket(kbps * 1024)
+        return _buckets[kind]
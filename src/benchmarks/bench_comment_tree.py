@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""bench_comment_tree.py
+
+Benchmark comment tree building, HTML rendering and JSON encoding on
+synthetic threads:
+
+    deep    one long back-and-forth reply chain
+    wide    thousands of top-level replies to one post
+    bushy   random tree (each reply picks a random earlier comment as parent)
+
+Usage:
+    python src/benchmarks/bench_comment_tree.py [--size N]
+"""
+
+# NOTE: This script is now located in src/ and is intended to be run as a module or via Docker.
+# All code is commented for clarity for junior developers.
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import export
+
+
+def make_thread(shape, size):
+    """Return {id: comment} for a synthetic thread of the given shape."""
+    rng = random.Random(42)
+    comments = {}
+    for cid in range(1, size + 1):
+        c = {"id": cid, "jitemid": 1, "author": f"user{cid % 50}", "subject": "re", "body": f"reply {cid}\nsecond line"}
+        if cid > 1:
+            if shape == "deep":
+                c["parentid"] = cid - 1
+            elif shape == "bushy":
+                c["parentid"] = rng.randint(1, cid - 1)
+        comments[cid] = c
+    return comments
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - t0
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark comment tree build/render on synthetic threads.")
+    p.add_argument("--size", type=int, default=3000, help="comments per thread")
+    a = p.parse_args()
+
+    print(f"{'shape':8s} {'nest':>9s} {'html':>9s} {'json':>9s}")
+    for shape in ("deep", "wide", "bushy"):
+        tree, t_nest = timed(export.nest_comments, make_thread(shape, a.size))
+        _, t_html = timed(export.comments_to_html, tree)
+        _, t_json = timed(export.json_dumps_tree, tree)
+        print(f"{shape:8s} {t_nest * 1000:7.1f}ms {t_html * 1000:7.1f}ms {t_json * 1000:7.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
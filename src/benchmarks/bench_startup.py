@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""bench_startup.py
+
+Measure interpreter start-up time of the exporter's entry points.
+
+Each command is launched as a fresh python process several times and the
+median wall time is reported, next to a bare ``python -c pass`` baseline.
+Heavy modules that were imported are listed so regressions are easy to spot.
+
+Usage:
+    python src/benchmarks/bench_startup.py [--runs N]
+"""
+
+# NOTE: This script is now located in src/ and is intended to be run as a module or via Docker.
+# All code is commented for clarity for junior developers.
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("requests", "html2text", "markdown", "bs4", "lxml", "dateutil", "tqdm")
+
+CASES = {
+    "baseline (python -c pass)": [sys.executable, "-c", "pass"],
+    "export.py --help": [sys.executable, os.path.join(SRC_DIR, "export.py"), "--help"],
+    "grab_images.py --help": [sys.executable, os.path.join(SRC_DIR, "grab_images.py"), "--help"],
+    "import export": [sys.executable, "-c", "import export"],
+}
+
+
+def time_command(cmd, runs):
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        subprocess.run(cmd, cwd=SRC_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples)
+
+
+def heavy_imports(module):
+    """Return the heavy third-party modules pulled in by importing *module*."""
+    code = (
+        f"import sys, {module}; "
+        f"print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], cwd=SRC_DIR, capture_output=True, text=True, check=True)
+    return out.stdout.strip() or "none"
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark start-up time of the exporter CLIs.")
+    p.add_argument("--runs", type=int, default=10)
+    a = p.parse_args()
+
+    for name, cmd in CASES.items():
+        print(f"{name:30s} {time_command(cmd, a.runs) * 1000:8.1f} ms")
+    print(f"{'heavy modules after import export':30s} {heavy_imports('export')}")
+
+
+if __name__ == "__main__":
+    main()
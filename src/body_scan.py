@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""body_scan.py
+
+One pass over a post (or comment) body that collects everything later
+stages need to know about it:
+
+    images       <img src> URLs, in order, equivalent spellings collapsed
+    image_links  other image-looking URLs (bare text, <a href="...jpg">)
+    users        journals named by <lj user=...> / <lj comm=...>
+    links        links to journal entries: {"url", "journal", "ditemid"} or
+                 {"url", "journal", "itemid"} (talkread/talkpost ?itemid= form),
+                 plus "thread" when the link targets a comment
+    embeds       <lj-embed>, <iframe>, <embed>, <object>: {"tag", "src"}
+
+``scan_body()`` walks the text once with a single tokenizer regex instead of
+a separate regex (or a BeautifulSoup parse) per question. ``post_meta()``
+merges the records for a post and its comments; export.py stores it in
+post.json as ``meta`` so grab_images and later rewrites don't rescan.
+``rewrite_images()`` and ``rewrite_links()`` swap ``<img src>`` / ``<a href>``
+values, also in a single pass.
+"""
+
+# NOTE: This script is now located in src/ and is intended to be run as a module or via Docker.
+# All code is commented for clarity for junior developers.
+
+from __future__ import annotations
+
+import html
+import os
+import re
+import sys
+from typing import Iterable, Optional
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from media_index import canonical_url
+
+# Every construct we care about, in one alternation: the tags by name, or a
+# bare image URL in text. Tag attributes are consumed with the tag, so a URL
+# inside <img src="..."> is not seen again as a bare URL.
+TOKEN = re.compile(
+    r"<(?P<tag>img|lj-embed|lj|a|iframe|embed|object)\b(?P<attrs>[^>]*)>"
+    r"|(?P<url>https?://[^\s<>\"']+?\.(?:jpe?g|gif|png|bmp|webp))(?![\w.])",
+    re.I,
+)
+ATTR = re.compile(r"""([\w-]+)\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))""")
+IMAGE_URL = re.compile(r"\.(?:jpe?g|gif|png|bmp|webp)$", re.I)
+ENTRY_PATH = re.compile(r"^/(\d+)\.html$")
+USERS_PATH = re.compile(r"^/users/([\w-]+)/(\d+)\.html$")
+A_HREF = re.compile(r"""(<a\b[^>]*?(?<![\w-])href\s*=\s*)("[^"]*"|'[^']*'|[^\s"'>]+)""", re.I)
+IMG_SRC = re.compile(r"""(<img\b[^>]*?(?<![\w-])src\s*=\s*)("[^"]*"|'[^']*'|[^\s"'>]+)""", re.I)
+EMBED_SRC = {"iframe": "src", "embed": "src", "object": "data", "lj-embed": "id"}
+KEYS = ("images", "image_links", "users", "links", "embeds")
+
+
+def attrs_of(text: str) -> dict:
+    """Attribute dict of a tag's attribute text (names lower-cased, entities decoded)."""
+    out = {}
+    for name, dq, sq, bare in ATTR.findall(text):
+        out[name.lower()] = html.unescape(dq or sq or bare)
+    return out
+
+
+def journal_link(url: str) -> Optional[dict]:
+    """Parse a link to a journal entry, or None if *url* isn't one."""
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    if host != "livejournal.com" and not host.endswith(".livejournal.com"):
+        return None
+    sub = host[: -len(".livejournal.com")] if host != "livejournal.com" else ""
+    query = parse_qs(parts.query)
+    link = None
+    if sub and sub != "www":
+        match = ENTRY_PATH.match(parts.path)
+        if match:
+            link = {"url": url, "journal": sub.replace("-", "_"), "ditemid": int(match.group(1))}
+    elif (match := USERS_PATH.match(parts.path)):
+        link = {"url": url, "journal": match.group(1).replace("-", "_"), "ditemid": int(match.group(2))}
+    elif parts.path in ("/talkread.bml", "/talkpost.bml"):
+        if "journal" in query and "itemid" in query and query["itemid"][0].isdigit():
+            link = {"url": url, "journal": query["journal"][0], "itemid": int(query["itemid"][0])}
+    if link and query.get("thread", [""])[0].isdigit():
+        link["thread"] = int(query["thread"][0])
+    return link
+
+
+def empty_meta() -> dict:
+    return {key: [] for key in KEYS}
+
+
+def scan_body(text: Optional[str], meta: Optional[dict] = None) -> dict:
+    """Collect images, users, entry links and embeds from *text* (added to *meta* if given)."""
+    meta = meta if meta is not None else empty_meta()
+    if not text:
+        return meta
+    seen = {canonical_url(u) for u in meta["images"] + meta["image_links"]}
+
+    def add_image(url, key):
+        canon = canonical_url(url)
+        if canon not in seen:
+            seen.add(canon)
+            meta[key].append(url)
+
+    for token in TOKEN.finditer(text):
+        if token.group("url"):
+            add_image(token.group("url"), "image_links")
+            continue
+        tag = token.group("tag").lower()
+        attrs = attrs_of(token.group("attrs"))
+        if tag == "img" and attrs.get("src"):
+            add_image(attrs["src"], "images")
+        elif tag == "lj":
+            name = (attrs.get("user") or attrs.get("comm") or "").strip("\"' /")
+            if name and name not in meta["users"]:
+                meta["users"].append(name)
+        elif tag == "a" and attrs.get("href"):
+            href = attrs["href"]
+            link = journal_link(href)
+            if link:
+                if link not in meta["links"]:
+                    meta["links"].append(link)
+            elif IMAGE_URL.search(href.split("?")[0]):
+                add_image(href, "image_links")
+        elif tag in EMBED_SRC:
+            embed = {"tag": tag, "src": attrs.get(EMBED_SRC[tag], "")}
+            if embed not in meta["embeds"]:
+                meta["embeds"].append(embed)
+    return meta
+
+
+def post_meta(post: dict, comments: Optional[Iterable[dict]] = None) -> dict:
+    """One record for a post's subject, body and comment bodies."""
+    meta = scan_body(post.get("subject"))
+    scan_body(post.get("body"), meta)
+    for c in comments or ():
+        scan_body(c.get("subject"), meta)
+        scan_body(c.get("body"), meta)
+    return meta
+
+
+def rewrite_images(text: Optional[str], lookup) -> Optional[str]:
+    """Replace each <img src> for which lookup(src) returns a new value."""
+    if not text or "<img" not in text.lower():
+        return text
+
+    def swap(match):
+        new = lookup(html.unescape(match.group(2).strip("\"'")))
+        return f'{match.group(1)}"{html.escape(new)}"' if new else match.group(0)
+
+    return IMG_SRC.sub(swap, text)
+
+
+def rewrite_links(text: Optional[str], lookup) -> Optional[str]:
+    """Replace each <a href> for which lookup(href) returns a new value."""
+    if not text or "<a" not in text.lower():
+        return text
+
+    def swap(match):
+        new = lookup(html.unescape(match.group(2).strip("\"'")))
+        return f'{match.group(1)}"{html.escape(new)}"' if new else match.group(0)
+
+    return A_HREF.sub(swap, text)
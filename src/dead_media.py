@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""dead_media.py
+
+Persistent negative cache of media URLs and hosts that failed to download.
+
+Old journals embed images from hosts that vanished years ago. Without this
+cache every rerun waits out the full timeout on each of them again. Failures
+are recorded with their kind and skipped until the re-check interval passes:
+
+    dns, refused            the whole host is unreachable → every URL on it
+    404, 410, timeout       just this URL is gone (or too slow to wait for)
+
+A timeout stays URL-level: one huge or stalled image on an otherwise
+healthy host must not skip the rest of that host's images.
+
+Other failures (5xx after retries, TLS errors, ...) are not cached, since
+they are more likely to be temporary.
+
+``DEAD_MEDIA_RECHECK_DAYS`` (env, default 30) sets how long an entry is
+trusted; 0 disables skipping.
+"""
+
+# NOTE: This script is now located in src/ and is intended to be run as a module or via Docker.
+# All code is commented for clarity for junior developers.
+
+from __future__ import annotations
+
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+HOST_KINDS = {"dns", "refused"}
+URL_KINDS = {"404", "410", "timeout"}
+DEFAULT_PATH = "batch-downloads/dead-media.json"
+# Markers of the root cause in the text of a wrapped connection error
+DNS_MARKERS = ("NameResolution", "Failed to resolve", "gaierror", "Name or service not known",
+               "nodename nor servname", "getaddrinfo failed")
+REFUSED_MARKERS = ("ConnectionRefused", "Connection refused", "Errno 111", "WinError 10061")
+
+
+def failure_kind(exc: BaseException) -> Optional[str]:
+    """Classify a download error into a cacheable kind, or None if it may be transient."""
+    import requests
+
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        status = str(exc.response.status_code)
+        return status if status in URL_KINDS else None
+    if isinstance(exc, requests.Timeout):
+        return "timeout"
+    if isinstance(exc, requests.ConnectionError):
+        # The root cause is nested (requests → urllib3 → socket); its text names it
+        text = " ".join(_error_chain(exc))
+        if any(marker in text for marker in DNS_MARKERS):
+            return "dns"
+        if any(marker in text for marker in REFUSED_MARKERS):
+            return "refused"
+    return None
+
+
+def _error_chain(exc, depth=6):
+    """repr() of an exception and the errors it wraps."""
+    seen = []
+    while exc is not None and depth:
+        seen.append(repr(exc))
+        exc = (getattr(exc, "reason", None) or exc.__cause__ or exc.__context__
+               or next((a for a in exc.args if isinstance(a, BaseException)), None))
+        depth -= 1
+    return seen
+
+
+class DeadMediaCache:
+    def __init__(self, path: str | os.PathLike = DEFAULT_PATH, recheck_days: Optional[float] = None, clock=time.time):
+        self.path = Path(path)
+        days = float(os.environ.get("DEAD_MEDIA_RECHECK_DAYS", 30)) if recheck_days is None else recheck_days
+        self.recheck = days * 86400
+        self.clock = clock
+        self.hosts: dict = {}
+        self.urls: dict = {}
+        self.skipped = 0
+        self._dirty = False
+        self._load()
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except ValueError:
+            logger.warning("Ignoring unreadable dead-media cache %s", self.path)
+            return
+        self.hosts = data.get("hosts", {})
+        self.urls = data.get("urls", {})
+
+    def _fresh(self, entry) -> bool:
+        return entry is not None and self.clock() - entry["checked"] < self.recheck
+
+    def check(self, url: str) -> Optional[str]:
+        """Failure kind if *url* (or its host) is known dead and not yet due for a re-check."""
+        host = self.hosts.get(urlparse(url).hostname or "")
+        entry = host if self._fresh(host) else self.urls.get(url)
+        if self._fresh(entry):
+            self.skipped += 1
+            return entry["kind"]
+        return None
+
+    def record(self, url: str, exc: BaseException) -> Optional[str]:
+        """Remember a failed download; returns the kind recorded (None if not cacheable)."""
+        kind = failure_kind(exc)
+        if kind is None:
+            return None
+        entry = {"kind": kind, "checked": self.clock()}
+        if kind in HOST_KINDS:
+            self.hosts[urlparse(url).hostname or ""] = entry
+        else:
+            self.urls[url] = entry
+        self._dirty = True
+        return kind
+
+    def forget(self, url: str):
+        """A successful download clears any entry for the URL and its host."""
+        removed_url = self.urls.pop(url, None)
+        removed_host = self.hosts.pop(urlparse(url).hostname or "", None)
+        if removed_url or removed_host:
+            self._dirty = True
+
+    def save(self):
+        if not self._dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"hosts": self.hosts, "urls": self.urls}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+        logger.info("Dead media: %s hosts, %s URLs known dead (%s downloads skipped)",
+                    len(self.hosts), len(self.urls), self.skipped)
@@ -7,10 +7,14 @@ import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+import contextlib
 import json
 import requests
 import xml.etree.ElementTree as ET
-from logger import setup_logger
+from http_client import client
+from logger import setup_logger, log_payload
+from media_fetch import fetch_to_file
+from progress import StageProgress
 from datetime import datetime
 import hashlib
 import time
@@ -42,7 +46,7 @@ class UserpicManager:
             return self.cache[userid][userpicid]
         
         source_info = f" from {source_type} {source_id}" if source_type and source_id else ""
-        logger.debug(f"Fetching userpic URL for user {userid}{source_info}")
+        logger.debug("Fetching userpic URL for user %s%s", userid, source_info)
         
         # XML-RPC call to get userpics for a user
         payload = {
@@ -61,8 +65,7 @@ class UserpicManager:
         )
         
         try:
-            r = requests.post(self.USERPIC_API, data=body, headers=self.headers, cookies=self.cookies, timeout=30)
-            r.raise_for_status()
+            r = client().post(self.USERPIC_API, data=body, headers=self.headers, cookies=self.cookies, timeout=30)
             
             root = ET.fromstring(r.text)
             
@@ -71,7 +74,7 @@ class UserpicManager:
             if fault is not None:
                 fault_string = fault.find(".//string")
                 if fault_string is not None:
-                    logger.error(f"API returned fault for user {userid}: {fault_string.text}")
+                    logger.error("API returned fault for user %s: %s", userid, fault_string.text)
                 return None
             
             # Process all userpics
@@ -89,11 +92,11 @@ class UserpicManager:
                 return next(iter(self.cache[userid].values()))
                 
             # No userpic found
-            logger.debug(f"No userpic found for user {userid}{source_info}")
+            logger.debug("No userpic found for user %s%s", userid, source_info)
             return None
             
         except Exception as e:
-            logger.error(f"Error fetching userpic for user {userid}{source_info}: {e}")
+            logger.error("Error fetching userpic for user %s%s: %s", userid, source_info, e)
             return None
     
     def download_userpic(self, userid, userpicid, url):
@@ -111,15 +114,12 @@ class UserpicManager:
             return icon_path
             
         try:
-            r = requests.get(url, timeout=15)
-            r.raise_for_status()
-            with open(icon_path, "wb") as icf:
-                icf.write(r.content)
+            fetch_to_file(url, icon_path, timeout=15)
             self.download_count += 1
-            logger.debug(f"Downloaded icon for user {userid}")
+            logger.debug("Downloaded icon for user %s", userid)
             return icon_path
         except Exception as e:
-            logger.error(f"Failed to download icon for user {userid}: {e}")
+            logger.error("Failed to download icon for user %s: %s", userid, e)
             return None
     
     def get_stats(self):
@@ -133,16 +133,14 @@ class UserpicManager:
         }
 
 def fetch_xml(params, cookies, headers):
-    logger.debug(f"Fetching XML with params: {params}")
-    response = requests.get(
+    logger.debug("Fetching XML with params: %s", params)
+    # Retries transient failures; raises once they are exhausted or on a hard 4xx
+    response = client().get(
         'https://www.livejournal.com/export_comments.bml',
         params=params,
         headers=headers,
         cookies=cookies
     )
-    if response.status_code != 200:
-        logger.error(f"Failed to fetch XML: HTTP {response.status_code}")
-        raise RuntimeError(f"HTTP {response.status_code}")
     return response.text
 
 
@@ -153,7 +151,7 @@ def get_users_map(xml):
         users[user.attrib['id']] = user.attrib['user']
     with open('batch-downloads/comments-json/usermap.json', 'w', encoding='utf-8') as f:
         f.write(json.dumps(users, ensure_ascii=False, indent=2))
-    logger.debug(f"Found {len(users)} users in usermap")
+    logger.debug("Found %s users in usermap", len(users))
     return users
 
 
@@ -168,18 +166,15 @@ def get_comment_element(name, comment_xml, comment):
         comment[name] = elements[0].text
 
 
-def get_more_comments(start_id, users, cookies, headers):
+def parse_comment_body(xml, users):
+    """
+    Comments of one saved ``comment_body`` page, with authors from *users*.
+
+    Returns ``(local_max_id, comments)``; also used by offline.py to rebuild
+    comments from batch-downloads/comments-xml/ without fetching.
+    """
     comments = []
     local_max_id = -1
-
-    # Ensure the directory exists before writing
-    os.makedirs('batch-downloads/comments-xml', exist_ok=True)
-    xml = fetch_xml({'get': 'comment_body', 'startid': start_id}, cookies, headers)
-    xml_path = f"batch-downloads/comments-xml/comment_body-{start_id}.xml"
-    with open(xml_path, 'w', encoding='utf-8') as f:
-        f.write(xml)
-    logger.debug(f"Saved comment XML to {xml_path}")
-
     for comment_xml in ET.fromstring(xml).iter('comment'):
         comment = {
             'jitemid': int(comment_xml.attrib['jitemid']),
@@ -200,17 +195,45 @@ def get_more_comments(start_id, users, cookies, headers):
 
         local_max_id = max(local_max_id, comment['id'])
         comments.append(comment)
+    return local_max_id, comments
+
 
-    logger.debug(f"Processed {len(comments)} comments from batch starting at ID {start_id}")
+def get_more_comments(start_id, users, cookies, headers):
+    # Ensure the directory exists before writing
+    os.makedirs('batch-downloads/comments-xml', exist_ok=True)
+    xml = fetch_xml({'get': 'comment_body', 'startid': start_id}, cookies, headers)
+    xml_path = f"batch-downloads/comments-xml/comment_body-{start_id}.xml"
+    with open(xml_path, 'w', encoding='utf-8') as f:
+        f.write(xml)
+    logger.debug("Saved comment XML to %s", xml_path)
+
+    local_max_id, comments = parse_comment_body(xml, users)
+    logger.debug("Processed %s comments from batch starting at ID %s", len(comments), start_id)
     return local_max_id, comments
 
+def attach_userpics(comments, userpic_mgr, progress=None, source="sync"):
+    """Download each comment poster's userpic and set ``icon_path`` (None if there is none)."""
+    for comment in comments:
+        posterid = comment.get('posterid')
+        if posterid:
+            # Get the userpic URL (from cache if available)
+            with progress.request() if progress else contextlib.nullcontext():
+                url = userpic_mgr.get_userpic_url(posterid, comment.get('userpicid'), "comment", f"{source} comment {comment['id']}")
+            if url:
+                # Download the userpic if needed
+                with progress.request() if progress else contextlib.nullcontext():
+                    icon_path = userpic_mgr.download_userpic(posterid, comment.get('userpicid'), url)
+                comment["icon_path"] = icon_path
+            else:
+                comment["icon_path"] = None
+
 def get_comments_for_post(post_id, cookies, headers):
     """Get comments for a specific post using ditemid."""
-    logger.debug(f"Fetching comments for post {post_id}")
+    logger.debug("Fetching comments for post %s", post_id)
     
     # Convert post_id to ditemid (post_id << 8)
     ditemid = int(post_id) << 8
-    logger.debug(f"Using ditemid {ditemid} for post {post_id}")
+    logger.debug("Using ditemid %s for post %s", ditemid, post_id)
     
     # XML-RPC call to get comments
     payload = {
@@ -231,57 +254,172 @@ def get_comments_for_post(post_id, cookies, headers):
         f"<methodCall><methodName>LJ.XMLRPC.getcomments</methodName><params>{xml_params}</params></methodCall>"
     )
     
-    try:
-        response = requests.post(
-            "https://www.livejournal.com/interface/xmlrpc",
-            data=body,
-            headers=headers,
-            cookies=cookies,
-            timeout=30
-        )
-        response.raise_for_status()
-        
-        # Log the full response for debugging
-        logger.debug(f"API Response for post {post_id}: {response.text}")
+    # Transport errors propagate once retries are exhausted instead of
+    # silently dropping this post's comments
+    response = client().post(
+        "https://www.livejournal.com/interface/xmlrpc",
+        data=body,
+        headers=headers,
+        cookies=cookies,
+        timeout=30
+    )
+    
+    # Log a sampled, size-capped copy of the response for debugging
+    log_payload(logger, response.text, "API Response for post %s", post_id)
+    
+    root = ET.fromstring(response.text)
+    
+    # Check for fault
+    fault = root.find(".//fault")
+    if fault is not None:
+        fault_string = fault.find(".//string")
+        if fault_string is not None:
+            logger.error("API returned fault for post %s: %s", post_id, fault_string.text)
+        return []
+    
+    comments = []
+    for comment_xml in root.findall(".//comment"):
+        comment = {
+            'jitemid': int(comment_xml.attrib['jitemid']),
+            'id': int(comment_xml.attrib['id']),
+            'children': []
+        }
         
-        root = ET.fromstring(response.text)
+        # Get all comment properties
+        get_comment_property('parentid', comment_xml, comment)
+        get_comment_property('posterid', comment_xml, comment)
+        get_comment_property('userpicid', comment_xml, comment)
+        get_comment_element('date', comment_xml, comment)
+        get_comment_element('subject', comment_xml, comment)
+        get_comment_element('body', comment_xml, comment)
+        get_comment_element('postername', comment_xml, comment)
         
-        # Check for fault
-        fault = root.find(".//fault")
-        if fault is not None:
-            fault_string = fault.find(".//string")
-            if fault_string is not None:
-                logger.error(f"API returned fault for post {post_id}: {fault_string.text}")
-            return []
+        if 'state' in comment_xml.attrib:
+            comment['state'] = comment_xml.attrib['state']
+            
+        comments.append(comment)
         
-        comments = []
-        for comment_xml in root.findall(".//comment"):
-            comment = {
+    logger.debug("Found %s comments for post %s", len(comments), post_id)
+    return comments
+
+# ── incremental comment sync (comment_meta) ─────────────────────────────── #
+COMMENT_SYNC_STATE = 'batch-downloads/comments-json/sync-state.json'
+COMMENTS_ALL = 'batch-downloads/comments-json/all.json'
+
+
+def fetch_comment_meta(cookies, headers):
+    """
+    Walk ``export_comments.bml?get=comment_meta`` from id 0.
+
+    Returns ``(maxid, meta, users)`` where ``meta`` maps comment id to
+    ``{'jitemid', 'state'}`` (state '' = visible, 'D' deleted, 'S' screened,
+    'F' frozen). Meta pages carry no bodies, so this is cheap even for large
+    journals.
+    """
+    meta, users = {}, {}
+    start_id, maxid = 0, 0
+    while True:
+        root = ET.fromstring(fetch_xml({'get': 'comment_meta', 'startid': start_id}, cookies, headers))
+        maxid = max(maxid, int(root.findtext('maxid') or 0))
+        for user in root.iter('usermap'):
+            users[user.attrib['id']] = user.attrib['user']
+        last_id = -1
+        for comment_xml in root.iter('comment'):
+            cid = int(comment_xml.attrib['id'])
+            meta[cid] = {
                 'jitemid': int(comment_xml.attrib['jitemid']),
-                'id': int(comment_xml.attrib['id']),
-                'children': []
+                'state': comment_xml.attrib.get('state', ''),
             }
-            
-            # Get all comment properties
-            get_comment_property('parentid', comment_xml, comment)
-            get_comment_property('posterid', comment_xml, comment)
-            get_comment_property('userpicid', comment_xml, comment)
-            get_comment_element('date', comment_xml, comment)
-            get_comment_element('subject', comment_xml, comment)
-            get_comment_element('body', comment_xml, comment)
-            get_comment_element('postername', comment_xml, comment)
-            
-            if 'state' in comment_xml.attrib:
-                comment['state'] = comment_xml.attrib['state']
-                
-            comments.append(comment)
-            
-        logger.debug(f"Found {len(comments)} comments for post {post_id}")
-        return comments
-        
-    except Exception as e:
-        logger.error(f"Error fetching comments for post {post_id}: {e}")
-        return []
+            last_id = max(last_id, cid)
+        if last_id < start_id or last_id >= maxid:
+            return maxid, meta, users
+        start_id = last_id + 1
+
+
+def save_comment_sync_state(maxid, meta):
+    """Record a comment_meta snapshot as the baseline of the next sync."""
+    os.makedirs(os.path.dirname(COMMENT_SYNC_STATE), exist_ok=True)
+    with open(COMMENT_SYNC_STATE, 'w', encoding='utf-8') as f:
+        json.dump({'maxid': maxid, 'states': {str(cid): m['state'] for cid, m in meta.items()}}, f)
+
+
+def fetch_comment_bodies(ids, users, cookies, headers):
+    """
+    Bodies for the given comment ids. ``comment_body`` pages start at an id
+    and cover the following comments, so one request serves every wanted id
+    up to the page's last id; the next request starts at the next uncovered id.
+    """
+    wanted = set(ids)
+    pending = sorted(wanted)
+    bodies = {}
+    while pending:
+        local_max_id, comments = get_more_comments(pending[0], users, cookies, headers)
+        bodies.update((c['id'], c) for c in comments if c['id'] in wanted)
+        if local_max_id < pending[0]:
+            logger.warning("No comment bodies returned from id %s; %s comments left without bodies", pending[0], len(pending))
+            break
+        pending = [cid for cid in pending if cid > local_max_id]
+    return bodies
+
+
+def save_post_comments(post_dirs, comments):
+    """Rewrite comments.json in the given post folders."""
+    for post_dir in post_dirs:
+        with open(os.path.join(post_dir, 'comments.json'), 'w', encoding='utf-8') as f:
+            json.dump(comments, f, ensure_ascii=False, indent=2)
+
+
+def sync_comments(cookies, headers, posts):
+    """
+    Incremental comment download (``export.py --sync``).
+
+    Compares a fresh comment_meta snapshot with the one stored by the previous
+    run and fetches bodies only for new ids (above the stored max id) and for
+    comments whose state changed (deleted, screened, unscreened, frozen). The
+    stored comment list is patched and the affected posts' comments.json
+    rewritten. The first run (no stored state) fetches everything.
+
+    Returns ``(all_comments, changed_jitemids)``.
+    """
+    try:
+        with open(COMMENT_SYNC_STATE, encoding='utf-8') as f:
+            state = json.load(f)
+        with open(COMMENTS_ALL, encoding='utf-8') as f:
+            store = {c['id']: c for c in json.load(f)}
+    except (OSError, ValueError):
+        state, store = {}, {}
+    old_maxid = state.get('maxid', 0)
+    old_states = {int(cid): st for cid, st in state.get('states', {}).items()}
+
+    maxid, meta, users = fetch_comment_meta(cookies, headers)
+    new_ids = [cid for cid in meta if cid > old_maxid or cid not in store]
+    changed_ids = [cid for cid, m in meta.items() if cid in old_states and old_states[cid] != m['state']]
+    logger.info("Comment sync: %s new, %s changed state (max id %s → %s)", len(new_ids), len(changed_ids), old_maxid, maxid)
+
+    bodies = fetch_comment_bodies(new_ids + changed_ids, users, cookies, headers)
+    # Same userpic handling as a full download, so both write the same records
+    attach_userpics(bodies.values(), UserpicManager(cookies, headers))
+    for cid in changed_ids:
+        # Deleted comments come back without a body; keep the state change anyway
+        store.setdefault(cid, {'id': cid, 'jitemid': meta[cid]['jitemid'], 'children': []})['state'] = meta[cid]['state']
+    store.update(bodies)
+    changed_jitemids = {meta[cid]['jitemid'] for cid in new_ids + changed_ids}
+
+    all_comments = sorted(store.values(), key=lambda c: c['id'])
+    os.makedirs(os.path.dirname(COMMENTS_ALL), exist_ok=True)
+    with open(COMMENTS_ALL, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(all_comments, ensure_ascii=False, indent=2))
+    save_comment_sync_state(maxid, meta)
+
+    # Patch comments.json of the affected posts only
+    from download_posts import post_dir_for
+    by_jitemid = {int(p['id']) >> 8: p for p in posts}
+    for jitemid in changed_jitemids:
+        post = by_jitemid.get(jitemid)
+        post_dir = post and post_dir_for(post)
+        if post_dir and os.path.isdir(post_dir):
+            save_post_comments([post_dir], [c for c in all_comments if c['jitemid'] == jitemid])
+    return all_comments, changed_jitemids
 
 def download_comments(cookies, headers):
     logger.info("Starting comment download process...")
@@ -289,59 +427,62 @@ def download_comments(cookies, headers):
     os.makedirs('batch-downloads/comments-json', exist_ok=True)
     os.makedirs('images/icons', exist_ok=True)
 
+    # Snapshot comment_meta before the bodies: comments added meanwhile get a
+    # higher id, so the next --sync still fetches them
+    try:
+        maxid, meta, _ = fetch_comment_meta(cookies, headers)
+    except Exception as e:
+        logger.warning("comment_meta unavailable (%s); the next --sync will refetch every comment", e)
+        meta = None
+
     # Create userpic manager
     userpic_mgr = UserpicManager(cookies, headers)
 
     # Get list of posts we have
     post_files = glob.glob('batch-downloads/posts-json/*.json')
-    logger.info(f"Found {len(post_files)} posts to process comments for")
-    
+    logger.info("Found %s posts to process comments for", len(post_files))
+
     all_comments = []
-    for post_file in post_files:
-        post_id = os.path.splitext(os.path.basename(post_file))[0]
-        
-        # Get comments for this post
-        comments = get_comments_for_post(post_id, cookies, headers)
-        
-        # Process userpics for comments
-        for comment in comments:
-            posterid = comment.get('posterid')
-            if posterid:
-                # Get the userpic URL (from cache if available)
-                url = userpic_mgr.get_userpic_url(posterid, comment.get('userpicid'), "comment", f"post {post_id} comment {comment['id']}")
-                if url:
-                    # Download the userpic if needed
-                    icon_path = userpic_mgr.download_userpic(posterid, comment.get('userpicid'), url)
-                    comment["icon_path"] = icon_path
-                else:
-                    comment["icon_path"] = None
-        
-        # Save comments to post-specific directory if there are any
-        if comments:
-            # Find the post directory
-            post_dirs = glob.glob(f'posts/*/*/*-{post_id}')
-            if post_dirs:
-                post_dir = post_dirs[0]
-                comments_path = os.path.join(post_dir, 'comments.json')
-                with open(comments_path, 'w', encoding='utf-8') as f:
-                    json.dump(comments, f, ensure_ascii=False, indent=2)
-                logger.debug(f"Saved {len(comments)} comments to {comments_path}")
-        
-        all_comments.extend(comments)
-        logger.debug(f"Processed comments for post {post_id}")
-        
-        # Avoid overwhelming the server
-        time.sleep(0.5)  # Brief pause between posts
+    with StageProgress("comments", total=len(post_files), unit="posts") as progress:
+        for post_file in post_files:
+            post_id = os.path.splitext(os.path.basename(post_file))[0]
+
+            # Get comments for this post
+            with progress.request():
+                comments = get_comments_for_post(post_id, cookies, headers)
+
+            # Process userpics for comments
+            attach_userpics(comments, userpic_mgr, progress, f"post {post_id}")
 
-    logger.info(f"Processed {len(all_comments)} total comments")
+            # Save comments to post-specific directory if there are any
+            if comments:
+                # Find the post directory
+                post_dirs = glob.glob(f'posts/*/*/*-{post_id}')
+                if post_dirs:
+                    post_dir = post_dirs[0]
+                    comments_path = os.path.join(post_dir, 'comments.json')
+                    with open(comments_path, 'w', encoding='utf-8') as f:
+                        json.dump(comments, f, ensure_ascii=False, indent=2)
+                    logger.debug("Saved %s comments to %s", len(comments), comments_path)
+
+            all_comments.extend(comments)
+            logger.debug("Processed comments for post %s", post_id)
+
+            # Avoid overwhelming the server
+            time.sleep(0.5)  # Brief pause between posts
+            progress.advance()
+
+    logger.info("Processed %s total comments", len(all_comments))
 
     with open('batch-downloads/comments-json/all.json', 'w', encoding='utf-8') as f:
         f.write(json.dumps(all_comments, ensure_ascii=False, indent=2))
-    logger.info(f"Saved {len(all_comments)} comments to JSON")
-    
+    logger.info("Saved %s comments to JSON", len(all_comments))
+    if meta is not None:
+        save_comment_sync_state(maxid, meta)
+
     # Print final cache stats
     stats = userpic_mgr.get_stats()
-    logger.info(f"Final userpic cache stats: {stats['cache_size']} users cached, {stats['hit_rate']} hit rate, {stats['downloaded']} icons downloaded")
+    logger.info("Final userpic cache stats: %s users cached, %s hit rate, %s icons downloaded", stats['cache_size'], stats['hit_rate'], stats['downloaded'])
 
     return all_comments
 
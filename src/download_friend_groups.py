@@ -27,6 +27,7 @@ import requests
 from xml.etree import ElementTree as ET
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from http_client import client
 from logger import setup_logger
 
 logger = setup_logger(__name__)
@@ -44,7 +45,7 @@ RPC_URL = "https://www.livejournal.com/interface/xmlrpc"
 
 def _rpc_call(method: str, params: Dict[str, str], cookies: Dict[str, str], headers: Dict[str, str]):
     """Low‑level XML‑RPC POST helper. Returns raw XML response text."""
-    logger.debug(f"Making XML-RPC call to {method}")
+    logger.debug("Making XML-RPC call to %s", method)
     # Build a minimal XML‑RPC request
     xml_params = "".join(
         f"<param><value><string>{value}</string></value></param>" for value in params.values()
@@ -55,12 +56,11 @@ def _rpc_call(method: str, params: Dict[str, str], cookies: Dict[str, str], head
     )
 
     try:
-        r = requests.post(RPC_URL, data=body, headers=headers, cookies=cookies, timeout=30)
-        r.raise_for_status()
-        logger.debug(f"XML-RPC call to {method} successful")
+        r = client().post(RPC_URL, data=body, headers=headers, cookies=cookies, timeout=30)
+        logger.debug("XML-RPC call to %s successful", method)
         return r.text
     except Exception as e:
-        logger.error(f"XML-RPC call to {method} failed: {e}")
+        logger.error("XML-RPC call to %s failed: %s", method, e)
         raise
 
 
@@ -78,7 +78,7 @@ def _parse_friend_groups(xml_text: str) -> List[Dict]:
             value_elem = member.find("value/*[1]")  # first child of <value>
             group_dict[name] = value_elem.text or ""
         groups.append(group_dict)
-    logger.debug(f"Parsed {len(groups)} friend groups")
+    logger.debug("Parsed %s friend groups", len(groups))
     return groups
 
 
@@ -95,7 +95,7 @@ def download_friend_groups(cookies: Dict[str, str], headers: Dict[str, str]) ->
     }
     xml_resp = _rpc_call("LJ.XMLRPC.getfriendgroups", payload, cookies, headers)
     groups = _parse_friend_groups(xml_resp)
-    logger.info(f"Successfully downloaded {len(groups)} friend groups")
+    logger.info("Successfully downloaded %s friend groups", len(groups))
     return groups
 
 
@@ -114,7 +114,7 @@ def _cli():
     blob = json.load(sys.stdin)
     groups = download_friend_groups(blob["cookies"], blob["headers"])
     out_file.write_text(json.dumps(groups, indent=2, ensure_ascii=False))
-    logger.info(f"Saved {len(groups)} groups → {out_file}")
+    logger.info("Saved %s groups → %s", len(groups), out_file)
 
 
 if __name__ == "__main__":
@@ -9,18 +9,110 @@ import requests
 from sys import exit as sysexit
 import xml.etree.ElementTree as ET
 from datetime import datetime, timedelta
-from dateutil.relativedelta import relativedelta
 import sys
 import time
-import re
 from urllib.parse import urlparse, unquote
 
 DATE_FORMAT = '%Y-%m'
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from body_scan import scan_body
+from dead_media import DeadMediaCache
+from http_client import client
+from logger import setup_logger
+from media_fetch import fetch_to_file
+from progress import StageProgress
+
+logger = setup_logger(__name__)
+
+# Months that returned no entries on earlier runs (fallback when getdaycounts fails)
+MONTH_INDEX = 'batch-downloads/month-index.json'
+
+def empty_month_recheck_seconds():
+    """How long a month stays known-empty before it is fetched again (EMPTY_MONTH_RECHECK_DAYS)."""
+    return float(os.environ.get('EMPTY_MONTH_RECHECK_DAYS', 30)) * 86400
+
+def next_month(dt):
+    """Return the first day of the month after *dt* (no dateutil needed)."""
+    if dt.month == 12:
+        return dt.replace(year=dt.year + 1, month=1, day=1)
+    return dt.replace(month=dt.month + 1, day=1)
+
+def plan_months(start_month, end_month):
+    """Every (year, month) from start_month to end_month inclusive."""
+    months = []
+    month_cursor = start_month
+    while month_cursor <= end_month:
+        months.append((month_cursor.year, month_cursor.month))
+        month_cursor = next_month(month_cursor)
+    return months
+
+def load_empty_months():
+    """'YYYY-MM' → time (epoch seconds) the month was last seen empty."""
+    try:
+        with open(MONTH_INDEX, encoding='utf-8') as file:
+            empty = json.load(file).get('empty', {})
+    except (OSError, ValueError):
+        return {}
+    if isinstance(empty, list):
+        return dict.fromkeys(empty, 0)  # old format without check times: recheck once
+    return empty
+
+def save_empty_months(empty):
+    os.makedirs(os.path.dirname(MONTH_INDEX), exist_ok=True)
+    with open(MONTH_INDEX, 'w', encoding='utf-8') as file:
+        json.dump({'empty': dict(sorted(empty.items()))}, file, indent=4)
+
+def fetch_active_months(cookies, headers):
+    """
+    Set of (year, month) that contain at least one entry, from LJ.XMLRPC.getdaycounts.
+
+    An answer without any day is not trusted (an error page or a changed
+    response shape would otherwise mark the whole journal empty): it raises
+    ValueError so the caller falls back as if the call had failed.
+    """
+    from lj_xmlrpc import call
+    result = call('LJ.XMLRPC.getdaycounts', {}, cookies, headers)
+    active = {
+        (int(day['date'][:4]), int(day['date'][5:7]))
+        for day in result.get('daycounts') or []
+        if int(day.get('count', 0)) > 0
+    }
+    if not active:
+        raise ValueError('getdaycounts returned no days with entries')
+    return active
+
+def discover_active_months(months, cookies, headers, today=None):
+    """
+    Reduce the planned months to the ones that actually contain entries.
+
+    One getdaycounts call replaces a request per empty month. If it fails,
+    months recorded as empty by earlier runs are skipped instead, until the
+    record is EMPTY_MONTH_RECHECK_DAYS old (a post may have been backdated
+    into them); the current and previous month are always fetched since they
+    may have gained posts.
+    """
+    try:
+        active = fetch_active_months(cookies, headers)
+    except Exception as e:
+        logger.warning("getdaycounts failed (%s); using the known-empty month cache instead", e)
+    else:
+        plan = [m for m in months if m in active]
+        logger.info("Month discovery: %s of %s months have entries", len(plan), len(months))
+        return plan
+
+    today = today or datetime.now()
+    recent = {(today.year, today.month)}
+    recent.add((today.year - 1, 12) if today.month == 1 else (today.year, today.month - 1))
+    empty = load_empty_months()
+    fresh_after = today.timestamp() - empty_month_recheck_seconds()
+    known_empty = {key for key, checked in empty.items() if checked >= fresh_after}
+    plan = [(y, m) for y, m in months if f'{y}-{m:02d}' not in known_empty or (y, m) in recent]
+    logger.info("Month discovery: skipping %s months known to be empty", len(months) - len(plan))
+    return plan
 
 def fetch_month_posts(year, month, cookies, headers):
-    response = requests.post(
+    response = client().post(
         'https://www.livejournal.com/export_do.bml',
         headers=headers,
         cookies=cookies,
@@ -59,8 +151,21 @@ def xml_to_json(xml):
         'current_mood': f('current_mood')
     }
 
+def post_dir_for(post_json):
+    """Folder of a downloaded post: posts/YYYY/MM/YYYY-MM-DD-HH-MM-SS-<id>."""
+    post_date = datetime.strptime(post_json['date'], '%Y-%m-%d %H:%M:%S')
+    return f'posts/{post_date.year}/{post_date.month:02d}/{post_date.year}-{post_date.month:02d}-{post_date.day:02d}-{post_date.hour:02d}-{post_date.minute:02d}-{post_date.second:02d}-{post_json["id"]}'
+
+def save_post(post_json):
+    """Write post.json into the post's folder (created if needed) and return the folder."""
+    post_dir = post_dir_for(post_json)
+    os.makedirs(post_dir, exist_ok=True)
+    with open(f'{post_dir}/post.json', 'w+', encoding='utf-8') as file:
+        json.dump(post_json, file, indent=4)
+    return post_dir
+
 def fetch_comments(post_id, cookies, headers):
-    response = requests.get(
+    response = client().get(
         f'https://www.livejournal.com/export_comments.bml?get=comment_body&id={post_id}',
         headers=headers,
         cookies=cookies
@@ -69,15 +174,7 @@ def fetch_comments(post_id, cookies, headers):
 
 def extract_lj_usernames(text):
     """Extract LiveJournal usernames from text using <lj user=username> tags."""
-    if not text:
-        return set()
-    usernames = set()
-    # Find all <lj user=username> tags
-    lj_user_pattern = r'<lj\s+user=([^>]+)>'
-    matches = re.findall(lj_user_pattern, text)
-    # Clean up usernames (remove quotes and whitespace)
-    usernames.update(match.strip('"\' ') for match in matches)
-    return usernames
+    return set(scan_body(text)["users"])
 
 def comments_xml_to_json(xml):
     """Convert comments XML to JSON format, handling deleted comments."""
@@ -128,18 +225,23 @@ def fetch_user_info(username, cookies, headers):
     username = username.strip('"\' ')
     
     # Try to get user info directly
-    response = requests.get(
-        'https://www.livejournal.com/export_do.bml',
-        params={
-            'type': 'user',
-            'what': 'user',
-            'user': username
-        },
-        headers=headers,
-        cookies=cookies
-    )
+    try:
+        response = client().get(
+            'https://www.livejournal.com/export_do.bml',
+            params={
+                'type': 'user',
+                'what': 'user',
+                'user': username
+            },
+            headers=headers,
+            cookies=cookies
+        )
+    except requests.HTTPError as e:
+        # Not retryable (e.g. 404 for a purged account): no profile to save
+        print(f"No user info for username {username}: {e}")
+        return None
     
-    if response.status_code == 200 and response.text:
+    if response.text:
         try:
             root = ET.fromstring(response.text)
             user = root.find('.//user')
@@ -226,78 +328,93 @@ def download_posts(cookies, headers, start_month=None, end_month=None):
             sysexit(1)
 
     xml_posts = []
-    month_cursor = start_month
     all_user_ids = set()
     user_map = {}  # Global user mapping
 
-    while month_cursor <= end_month:
-        year = month_cursor.year
-        month = month_cursor.month
+    # Plan the months up front so progress can report an ETA; skip empty ones
+    all_months = plan_months(start_month, end_month)
+    months = discover_active_months(all_months, cookies, headers)
+    empty_months = load_empty_months()
+    checked = time.time()
+    for y, m in set(all_months) - set(months):
+        # Skipped months keep their check time, so a cached one still expires
+        empty_months.setdefault(f'{y}-{m:02d}', checked)
 
-        xml = fetch_month_posts(year, month, cookies, headers)
-        xml_posts.extend(list(ET.fromstring(xml).iter('entry')))
+    with StageProgress("posts", total=len(months), unit="months") as progress:
+        for year, month in months:
+            with progress.request():
+                xml = fetch_month_posts(year, month, cookies, headers)
+            entries = list(ET.fromstring(xml).iter('entry'))
+            xml_posts.extend(entries)
+            if entries:
+                empty_months.pop(f'{year}-{month:02d}', None)
+            else:
+                empty_months[f'{year}-{month:02d}'] = checked
 
-        with open(f'batch-downloads/posts-xml/{year}-{month:02d}.xml', 'w+', encoding='utf-8') as file:
-            file.write(xml)
-        
-        month_cursor = month_cursor + relativedelta(months=1)
+            with open(f'batch-downloads/posts-xml/{year}-{month:02d}.xml', 'w+', encoding='utf-8') as file:
+                file.write(xml)
+            progress.advance()
+    save_empty_months(empty_months)
 
     json_posts = list(map(xml_to_json, xml_posts))
 
     # Process each post and its comments
-    for post in xml_posts:
-        post_json = xml_to_json(post)
-        post_date = datetime.strptime(post_json['date'], '%Y-%m-%d %H:%M:%S')
-        post_dir = f'posts/{post_date.year}/{post_date.month:02d}/{post_date.year}-{post_date.month:02d}-{post_date.day:02d}-{post_date.hour:02d}-{post_date.minute:02d}-{post_date.second:02d}-{post_json["id"]}'
-        os.makedirs(post_dir, exist_ok=True)
-        
-        # Save post JSON
-        with open(f'{post_dir}/post.json', 'w+', encoding='utf-8') as file:
-            json.dump(post_json, file, indent=4)
-        
-        # Fetch and save comments for this post
-        comments = fetch_comments(post_json['id'], cookies, headers)
-        comments_json = None
-        if comments:
-            # Save XML comments
-            with open(f'batch-downloads/comments-xml/comments_{post_json["id"]}.xml', 'w+', encoding='utf-8') as file:
-                file.write(comments)
+    dead = DeadMediaCache()
+    with StageProgress("post comments", total=len(xml_posts), unit="posts") as progress:
+        for post in xml_posts:
+            post_json = xml_to_json(post)
+            post_dir = save_post(post_json)
             
-            # Convert to JSON and save alongside post
-            comments_json, post_user_map = comments_xml_to_json(comments)
-            user_map.update(post_user_map)  # Update global user mapping
-            comments_path = f'{post_dir}/comments.json'
-            with open(comments_path, 'w+', encoding='utf-8') as file:
-                json.dump(comments_json, file, indent=4)
-        
-        # Collect user IDs from post and comments
-        user_ids = collect_user_ids(post_json, comments_json)
-        all_user_ids.update(user_ids)
-        
-        # Download images
-        if 'event' in post_json:
-            image_urls = extract_image_urls(post_json['event'])
-            for url in image_urls:
-                download_image(url, post_dir, cookies, headers)
-                time.sleep(1)  # Rate limiting
+            # Fetch and save comments for this post
+            with progress.request():
+                comments = fetch_comments(post_json['id'], cookies, headers)
+            comments_json = None
+            if comments:
+                # Save XML comments
+                with open(f'batch-downloads/comments-xml/comments_{post_json["id"]}.xml', 'w+', encoding='utf-8') as file:
+                    file.write(comments)
+                
+                # Convert to JSON and save alongside post
+                comments_json, post_user_map = comments_xml_to_json(comments)
+                user_map.update(post_user_map)  # Update global user mapping
+                comments_path = f'{post_dir}/comments.json'
+                with open(comments_path, 'w+', encoding='utf-8') as file:
+                    json.dump(comments_json, file, indent=4)
+            
+            # Collect user IDs from post and comments
+            user_ids = collect_user_ids(post_json, comments_json)
+            all_user_ids.update(user_ids)
+            
+            # Download images
+            if 'event' in post_json:
+                image_urls = extract_image_urls(post_json['event'])
+                for url in image_urls:
+                    with progress.request():
+                        download_image(url, post_dir, cookies, headers, dead)
+                    time.sleep(1)  # Rate limiting
+            progress.advance()
+    dead.save()
 
     # Save the user mapping
     save_user_mapping(user_map)
 
     # Fetch and save user information for all collected user IDs
-    for userid in all_user_ids:
-        try:
-            # If we have a username for this userid, use it
-            username = user_map.get(str(userid))
-            if username:
-                user_xml = fetch_user_info(username, cookies, headers)
-                user_json = xml_to_user_json(user_xml) if user_xml else None
-                save_user_info(user_json, userid)
-                time.sleep(1)  # Rate limiting
-        except Exception as e:
-            print(f"Error fetching user info for userid {userid}: {str(e)}")
-            # Save minimal info for failed fetches
-            save_user_info(None, userid)
+    with StageProgress("user info", total=len(all_user_ids), unit="users") as progress:
+        for userid in all_user_ids:
+            try:
+                # If we have a username for this userid, use it
+                username = user_map.get(str(userid))
+                if username:
+                    with progress.request():
+                        user_xml = fetch_user_info(username, cookies, headers)
+                    user_json = xml_to_user_json(user_xml) if user_xml else None
+                    save_user_info(user_json, userid)
+                    time.sleep(1)  # Rate limiting
+            except Exception as e:
+                print(f"Error fetching user info for userid {userid}: {str(e)}")
+                # Save minimal info for failed fetches
+                save_user_info(None, userid)
+            progress.advance()
 
     return json_posts
 
@@ -346,17 +463,15 @@ def get_comments(username, password, itemid):
         return None
 
 def extract_image_urls(text):
-    # Find all img tags
-    img_pattern = r'<img[^>]+src="([^"]+)"'
-    urls = re.findall(img_pattern, text)
-    
-    # Also find any direct image URLs
-    url_pattern = r'https?://[^\s<>"]+?\.(?:jpg|jpeg|gif|png|bmp|webp)'
-    urls.extend(re.findall(url_pattern, text))
-    
-    return list(set(urls))  # Remove duplicates
+    # <img src> plus any direct image URLs, deduplicated by canonical URL
+    meta = scan_body(text)
+    return meta["images"] + meta["image_links"]
 
-def download_image(url, post_dir, cookies, headers):
+def download_image(url, post_dir, cookies, headers, dead=None):
+    kind = dead.check(url) if dead else None
+    if kind:
+        print(f"Skipping known-dead image ({kind}): {url}")
+        return
     try:
         # Parse the URL to get the filename
         parsed_url = urlparse(url)
@@ -366,17 +481,16 @@ def download_image(url, post_dir, cookies, headers):
         images_dir = os.path.join(post_dir, 'images')
         os.makedirs(images_dir, exist_ok=True)
         
-        # Download the image
-        response = requests.get(url, cookies=cookies, headers=headers)
-        if response.status_code == 200:
-            image_path = os.path.join(images_dir, filename)
-            with open(image_path, 'wb') as f:
-                f.write(response.content)
-            print(f"Downloaded image: {filename}")
-        else:
-            print(f"Failed to download image {url}: {response.status_code}")
+        # Stream the image to disk (resumable, size-checked)
+        image_path = os.path.join(images_dir, filename)
+        fetch_to_file(url, image_path, cookies=cookies, headers=headers)
+        print(f"Downloaded image: {filename}")
+        if dead:
+            dead.forget(url)
     except Exception as e:
         print(f"Error downloading image {url}: {str(e)}")
+        if dead:
+            dead.record(url, e)
 
 if __name__ == '__main__':
     download_posts(None, None)
@@ -21,8 +21,17 @@ Arguments:
   -p / --password  (required)
   -s / --start YYYY-MM   default 1999-04
   -e / --end   YYYY-MM   default <current year and month>
-  -f / --format json|html|md  default json
+  -f / --format json|html|md|site  default json (several allowed: -f json html md, or -f json,html)
+                site = browsable static site in site/, rebuilt incrementally
+                search = offline full-text search page + index in search/
   -d / --dest   output dir    default .
+  --profile     write per-stage cProfile/tracemalloc reports to <dest>/profile/
+  -j / --jobs   render html/md (and parse --offline XML) with N worker processes (0 = all cores)  default 1
+  --images      also download embedded images and point post.json at them
+  --friend-groups-only   only refresh batch-downloads/friend-groups.json
+  --sync        only fetch posts created/edited since the last run (LJ.XMLRPC.syncitems)
+  --offline     rebuild from the raw data saved in batch-downloads/ (no login, no network;
+                -u only names the journal for internal link rewriting)
 
 See README.md for full details and sample output structure.
 """
@@ -34,20 +43,37 @@ from datetime import datetime
 from operator import itemgetter
 from pathlib import Path
 
-import html2text, requests
-from bs4 import BeautifulSoup
-from markdown import markdown
+# Heavy dependencies (requests, html2text, markdown, bs4) and the download
+# stages are imported where they are first needed, so `--help`,
+# `--friend-groups-only` and the default json format start quickly.
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from download_posts import download_posts
-from download_comments import download_comments
-from download_friend_groups import download_friend_groups
+from body_scan import post_meta
+from link_index import LinkIndex, localize_links
 from logger import setup_logger
+from media_rewrite import MediaRewriter, post_texts, rewrite_post_images
+from profiler import StageProfiler
+from render import RenderEngine
+from search_index import SearchIndex
+from site_builder import SiteBuilder
 
 logger = setup_logger(__name__)
 
+FORMATS = ("json", "html", "md", "site", "search")
+
 # ─────────────────── CLI / interactive ─────────────────────────────────── #
+def parse_formats(values) -> list[str]:
+    """Normalize `-f json html` / `-f json,html` into formats in canonical order."""
+    if isinstance(values, str):
+        values = [values]
+    requested = {f.strip() for v in values for f in v.split(",") if f.strip()}
+    unknown = requested - set(FORMATS)
+    if unknown:
+        raise ValueError(f"unknown format(s): {', '.join(sorted(unknown))} (choose from {', '.join(FORMATS)})")
+    return [f for f in FORMATS if f in requested]
+
+
 def parse_cli():
     from datetime import datetime
     now = datetime.now()
@@ -58,11 +84,31 @@ def parse_cli():
     p.add_argument("-p", "--password")
     p.add_argument("-s", "--start", default=default_start)
     p.add_argument("-e", "--end",   default=default_end)
-    p.add_argument("-f", "--format", default="json", choices=["json","html","md"])
+    p.add_argument("-f", "--format", default=["json"], nargs="+",
+                   help="one or more of json, html, md, site, search (rendered in a single pass)")
     p.add_argument("-d", "--dest",   default=".")
+    p.add_argument("-j", "--jobs", type=int, default=1,
+                   help="worker processes for html/md rendering and --offline parsing (0 = one per CPU core)")
+    p.add_argument("--profile", action="store_true",
+                   help="profile each stage and write reports to <dest>/profile/")
+    p.add_argument("--images", action="store_true",
+                   help="download embedded images while writing post.json and rewrite their src")
+    p.add_argument("--friend-groups-only", action="store_true",
+                   help="only refresh batch-downloads/friend-groups.json")
+    p.add_argument("--sync", action="store_true",
+                   help="only fetch posts changed since the previous run (full download if there is none)")
+    p.add_argument("--offline", action="store_true",
+                   help="rebuild every output from batch-downloads/ without logging in or fetching")
     a = p.parse_args()
-    if a.username and a.password:
-        return a.username, a.password, a.start, a.end, a.format, a.dest
+    try:
+        a.format = parse_formats(a.format)
+    except ValueError as e:
+        p.error(str(e))
+    if a.offline and (a.images or a.sync or a.friend_groups_only):
+        p.error("--offline cannot be combined with --images, --sync or --friend-groups-only")
+    if (a.username and a.password) or a.offline:
+        return (a.username, a.password, a.start, a.end, a.format, a.dest, a.jobs, a.profile, a.images,
+                a.friend_groups_only, a.sync, a.offline)
     return None
 
 
@@ -75,7 +121,7 @@ def interactive():
     end   = input(f"Enter end month   YYYY-MM [default: {default_end}]: ").strip() or default_end
     user  = input("Enter LiveJournal Username: ").strip()
     pw    = getpass.getpass("Enter LiveJournal Password: ")
-    return user, pw, start, end, "json", os.getcwd()
+    return user, pw, start, end, ["json"], os.getcwd(), 1, False, False, False, False, False
 
 
 # ─────────────────── HTTP helpers ──────────────────────────────────────── #
@@ -99,6 +145,8 @@ def month_ok(date_str: str | None, lo: str, hi: str) -> bool:
 
 def login(username: str, password: str) -> tuple[dict, dict]:
     """Login to LiveJournal and return cookies and headers for API calls."""
+    import requests
+
     pre = requests.get("https://www.livejournal.com/", headers=HDRS)
     cookies = {"luid": ck(pre, "luid")}
 
@@ -110,7 +158,7 @@ def login(username: str, password: str) -> tuple[dict, dict]:
         headers=HDRS,
     )
     if r.status_code != 200:
-        logger.error(f"Login failed with status code {r.status_code}")
+        logger.error("Login failed with status code %s", r.status_code)
         raise RuntimeError(f"Login failed ({r.status_code})")
 
     cookies = {
@@ -124,48 +172,114 @@ def login(username: str, password: str) -> tuple[dict, dict]:
 
 
 # ─────────────────── Main ──────────────────────────────────────────────── #
-def main():
-    user, pw, start, end, out_fmt, dest = parse_cli() or interactive()
+def save_friend_groups(cookies, api_hdr):
+    """Download friend groups (security masks) to batch-downloads/friend-groups.json."""
+    from download_friend_groups import download_friend_groups
 
-    Path(dest).mkdir(parents=True, exist_ok=True)
-    os.chdir(dest)
+    logger.debug("Downloading friend groups...")
+    friend_groups = download_friend_groups(cookies, api_hdr)
+    fg_dir = Path("batch-downloads")
+    fg_dir.mkdir(exist_ok=True)
+    with open(fg_dir / "friend-groups.json", "w", encoding="utf-8") as f:
+        json.dump(friend_groups, f, ensure_ascii=False, indent=2)
+    logger.info("Saved %s friend groups", len(friend_groups))
 
-    logger.info("Starting LiveJournal export...")
-    logger.debug(f"Export parameters: start={start}, end={end}, format={out_fmt}, dest={dest}")
 
+def fetch_all(user, pw, start, end, sync, friend_groups_only, profiler):
+    """
+    Log in and download posts, comments and friend groups.
+
+    Returns ``(posts, comments, changed)`` for combine(); all None after
+    ``--friend-groups-only``.
+    """
     try:
         cookies, api_hdr = login(user, pw)
     except RuntimeError as e:
         sys.exit(str(e))
 
+    if friend_groups_only:
+        save_friend_groups(cookies, api_hdr)
+        return None, None, None
+
+    from download_posts import download_posts
+    from download_comments import download_comments
+
     logger.info("Login successful – downloading content...")
     # Parse start/end as datetime objects for download_posts
     start_dt = datetime.strptime(start, "%Y-%m")
     end_dt = datetime.strptime(end, "%Y-%m")
     
     logger.debug("Downloading posts...")
-    posts = [p for p in download_posts(cookies, api_hdr, start_dt, end_dt)
-            if month_ok(p["date"], start, end)]
-    logger.info(f"Downloaded {len(posts)} posts")
+    with profiler.stage("post-fetch"):
+        synced = None
+        if sync:
+            from sync_posts import sync_posts
+            synced = sync_posts(cookies, api_hdr)
+        if synced is None:
+            from sync_posts import record_full_export
+            all_posts, changed = download_posts(cookies, api_hdr, start_dt, end_dt), None
+            record_full_export(all_posts)
+        else:
+            all_posts, changed = synced
+        posts = [p for p in all_posts if month_ok(p["date"], start, end)]
+    logger.info("Downloaded %s posts", len(posts))
     
     logger.debug("Downloading comments...")
-    comments = [c for c in download_comments(cookies, api_hdr)
-            if month_ok(c.get("date", c.get("time")), start, end)]
-    logger.info(f"Downloaded {len(comments)} comments")
+    with profiler.stage("comment-fetch"):
+        if changed is not None:
+            from download_comments import sync_comments
+            all_comments, comment_changes = sync_comments(cookies, api_hdr, all_posts)
+            # Posts with new or re-stated comments are rewritten too
+            changed |= comment_changes
+        else:
+            all_comments = download_comments(cookies, api_hdr)
+        comments = [c for c in all_comments
+                if month_ok(c.get("date", c.get("time")), start, end)]
+    logger.info("Downloaded %s comments", len(comments))
     
-    # Download friend groups (security masks)
-    logger.debug("Downloading friend groups...")
-    friend_groups = download_friend_groups(cookies, api_hdr)
-    # Save friend groups to batch-downloads/friend-groups.json
-    fg_dir = Path("batch-downloads")
-    fg_dir.mkdir(exist_ok=True)
-    with open(fg_dir / "friend-groups.json", "w", encoding="utf-8") as f:
-        json.dump(friend_groups, f, ensure_ascii=False, indent=2)
-    logger.info(f"Saved {len(friend_groups)} friend groups")
+    save_friend_groups(cookies, api_hdr)
+    return posts, comments, changed
+
+
+def main():
+    user, pw, start, end, out_fmts, dest, jobs, profile, images, friend_groups_only, sync, offline = parse_cli() or interactive()
+    jobs = jobs or os.cpu_count() or 1
+
+    Path(dest).mkdir(parents=True, exist_ok=True)
+    os.chdir(dest)
+    profiler = StageProfiler(".", enabled=profile)
+
+    logger.info("Starting LiveJournal export...")
+    logger.debug("Export parameters: start=%s, end=%s, formats=%s, dest=%s", start, end, out_fmts, dest)
+
+    if offline:
+        # Everything comes from the raw data earlier runs saved; nothing is fetched
+        from offline import load_archive
+
+        with profiler.stage("offline-load"):
+            try:
+                all_posts, all_comments = load_archive(jobs=jobs)
+            except FileNotFoundError as e:
+                sys.exit(str(e))
+            posts = [p for p in all_posts if month_ok(p["date"], start, end)]
+            comments = [c for c in all_comments
+                    if month_ok(c.get("date", c.get("time")), start, end)]
+        changed = None
+        logger.info("Rebuilding %s posts and %s comments offline", len(posts), len(comments))
+    else:
+        posts, comments, changed = fetch_all(user, pw, start, end, sync, friend_groups_only, profiler)
+        if posts is None:
+            return
 
     logger.debug("Combining and saving content...")
-    combine(posts, comments, out_fmt)
-    logger.info(f"Export complete → {Path(dest).resolve()}")
+    with profiler.stage("combine"):
+        if images:
+            # Images are fetched and <img src> rewritten while post.json is written
+            with MediaRewriter(Path(".")) as media:
+                combine(posts, comments, out_fmts, jobs, changed, media, user, (start, end))
+        else:
+            combine(posts, comments, out_fmts, jobs, changed, journal=user, months=(start, end))
+    logger.info("Export complete → %s", Path(dest).resolve())
 
 
 # ─────────────────── unchanged legacy helpers (combine, HTML, etc.) ───── #
@@ -175,9 +289,14 @@ USER = re.compile(r'<lj user="?(.*?)"?>')
 TAGLESS_NEWLINES = re.compile(r"(?<!>)\n")
 NEWLINES = re.compile(r"(\s*\n){3,}")
 SLUGS = {}
+# Shared converters + memoized conversions; combine() loads/saves its disk cache
+RENDER = RenderEngine("batch-downloads/render-cache.json")
 
 
-def fix_user_links(js):
+def fix_user_links(js, users=None):
+    """Replace <lj user=...> tags with the bare name (skipped if a scan found none)."""
+    if users is not None and not users:
+        return
     if "subject" in js:
         js["subject"] = USER.sub(r"\1", js["subject"])
     if "body" in js:
@@ -197,6 +316,7 @@ def json_to_html(js):
 def get_slug(js):
     slug = js["subject"] or js["id"]
     if "<" in slug or "&" in slug:
+        from bs4 import BeautifulSoup
         slug = BeautifulSoup(f"<p>{slug}</p>", "lxml").text
     slug = re.sub(r"\W+", "-", slug).strip("-")
     if slug in SLUGS:
@@ -205,17 +325,19 @@ def get_slug(js):
     return slug
 
 
-def json_to_markdown(js):
-    body = TAGLESS_NEWLINES.sub("<br>", js["body"])
-    h = html2text.HTML2Text()
-    h.body_width = 0
-    h.unicode_snob = True
-    body = h.handle(body)
-    body = NEWLINES.sub("\n\n", body)
+def html_to_text(html):
+    """LJ body HTML → normalized markdown text (shared by the md format and the search index)."""
+    body = TAGLESS_NEWLINES.sub("<br>", html)
+    body = RENDER.html_to_markdown(body)
+    return NEWLINES.sub("\n\n", body)
+
+
+def json_to_markdown(js, slug=None):
+    body = html_to_text(js["body"])
     tags = TAG.findall(body)
     js["tags"] = f"\ntags: {', '.join(tags)}" if tags else ""
     js["body"] = TAG.sub("", body).strip()
-    js["slug"] = get_slug(js)
+    js["slug"] = slug or get_slug(js)
     js["subject"] = js["subject"] or js["date"]
     return (
         "id: {id}\n"
@@ -234,46 +356,138 @@ def group_comments_by_post(comments):
 
 
 def nest_comments(cmts):
+    """
+    Link comments into reply trees and return the top-level comments.
+
+    Comments are sorted by id once here, so every ``children`` list (and the
+    returned roots) is already in id order for the renderers below.
+    """
     root = []
-    for c in cmts.values():
+    for c in sorted(cmts.values(), key=itemgetter("id")):
         fix_user_links(c)
-        if "parentid" not in c:
+        parent = cmts.get(c.get("parentid")) if "parentid" in c else None
+        if parent is None:
             root.append(c)
         else:
-            cmts[c["parentid"]].setdefault("children", []).append(c)
+            parent.setdefault("children", []).append(c)
     return root
 
 
-def comment_to_li(c):
-    if c.get("state") == "D":
-        return ""
+def _comment_head(c):
+    """Opening <li> plus the comment's own content (no replies, no closing tag)."""
     html = f"<h3>{c.get('author','anonym')}: {c.get('subject','')}</h3>"
     html += f"\n<a id='comment-{c['id']}'></a>"
     if "body" in c:
-        html += "\n" + markdown(TAGLESS_NEWLINES.sub("<br>\n", c["body"]))
-    if c.get("children"):
-        html += "\n" + comments_to_html(c["children"])
+        html += "\n" + RENDER.markdown_to_html(TAGLESS_NEWLINES.sub("<br>\n", c["body"]))
     subj_cls = " class=subject" if "subject" in c else ""
-    return f"<li{subj_cls}>{html}\n</li>"
+    return f"<li{subj_cls}>{html}"
+
+
+def comment_to_li(c):
+    if c.get("state") == "D":
+        return ""
+    if c.get("children"):
+        return f"{_comment_head(c)}\n{comments_to_html(c['children'])}\n</li>"
+    return f"{_comment_head(c)}\n</li>"
 
 
 def comments_to_html(comments):
-    items = "\n".join(
-        comment_to_li(c) for c in sorted(comments, key=itemgetter("id"))
-    )
-    return f"<ul>\n{items}\n</ul>"
+    """
+    Render a comment tree as nested <ul>/<li> HTML.
+
+    Uses an explicit stack instead of recursion so arbitrarily deep reply
+    chains can't hit the recursion limit, and collects output in a list that
+    is joined once. Expects children in id order, as built by nest_comments().
+    """
+    parts = ["<ul>\n"]
+    stack = [iter(comments)]
+    first = [True]
+    while stack:
+        c = next(stack[-1], None)
+        if c is None:
+            # Finished one <ul>; close it and the <li> that owns it (if any)
+            stack.pop()
+            first.pop()
+            parts.append("\n</ul>")
+            if stack:
+                parts.append("\n</li>")
+            continue
+        if not first[-1]:
+            parts.append("\n")
+        first[-1] = False
+        if c.get("state") == "D":
+            continue
+        parts.append(_comment_head(c))
+        if c.get("children"):
+            parts.append("\n<ul>\n")
+            stack.append(iter(c["children"]))
+            first.append(True)
+        else:
+            parts.append("\n</li>")
+    return "".join(parts)
 
 
-def save_as_json(pid, post, cmts, out_fmt):
-    if out_fmt != "json":
-        return
-    # Compute hierarchical post folder path
+def iter_comments(cmts):
+    """Yield every comment of a tree in pre-order, without recursion."""
+    stack = list(reversed(cmts))
+    while stack:
+        comment = stack.pop()
+        yield comment
+        stack.extend(reversed(comment.get("children", [])))
+
+
+def json_dumps_tree(obj, indent=2):
+    """
+    ``json.dumps(obj, ensure_ascii=False, indent=indent)`` that also copes with
+    comment trees deeper than the recursion limit: the rare deep thread falls
+    back to the (slower) stack-based encoder with identical output.
+    """
+    try:
+        return json.dumps(obj, ensure_ascii=False, indent=indent)
+    except RecursionError:
+        return _json_dumps_stack(obj, indent)
+
+
+def _json_dumps_stack(obj, indent=2):
+    """Encode nested dicts/lists with an explicit stack instead of recursion."""
+    parts = []
+    stack = [(False, obj, 0)]  # (is_literal, value, nesting level)
+    while stack:
+        literal, value, level = stack.pop()
+        if literal:
+            parts.append(value)
+        elif isinstance(value, dict) and value:
+            pad = "\n" + " " * (indent * (level + 1))
+            stack.append((True, "\n" + " " * (indent * level) + "}", 0))
+            items = list(value.items())
+            for i in range(len(items) - 1, -1, -1):
+                key, item = items[i]
+                stack.append((False, item, level + 1))
+                key = key if isinstance(key, str) else json.dumps(key).strip('"')
+                sep = "{" if i == 0 else ","
+                stack.append((True, f"{sep}{pad}{json.dumps(key, ensure_ascii=False)}: ", 0))
+        elif isinstance(value, (list, tuple)) and value:
+            pad = "\n" + " " * (indent * (level + 1))
+            stack.append((True, "\n" + " " * (indent * level) + "]", 0))
+            for i in range(len(value) - 1, -1, -1):
+                stack.append((False, value[i], level + 1))
+                stack.append((True, ("[" if i == 0 else ",") + pad, 0))
+        else:
+            parts.append(json.dumps(value, ensure_ascii=False))
+    return "".join(parts)
+
+
+def json_post_dir(pid, post):
+    """Hierarchical folder of a post's post.json (and its media/)."""
     eventtime = post.get("eventtime") or post.get("date")
     if eventtime:
         dt = datetime.strptime(eventtime, "%Y-%m-%d %H:%M:%S")
-        post_dir = Path(f"posts/{dt.year}/{dt.month:02d}/{dt.strftime('%Y-%m-%d-%H-%M')}-{pid}")
-    else:
-        post_dir = Path(f"posts/unknown-date/{pid}")
+        return Path(f"posts/{dt.year}/{dt.month:02d}/{dt.strftime('%Y-%m-%d-%H-%M')}-{pid}")
+    return Path(f"posts/unknown-date/{pid}")
+
+
+def save_as_json(pid, post, cmts, meta=None):
+    post_dir = json_post_dir(pid, post)
     post_dir.mkdir(parents=True, exist_ok=True)
     # Add post_url to post
     username = post.get("username")
@@ -286,64 +500,223 @@ def save_as_json(pid, post, cmts, out_fmt):
         post["post_url"] = post_url
     # Save main post JSON
     with open(post_dir / "post.json", "w", encoding="utf-8") as f:
-        json.dump({"id": pid, "post": post, "comments": cmts}, f, ensure_ascii=False, indent=2)
+        record = {"id": pid, "post": post, "comments": cmts}
+        if meta is not None:
+            record["meta"] = meta  # body_scan record: images, users, links, embeds
+        f.write(json_dumps_tree(record))
     # Save each comment in its own folder if present
     if cmts:
         comments_dir = post_dir / "comments"
         comments_dir.mkdir(exist_ok=True)
-        def save_comment_tree(comment):
-            cid = comment["id"]
-            cdir = comments_dir / str(cid)
-            cdir.mkdir(exist_ok=True)
-            # Add comment_url to comment
-            if post_url:
+        # Add comment_url to comments
+        if post_url:
+            for comment in iter_comments(cmts):
+                cid = comment["id"]
                 comment["comment_url"] = f"{post_url}?thread={cid}#t{cid}"
+        for comment in iter_comments(cmts):
+            cdir = comments_dir / str(comment["id"])
+            cdir.mkdir(exist_ok=True)
             with open(cdir / "comment.json", "w", encoding="utf-8") as cf:
-                json.dump(comment, cf, ensure_ascii=False, indent=2)
-            for child in comment.get("children", []):
-                save_comment_tree(child)
-        for comment in cmts:
-            save_comment_tree(comment)
+                cf.write(json_dumps_tree(comment))
         # Only create comments.json if there are comments
         with open(f"{post_dir}/comments.json", "w", encoding="utf-8") as f:
-            json.dump(cmts, f, ensure_ascii=False, indent=2)
+            f.write(json_dumps_tree(cmts))
 
 
-def save_as_markdown(pid, subfolder, post, cmts_html, out_fmt):
-    if out_fmt != "md":
-        return
+def save_as_markdown(pid, subfolder, slug, md_text, cmts_html):
     Path(f"posts-markdown/{subfolder}").mkdir(parents=True, exist_ok=True)
     with open(f"posts-markdown/{subfolder}/{pid}.md", "w", encoding="utf-8") as f:
-        f.write(json_to_markdown(post))
+        f.write(md_text)
     if cmts_html:
-        with open(f"comments-markdown/{post['slug']}.md", "w", encoding="utf-8") as f:
+        Path("comments-markdown").mkdir(exist_ok=True)
+        with open(f"comments-markdown/{slug}.md", "w", encoding="utf-8") as f:
             f.write(cmts_html)
 
 
-def save_as_html(pid, subfolder, post, cmts_html, out_fmt):
-    if out_fmt != "html":
-        return
+def save_as_html(pid, subfolder, html_text):
     Path(f"posts-html/{subfolder}").mkdir(parents=True, exist_ok=True)
     with open(f"posts-html/{subfolder}/{pid}.html", "w", encoding="utf-8") as f:
-        f.write(json_to_html(post))
-        if cmts_html:
-            f.write(f"\n<h2>{COMMENTS_HEADER}</h2>\n{cmts_html}")
+        f.write(html_text)
+
+
+def render_post(task):
+    """
+    Render one post's html/md output. Pure CPU and free of shared state, so it
+    can run in a worker process.
+
+    ``task`` is ``(post, comments, out_fmts, slug, links)`` where ``comments``
+    is the post's flat comment list (the tree is rebuilt here rather than
+    pickled, since deep trees would exceed pickle's recursion limit), ``slug``
+    was assigned by the parent so SLUGS dedup stays in post order, and
+    ``links`` maps the post's internal link URLs to link_index targets.
+    """
+    post, comments, out_fmts, slug, links = task
+
+    def tree_html(cmts):
+        return comments_to_html(nest_comments({c["id"]: c for c in cmts})) if cmts else ""
+
+    out = {}
+    # Without internal links every format shares one comment tree rendering
+    cmts_html = tree_html(comments) if not links else None
+    if "html" in out_fmts:
+        html_post, html_cmts = localize_links(post, comments, links, "html", 2)
+        out["html"] = json_to_html(html_post)
+        html_comments = cmts_html if cmts_html is not None else tree_html(html_cmts)
+        if html_comments:
+            out["html"] += f"\n<h2>{COMMENTS_HEADER}</h2>\n{html_comments}"
+    if "md" in out_fmts:
+        md_post, _ = localize_links(post, None, links, "md", 2)
+        # json_to_markdown rewrites body/subject in place; keep the caller's post intact
+        out["md"] = json_to_markdown(dict(md_post), slug)
+        # comments-markdown/<slug>.md sits one folder below the root
+        out["md_comments"] = cmts_html if cmts_html is not None else tree_html(
+            localize_links({}, comments, links, "md", 1)[1])
+    # New conversions (and the keys hit) go back to the parent, which owns the disk cache
+    out["render_cache"] = RENDER.drain_new()
+    out["render_used"] = RENDER.drain_used()
+    return out
+
+
+def site_post_body(post, comments):
+    """Article + comment tree fragment for a static-site post page."""
+    cmts = nest_comments({c["id"]: dict(c) for c in comments}) if comments else None
+    html = "<article>\n<h1>{subject}</h1>\n{body}\n</article>".format(
+        subject=post["subject"] or post["date"],
+        body=TAGLESS_NEWLINES.sub("<br>\n", post["body"]),
+    )
+    if cmts:
+        html += f"\n<h2>{COMMENTS_HEADER}</h2>\n{comments_to_html(cmts)}"
+    return html
+
+
+def post_link(pid, post, out_fmts):
+    """
+    Path (from the archive root) of the most browsable output written for a post.
 
+    Each format's folder is the one its writer uses: the site and post.json
+    go by eventtime, html/md by the ``date`` month (see combine()).
+    """
+    if "site" in out_fmts:
+        date = post.get("eventtime") or post["date"]
+        return f"site/{date[:4]}/{date[5:7]}/{pid}.html"
+    subfolder = post["date"][:7]
+    if "html" in out_fmts:
+        return f"posts-html/{subfolder}/{pid}.html"
+    if "md" in out_fmts:
+        return f"posts-markdown/{subfolder}/{pid}.md"
+    return (json_post_dir(pid, post) / "post.json").as_posix()
 
-def combine(posts, comments, out_fmt):
-    Path("comments-markdown").mkdir(exist_ok=True)
+
+RENDER_WINDOW = 64  # posts in flight per worker, bounds memory in parallel mode
+
+
+def combine(posts, comments, out_fmts, jobs=1, changed=None, media=None, journal=None, months=None):
+    """
+    Write every post (and its comment tree) in each requested format.
+
+    The comment tree and the normalized post are built once per post and
+    fanned out to all writers, so json+html+md cost one pass, not three.
+    With ``jobs > 1`` the html/md rendering is sharded across a process pool;
+    results are written in post order, so output is identical to a serial run.
+    The static site (``site``) is built last, once every post is known, and
+    only rewrites pages whose inputs changed since the previous run. The
+    search index (``search``) is filled post by post in the same pass.
+
+    ``changed`` (a set of jitemids, from ``--sync``) limits the per-post
+    json/html/md writes to those posts; site and search still see every post.
+
+    ``media`` (a media_rewrite.MediaRewriter) downloads each written post's
+    images while the window renders, then post.json is saved with ``<img src>``
+    pointing at the local copies.
+
+    ``journal`` (the exported username) enables internal link rewriting: an
+    index of every post is built first, then links between entries in html,
+    md and site pages point at the matching archive page (see link_index).
+
+    ``months`` (first, last ``YYYY-MM``) is the range *posts* was filtered to;
+    site pages and search entries of posts outside it are kept rather than pruned.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    out_fmts = parse_formats(out_fmts)
+    render_fmts = [f for f in out_fmts if f in ("html", "md")]
     p2c = group_comments_by_post(comments)
-    for post in posts:
-        pid = post["id"]
-        jitemid = int(pid) >> 8
-        date = datetime.strptime(post["date"], "%Y-%m-%d %H:%M:%S")
-        subfolder = f"{date.year}-{date.month:02d}"
-        cmts = nest_comments(p2c[jitemid]) if jitemid in p2c else None
-        cmts_html = comments_to_html(cmts) if cmts else ""
-        fix_user_links(post)
-        save_as_json(pid, post, cmts, out_fmt)
-        save_as_html(pid, subfolder, post, cmts_html, out_fmt)
-        save_as_markdown(pid, subfolder, post, cmts_html, out_fmt)
+    site = SiteBuilder("site", months=months) if "site" in out_fmts else None
+    search = SearchIndex("search", months=months) if "search" in out_fmts else None
+    index = None
+    if journal and (render_fmts or site is not None):
+        index = LinkIndex(journal)
+        for post in posts:
+            index.add(post)
+    pool = None
+    if jobs > 1 and render_fmts:
+        RENDER.load()  # forked workers inherit the loaded disk cache
+        pool = ProcessPoolExecutor(max_workers=jobs)
+        pool.submit(int).result()  # fork the workers now, before any image download thread exists
+    window = RENDER_WINDOW * max(jobs, 1)
+    try:
+        for start in range(0, len(posts), window):
+            tasks, targets, json_posts = [], [], []
+            for post in posts[start:start + window]:
+                pid = post["id"]
+                jitemid = int(pid) >> 8
+                date = datetime.strptime(post["date"], "%Y-%m-%d %H:%M:%S")
+                subfolder = f"{date.year}-{date.month:02d}"
+                group = p2c.get(jitemid)
+                write = changed is None or jitemid in changed
+                # Flat copies without "children": the worker nests its own tree
+                flat = [{k: v for k, v in c.items() if k != "children"} for c in group.values()] if group else None
+                # One scan of the raw post + comments, reused below and saved with the JSON
+                meta = post_meta(post, flat)
+                fix_user_links(post, meta["users"])
+                links = index.targets(meta["links"]) if index is not None else {}
+                if site is not None:
+                    site_post, site_cmts = localize_links(post, flat, links, "site", 3)
+                    site.add_post(dict(site_post), site_cmts)
+                if search is not None:
+                    texts = [post["subject"] or "", html_to_text(post["body"])]
+                    texts += [
+                        f"{c.get('subject', '')}\n{html_to_text(c['body'])}"
+                        for c in flat or () if "body" in c and c.get("state") != "D"
+                    ]
+                    search.add_post(post["subject"] or post["date"], post["date"],
+                                    "../" + post_link(pid, post, out_fmts), texts, pid=pid)
+                # Slugs are assigned for every post so SLUGS dedup matches a full run
+                slug = get_slug(post) if "md" in render_fmts else None
+                if render_fmts and write:
+                    tasks.append((dict(post), flat, render_fmts, slug, links))
+                    targets.append((pid, subfolder, slug))
+                if "json" in out_fmts and write:
+                    cmts = nest_comments(group) if group else None
+                    if media is None:
+                        save_as_json(pid, post, cmts, meta)
+                    else:
+                        queued = media.queue(json_post_dir(pid, post) / "media", meta["images"])
+                        json_posts.append((pid, post, group, cmts, meta, queued))
+
+            if pool is not None:
+                results = pool.map(render_post, tasks, chunksize=max(1, len(tasks) // (jobs * 4)))
+            else:
+                results = map(render_post, tasks)
+            for (pid, subfolder, slug), out in zip(targets, results):
+                RENDER.merge(out["render_cache"], out["render_used"])
+                if "html" in out:
+                    save_as_html(pid, subfolder, out["html"])
+                if "md" in out:
+                    save_as_markdown(pid, subfolder, slug, out["md"], out["md_comments"])
+            for pid, post, group, cmts, meta, queued in json_posts:
+                texts = post_texts(post, group.values() if group else ())
+                rewrite_post_images(texts, meta, media.settle(queued))
+                save_as_json(pid, post, cmts, meta)
+        if site is not None:
+            site.build(site_post_body)
+        if search is not None:
+            search.write()
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        # Keep conversions from this run (even a partial one) for the next run
+        RENDER.save()
 
 
 if __name__ == "__main__":
@@ -354,6 +727,6 @@ if __name__ == "__main__":
         print("\nProcess interrupted by user.", file=sys.stderr) # Also print a simple message to stderr
         sys.exit(130) # Standard exit code for Ctrl+C
     except Exception as e:
-        logger.exception(f"An unhandled exception occurred: {e}")
+        logger.exception("An unhandled exception occurred: %s", e)
         sys.exit(1)
 
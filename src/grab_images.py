@@ -3,71 +3,158 @@
 # All code is commented for clarity for junior developers.
 # NOTE: This script is now in src/ and is not used directly in the Docker workflow. The main entry point is run_backup.sh in the project root.
 
-import sys, os, json, pathlib, requests, tqdm
-from bs4 import BeautifulSoup
+import argparse, sys, os, json, pathlib, re
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from body_scan import empty_meta, scan_body
+from export import iter_comments, json_dumps_tree, json_post_dir
+from logger import setup_logger
+from media_rewrite import MediaRewriter, is_remote, rewrite_post_images
+from profiler import StageProfiler
+from progress import StageProgress
+
+logger = setup_logger(__name__)
+
+# export.py --images already downloads images and rewrites <img src> while it
+# writes post.json. This script is the repair pass: it only touches posts that
+# still reference remote images (new posts, or downloads that failed before).
 
-ROOT = pathlib.Path(sys.argv[1]).expanduser()
-POSTS_JSON = ROOT / "posts-json"
-POSTS_DIR = ROOT / "posts"
-IMG_DIR = ROOT / "images"
-IMG_DIR.mkdir(parents=True, exist_ok=True)
 
 # Recursively find all post.json files in posts/ and all .json in posts-json/
-def find_post_jsons():
-    for jf in POSTS_JSON.glob("*.json"):
+def find_post_jsons(root):
+    for jf in (root / "posts-json").glob("*.json"):
         yield jf
-    for jf in POSTS_DIR.rglob("post.json"):
+    for jf in (root / "posts").rglob("post.json"):
         yield jf
 
-for jf in tqdm.tqdm(list(find_post_jsons()), desc="scanning posts"):
-    data = json.loads(jf.read_text())
-    # Use post.body if body_html is not present
-    body_html = data.get("body_html")
-    if not body_html and "post" in data and "body" in data["post"]:
-        body_html = data["post"]["body"]
-    if not body_html:
-        continue
-    soup = BeautifulSoup(body_html, "lxml")
-    comments = data.get("comments") or []
-    for c in comments:
-        soup.append(BeautifulSoup(c.get("body_html", c.get("body", "")), "lxml"))
-
-    # Find all images first
-    images = soup.find_all("img", src=True)
-    if not images:
-        continue  # Skip if no images found
-
-    # Only create media directory if we have images
-    post_date = None
-    if "post" in data:
-        post_date = data["post"].get("eventtime") or data["post"].get("date")
-    if post_date:
-        from datetime import datetime
-        dt = datetime.strptime(post_date, "%Y-%m-%d %H:%M:%S")
-        media_dir = ROOT / f"posts/{dt.year}/{dt.month:02d}/{dt.strftime('%Y-%m-%d-%H-%M')}-{data['id']}/media"
-    else:
-        media_dir = ROOT / f"posts/unknown-date/{data['id']}/media"
-    media_dir.mkdir(parents=True, exist_ok=True)
-
-    for img in images:
-        url = img["src"].split("?")[0]
-        fname = media_dir / os.path.basename(url)
-        print(f"Found image: {url} -> {fname}")
-        if not fname.exists():
-            try:
-                r = requests.get(url, timeout=15)
-                r.raise_for_status()
-                fname.write_bytes(r.content)
-                print(f"Downloaded: {fname}")
-            except Exception as e:
-                print(f"Failed to download {url}: {e}")
-                continue
-        img["src"] = f"media/{fname.name}"
-
-    # Save back to the correct field
+
+# Posts scanned ahead while earlier posts wait for their images, so the
+# scheduler always has several hosts to choose from
+SCAN_WINDOW = 50
+IMG_TAG = re.compile(r"<img\b", re.I)
+
+
+def grab_images(root, jobs=None):
+    """
+    Fetch and rewrite the remote images of every post file under *root*.
+
+    Reading, scanning and rewriting post files is CPU work and is sharded
+    over *jobs* processes (default: one per core; 1 = in this process);
+    downloads run on the MediaRewriter's own thread pool meanwhile.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    jobs = jobs or os.cpu_count() or 1
+    post_jsons = [str(jf) for jf in find_post_jsons(root)]
+    pool = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else None
+    if pool is not None:
+        pool.submit(int).result()  # fork the workers now, before any download thread exists
+    run = pool.map if pool is not None else map
+    rewrites = []
+    try:
+        with StageProgress("images", total=len(post_jsons), unit="posts") as progress, \
+                MediaRewriter(root, progress) as media:
+            chunks = {"chunksize": max(1, len(post_jsons) // (jobs * 4))} if pool is not None else {}
+            pending = deque()
+            for jf, scanned in zip(post_jsons, run(scan_post, post_jsons, [str(root)] * len(post_jsons), **chunks)):
+                if scanned is None:
+                    progress.advance()
+                    continue
+                media_dir, remote = scanned
+                for src in remote:
+                    logger.debug("Found image: %s", src)
+                pending.append((jf, media.queue(pathlib.Path(media_dir), remote)))
+                if len(pending) >= SCAN_WINDOW:
+                    rewrites.append(finish_post(*pending.popleft(), media, pool))
+                    progress.advance()
+            while pending:
+                rewrites.append(finish_post(*pending.popleft(), media, pool))
+                progress.advance()
+        for rewrite in rewrites:
+            if rewrite is not None:
+                rewrite.result()  # surface errors from the workers
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+
+def post_file_texts(data):
+    """(holder, key) pairs for every body in a post file (post.json or legacy posts-json)."""
     if "body_html" in data:
-        data["body_html"] = str(soup)
-    elif "post" in data and "body" in data["post"]:
-        data["post"]["body"] = str(soup)
-    jf.write_text(json.dumps(data, ensure_ascii=False, indent=2))
+        texts = [(data, "body_html")]
+    else:
+        texts = [(data["post"], k) for k in ("subject", "body") if data.get("post", {}).get(k)]
+    for c in iter_comments(data.get("comments") or []):
+        texts += [(c, k) for k in ("subject", "body_html", "body") if c.get(k)]
+    return texts
+
+
+def scan_post(jf, root):
+    """(media dir, remote image srcs) of one post file; None if it has nothing to fetch.
+
+    Runs in a worker process, so it takes and returns plain strings.
+    """
+    raw = pathlib.Path(jf).read_text(encoding="utf-8")
+    if not IMG_TAG.search(raw):
+        return None  # light scan: no <img> anywhere, skip the JSON parse entirely
+    data = json.loads(raw)
+    # The body_scan record saved by export.py (or a fresh scan for older files)
+    meta = data.get("meta")
+    if meta is None:
+        meta = empty_meta()
+        for holder, key in post_file_texts(data):
+            scan_body(holder[key], meta)
+    remote = [src for src in meta["images"] if is_remote(src)]
+    if not remote:
+        return None  # every image is local already: leave the file alone
+    media_dir = pathlib.Path(root) / json_post_dir(data.get("id"), data.get("post", {})) / "media"
+    return str(media_dir), remote
+
+
+def rewrite_post(jf, local):
+    """Point a post file's <img src> at the local copies in *local* and save it if anything changed."""
+    path = pathlib.Path(jf)
+    data = json.loads(path.read_text(encoding="utf-8"))
+    meta = data.get("meta")
+    if meta is None:
+        meta = empty_meta()
+        for holder, key in post_file_texts(data):
+            scan_body(holder[key], meta)
+    before = list(meta["images"])
+    if rewrite_post_images(post_file_texts(data), meta, local) or meta["images"] != before:
+        if "meta" in data or "post" in data:
+            data["meta"] = meta
+        path.write_text(json_dumps_tree(data), encoding="utf-8")
+        return True
+    return False
+
+
+def finish_post(jf, queued, media, pool=None):
+    """Wait for a post's images, then rewrite the file (in the pool if there is one)."""
+    local = media.settle(queued)
+    if not local:
+        return None
+    if pool is None:
+        rewrite_post(jf, local)
+        return None
+    return pool.submit(rewrite_post, jf, local)
+
+
+def main():
+    p = argparse.ArgumentParser(description="Download embedded images and rewrite <img src> to local copies.")
+    p.add_argument("root", help="archive directory written by export.py")
+    p.add_argument("-j", "--jobs", type=int, default=0,
+                   help="processes for scanning/rewriting post files (0 = one per CPU core)")
+    p.add_argument("--profile", action="store_true",
+                   help="profile the image rewrite stage and write reports to <root>/profile/")
+    a = p.parse_args()
+
+    root = pathlib.Path(a.root).expanduser()
+    profiler = StageProfiler(root, enabled=a.profile)
+    with profiler.stage("image-rewrite"):
+        grab_images(root, a.jobs)
+
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""http_client.py
+
+One retry policy for every HTTP request the exporter makes.
+
+``HTTPClient.get/post`` wrap ``requests`` with:
+
+- classified errors: connection errors, timeouts, 429 and 5xx are retried;
+  other 4xx (404, 403, ...) are raised at once, since asking again won't help
+- exponential backoff with full jitter, honouring ``Retry-After`` on 429/503
+- a circuit breaker per host: after BREAKER_THRESHOLD consecutive requests
+  that failed even after their retries, the host is skipped for
+  BREAKER_COOLDOWN seconds (CircuitOpenError, no network wait), then a single
+  trial request decides whether it is back. The breaker is only consulted
+  before a request's first attempt, so HTTP_RETRIES is never cut short.
+  LiveJournal itself (WAIT_HOSTS) is not skipped: the export can't go on
+  without it, so requests wait out the cooldown instead of failing
+
+Every response has already passed ``raise_for_status()``.
+
+    from http_client import client
+    r = client().get(url, timeout=15)
+
+``HTTP_RETRIES`` (env) sets the number of retries after the first attempt.
+Buffered responses are charged to the "api" bandwidth budget; streamed ones
+(``stream=True``) are charged by the caller as it reads them (see media_fetch).
+"""
+
+# NOTE: This script is now located in src/ and is intended to be run as a module or via Docker.
+# All code is commented for clarity for junior developers.
+
+from __future__ import annotations
+
+import os
+import random
+import sys
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bandwidth import budget
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+BACKOFF_BASE = 1.0     # seconds before the first retry (before jitter)
+BACKOFF_MAX = 60.0     # cap for one backoff / Retry-After wait
+BREAKER_THRESHOLD = 5  # consecutive failed requests (retries exhausted) that open a host's circuit
+BREAKER_COOLDOWN = 120.0
+# Hosts whose open circuit is waited out rather than skipped (the API/export host)
+WAIT_HOSTS = frozenset({"www.livejournal.com", "livejournal.com"})
+
+
+class CircuitOpenError(RuntimeError):
+    """The host failed repeatedly and is being skipped for a while."""
+
+
+class CircuitBreaker:
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN, clock=time.monotonic):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """False while open; after the cooldown one trial request is let through."""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self.clock() - self.opened_at >= self.cooldown:
+                self.opened_at = self.clock()  # half-open: one trial per cooldown
+                return True
+            return False
+
+    def remaining(self) -> float:
+        """Seconds until the next trial request is allowed (0 if closed)."""
+        with self._lock:
+            if self.opened_at is None:
+                return 0.0
+            return max(0.0, self.cooldown - (self.clock() - self.opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = self.clock()
+
+
+def retry_after(response) -> Optional[float]:
+    """Seconds from a Retry-After header (delta-seconds or HTTP date), if present."""
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class HTTPClient:
+    def __init__(self, session=None, retries: Optional[int] = None, sleep=time.sleep, rng=random.random,
+                 clock=time.monotonic, api_budget=None):
+        # Default transport is the requests module itself (resolved per call,
+        # so tests patching requests.get/post still apply)
+        self.session = session
+        self.retries = int(os.environ.get("HTTP_RETRIES", 4)) if retries is None else retries
+        self.sleep = sleep
+        self.rng = rng
+        self.clock = clock
+        self.api_budget = api_budget or budget("api")
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, url: str) -> CircuitBreaker:
+        host = urlparse(url).hostname or ""
+        with self._lock:
+            if host not in self.breakers:
+                self.breakers[host] = CircuitBreaker(clock=self.clock)
+            return self.breakers[host]
+
+    def backoff(self, attempt: int) -> float:
+        """Full jitter: uniform in [0, base * 2^attempt], capped."""
+        return self.rng() * min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+
+    def get(self, url, **kwargs):
+        return self.request("get", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("post", url, **kwargs)
+
+    def wait_for(self, url: str, breaker: CircuitBreaker):
+        """Raise CircuitOpenError while *url*'s host is skipped, or wait for it (WAIT_HOSTS)."""
+        host = urlparse(url).hostname
+        while not breaker.allow():
+            if host not in WAIT_HOSTS:
+                raise CircuitOpenError(f"{host} is failing; skipping {url}")
+            wait = max(1.0, breaker.remaining())
+            logger.warning("%s is failing; waiting %.0fs before trying again", host, wait)
+            self.sleep(wait)
+
+    def request(self, method: str, url: str, timeout: float = 30, **kwargs):
+        import requests
+
+        session = self.session or requests
+        breaker = self.breaker(url)
+        self.wait_for(url, breaker)
+        host_failed = False  # did the last attempt fail because of the host (not a 429)?
+        for attempt in range(self.retries + 1):
+            wait = None
+            try:
+                response = getattr(session, method)(url, timeout=timeout, **kwargs)
+                response.raise_for_status()
+            except requests.HTTPError as e:
+                status = e.response.status_code if e.response is not None else None
+                if status not in RETRY_STATUSES:
+                    breaker.record_success()  # the host answered; the URL is the problem
+                    raise
+                host_failed = status != 429
+                wait = retry_after(e.response)
+                error = e
+            except (requests.ConnectionError, requests.Timeout) as e:
+                host_failed = True
+                error = e
+            else:
+                breaker.record_success()
+                if self.api_budget.rate and not kwargs.get("stream"):
+                    self.api_budget.consume(len(response.content))
+                return response
+
+            if attempt == self.retries:
+                if host_failed:
+                    breaker.record_failure()  # one failure per request, after its retries
+                raise error
+            wait = min(BACKOFF_MAX, wait) if wait is not None else self.backoff(attempt)
+            logger.warning("%s %s failed (%s); retry %s/%s in %.1fs",
+                           method.upper(), url, error, attempt + 1, self.retries, wait)
+            self.sleep(wait)
+
+
+_client: Optional[HTTPClient] = None
+
+
+def client() -> HTTPClient:
+    """The process-wide client, so circuit breakers are shared by every stage."""
+    global _client
+    if _client is None:
+        _client = HTTPClient()
+    return _client
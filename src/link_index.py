@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""link_index.py
+
+Point links between entries of the archived journal at the archive itself.
+
+Posts and comments link to each other as ``https://<user>.livejournal.com/<ditemid>.html``
+(optionally ``?thread=<dtalkid>#t<dtalkid>``), ``/users/<user>/<ditemid>.html``
+or ``talkread.bml?journal=<user>&itemid=<n>``, where ``n`` is normally the
+ditemid but in old links the internal jitemid (ditemid >> 8).
+
+``LinkIndex`` is filled from the post list before anything is written, so a
+link to a later post resolves too; each post's ``meta["links"]`` (body_scan)
+is then resolved with dict lookups only. ``localize_links()`` rewrites the
+hrefs of one post and its comments for one output format, in one regex pass
+per text (body_scan.rewrite_links):
+
+    html   ../../posts-html/YYYY-MM/<ditemid>.html#comment-<jtalkid>
+    md     ../../posts-markdown/YYYY-MM/<ditemid>.md
+    site   ../../../site/YYYY/MM/<ditemid>.html#comment-<jtalkid>
+
+The html and md folders are named after the post's ``date`` (logtime), like
+the pages combine() writes; the site files posts under their eventtime, so a
+backdated post's site page lives in a different month.
+"""
+
+# NOTE: This script is now located in src/ and is intended to be run as a module or via Docker.
+# All code is commented for clarity for junior developers.
+
+from __future__ import annotations
+
+import os
+import sys
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from body_scan import rewrite_links
+
+# Path of a post's page from the archive root, per output format
+FORMAT_PATHS = {
+    "html": "posts-html/{year}-{month:02d}/{pid}.html",
+    "md": "posts-markdown/{year}-{month:02d}/{pid}.md",
+    "site": "site/{event_year}/{event_month:02d}/{pid}.html",
+}
+# Formats whose pages carry <a id='comment-N'> anchors for ?thread= links
+ANCHORED = {"html", "site"}
+
+
+class LinkIndex:
+    def __init__(self, journal: str):
+        self.journal = journal.lower().replace("-", "_")
+        self.by_ditemid: Dict[int, tuple] = {}
+        self.by_jitemid: Dict[int, tuple] = {}
+
+    def add(self, post: dict):
+        ditemid = int(post["id"])
+        date = datetime.strptime(post["date"], "%Y-%m-%d %H:%M:%S")
+        event = datetime.strptime(post.get("eventtime") or post["date"], "%Y-%m-%d %H:%M:%S")
+        entry = (post["id"], date.year, date.month, event.year, event.month)
+        self.by_ditemid[ditemid] = entry
+        self.by_jitemid[ditemid >> 8] = entry
+
+    def resolve(self, link: dict) -> Optional[dict]:
+        """Archive target of a body_scan link record, or None if it leaves the archive."""
+        if link["journal"].lower() != self.journal:
+            return None
+        if "ditemid" in link:
+            entry = self.by_ditemid.get(link["ditemid"])
+        else:
+            entry = self.by_ditemid.get(link["itemid"]) or self.by_jitemid.get(link["itemid"])
+        if entry is None:
+            return None
+        pid, year, month, event_year, event_month = entry
+        return {"pid": pid, "year": year, "month": month, "event_year": event_year,
+                "event_month": event_month, "thread": link.get("thread")}
+
+    def targets(self, links: Iterable[dict]) -> Dict[str, dict]:
+        """url → target for the links of one post that point inside the archive."""
+        out = {}
+        for link in links:
+            target = self.resolve(link)
+            if target is not None:
+                out[link["url"]] = target
+        return out
+
+
+def local_href(target: dict, fmt: str, depth: int) -> str:
+    """Relative href to *target*'s page in *fmt* from a page *depth* folders below the root."""
+    href = "../" * depth + FORMAT_PATHS[fmt].format(**target)
+    if target.get("thread") and fmt in ANCHORED:
+        href += f"#comment-{target['thread'] >> 8}"  # dtalkid → jtalkid, the comment's id
+    return href
+
+
+def localize_links(post: dict, comments, targets: Dict[str, dict], fmt: str, depth: int):
+    """Copies of *post* and *comments* with internal links rewritten (the originals if none)."""
+    if not targets:
+        return post, comments
+
+    def lookup(url):
+        target = targets.get(url)
+        return local_href(target, fmt, depth) if target else None
+
+    post = dict(post, body=rewrite_links(post.get("body"), lookup))
+    if comments:
+        # Always fresh dicts: callers nest each copy into its own reply tree
+        comments = [dict(c, body=rewrite_links(c["body"], lookup)) if c.get("body") else dict(c) for c in comments]
+    return post, comments
@@ -1,6 +1,6 @@
 #!/usr/bin/env bash
 # lj_full_backup.sh – runs inside the container
-# Needs: LJ_USER  LJ_PASS   (exported by run_backup.sh)
+# Needs: LJ_USER  LJ_PASS   (exported by run_backup.sh; OFFLINE=true needs neither)
 # Optional: DEST  (target dir, default /backup)
 # 
 # NOTE: This script is now in src/ and is not used directly in the Docker workflow. The main entry point is run_backup.sh in the project root.
@@ -19,17 +19,55 @@ echo "DEST: ${DEST:-/backup}"
 echo "START_MONTH: ${START_MONTH:-1999-01}"
 echo "END_MONTH: ${END_MONTH:-$(date -u +%Y-%m)}"
 echo "PYTHONUNBUFFERED: ${PYTHONUNBUFFERED:-not set}"
+echo "FORMAT: ${FORMAT:-json}"
+echo "JOBS: ${JOBS:-1}"
 echo "RUN_TESTS: ${RUN_TESTS:-false}"
+echo "PROFILE: ${PROFILE:-false}"
+echo "SYNC: ${SYNC:-false}"
+echo "OFFLINE: ${OFFLINE:-false}"
 echo "=== Environment check complete ==="
 
 ########################################
 # 0. Validate env vars
 ########################################
-: "${LJ_USER?Need LJ_USER env var (LiveJournal username)}"
-: "${LJ_PASS?Need LJ_PASS env var (LiveJournal password / app-password)}"
+OFFLINE="${OFFLINE:-false}"
+[[ "$OFFLINE" == "1" ]] && OFFLINE=true
+if [[ "$OFFLINE" != "true" ]]; then
+  : "${LJ_USER?Need LJ_USER env var (LiveJournal username)}"
+  : "${LJ_PASS?Need LJ_PASS env var (LiveJournal password / app-password)}"
+fi
 
 DEST="${DEST:-/backup}"
 
+# Optional per-stage profiling (reports land in $DEST/profile/)
+PROFILE_ARGS=()
+if [[ "${PROFILE:-false}" == "true" || "${PROFILE:-0}" == "1" ]]; then
+  PROFILE_ARGS=(--profile)
+fi
+
+# Incremental mode: only posts changed since the previous backup in $DEST
+SYNC_ARGS=()
+if [[ "${SYNC:-false}" == "true" || "${SYNC:-0}" == "1" ]]; then
+  SYNC_ARGS=(--sync)
+fi
+
+# Offline rebuild: re-render everything from $DEST/batch-downloads/, no login.
+# The username (if known) only enables internal link rewriting.
+if [[ "$OFFLINE" == "true" ]]; then
+  MODE_ARGS=(--offline)
+  [[ -n "${LJ_USER:-}" ]] && MODE_ARGS+=(--username "$LJ_USER")
+else
+  MODE_ARGS=(--username "$LJ_USER" --password "$LJ_PASS" --images "${SYNC_ARGS[@]}")
+fi
+
+# post.json is the backup itself, and --images rewrites <img src> in it:
+# always write json, other formats are rendered alongside
+FORMAT="${FORMAT:-json}"
+if [[ ",${FORMAT// /}," != *",json,"* ]]; then
+  echo "FORMAT=$FORMAT has no json; adding it (post.json is always written)"
+  FORMAT="json,$FORMAT"
+fi
+
 ########################################
 # 1. Run tests if requested
 ########################################
@@ -64,25 +102,20 @@ END_MONTH="${END_MONTH:-$(date -u +%Y-%m)}"          # current month (UTC)
 echo "=== Date range: $START_MONTH to $END_MONTH ==="
 
 ########################################
-# 4. Posts + comments + friend groups → JSON
+# 4. Posts + comments + friend groups → JSON, then
+#    images: download & rewrite <img src> (same python process)
 ########################################
 echo "=== Starting export.py ==="
 python /opt/livejournal-export/src/export.py \
-  --username "$LJ_USER" \
-  --password "$LJ_PASS" \
   --start    "$START_MONTH" \
   --end      "$END_MONTH" \
-  --format   json \
-  --dest     "$DEST"
+  --format   "$FORMAT" \
+  --jobs     "${JOBS:-1}" \
+  --dest     "$DEST" \
+  "${MODE_ARGS[@]}" \
+  "${PROFILE_ARGS[@]}"
 echo "=== export.py completed ==="
 
-########################################
-# 5. Images: download & rewrite <img src>
-########################################
-echo "=== Starting grab_images.py ==="
-python /opt/livejournal-export/src/grab_images.py "$DEST"
-echo "=== grab_images.py completed ==="
-
 echo "=== lj_full_backup.sh completed successfully ==="
 
 # No legacy cleanup needed; assume blank folder for each run.
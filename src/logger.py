@@ -1,9 +1,21 @@
 import os
+import atexit
+import itertools
 import logging
+import logging.handlers
+import queue
 import re
 import traceback
+from collections.abc import Mapping
 from typing import Optional
 
+# Debug payloads (raw API responses) are capped and sampled so that debug runs
+# don't spend their time formatting and printing megabytes of XML.
+PAYLOAD_MAX_CHARS = int(os.getenv('DEBUG_PAYLOAD_MAX', '2000'))
+PAYLOAD_SAMPLE_EVERY = max(1, int(os.getenv('DEBUG_PAYLOAD_SAMPLE', '10')))
+# Log arguments formatted in the caller's thread (see QueuedHandler.prepare)
+MUTABLE_ARGS = (dict, list, set, bytearray)
+
 class CompactTracebackFormatter(logging.Formatter):
     def formatException(self, exc_info):
         """
@@ -53,6 +65,89 @@ class CleanOutputHandler(logging.Handler):
         except Exception:
             self.handleError(record)
 
+class QueuedHandler(logging.handlers.QueueHandler):
+    """
+    Hand records to the background writer thread without formatting them.
+
+    The stock QueueHandler formats every record in the calling thread; this one
+    defers formatting to the writer. Only records with dict/list/set arguments
+    are merged into their message here, because the fetch loops keep changing
+    those containers after logging them; other mutable objects passed as
+    arguments must not be changed after the call. Records logged while no
+    writer is running (in a forked worker process, or after flush_logs() at
+    exit) are written directly.
+    """
+    def __init__(self, log_queue, target):
+        super().__init__(log_queue)
+        self.target = target
+        self.pid = os.getpid()
+
+    def prepare(self, record):
+        args = record.args
+        values = args.values() if isinstance(args, Mapping) else args or ()
+        if any(isinstance(v, MUTABLE_ARGS) for v in values):
+            # Snapshot now: the writer would format the container as it is later
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def emit(self, record):
+        if _listener is None or os.getpid() != self.pid:
+            self.target.handle(record)
+            return
+        super().emit(record)
+
+
+_queue = None
+_listener = None
+_output_handler = None
+
+
+def _get_queue_handler() -> QueuedHandler:
+    """Start the shared background writer on first use and return a handler feeding it."""
+    global _queue, _listener, _output_handler
+    if _queue is None:
+        _queue = queue.SimpleQueue()
+        _output_handler = CleanOutputHandler()
+        # Use the custom formatter for both regular messages and exceptions
+        _output_handler.setFormatter(CompactTracebackFormatter('%(levelname)s: %(message)s'))
+        atexit.register(flush_logs)
+    if _listener is None:
+        _listener = logging.handlers.QueueListener(_queue, _output_handler)
+        _listener.start()
+    return QueuedHandler(_queue, _output_handler)
+
+
+def flush_logs():
+    """Stop the writer thread after it has printed every queued record."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+_payload_counters = {}
+
+
+def log_payload(logger: logging.Logger, payload: Optional[str], msg: str, *args):
+    """
+    Log a large debug payload (e.g. a raw API response) cheaply.
+
+    Nothing is done unless DEBUG is enabled. Only every DEBUG_PAYLOAD_SAMPLE-th
+    payload per message template is logged, truncated to DEBUG_PAYLOAD_MAX
+    characters. ``msg``/``args`` describe the payload, logging-style.
+    """
+    if not logger.isEnabledFor(logging.DEBUG) or payload is None:
+        return
+    counter = _payload_counters.setdefault(msg, itertools.count())
+    if next(counter) % PAYLOAD_SAMPLE_EVERY:
+        return
+    if len(payload) > PAYLOAD_MAX_CHARS:
+        logger.debug(msg + ": %s… (%s more chars)", *args, payload[:PAYLOAD_MAX_CHARS], len(payload) - PAYLOAD_MAX_CHARS)
+    else:
+        logger.debug(msg + ": %s", *args, payload)
+
+
 def setup_logger(name: str, level: Optional[int] = None) -> logging.Logger:
     """
     Set up a logger with the specified name and debug level.
@@ -81,11 +176,8 @@ def setup_logger(name: str, level: Optional[int] = None) -> logging.Logger:
     
     logger.setLevel(level_map.get(level, logging.WARNING))
     
-    handler = CleanOutputHandler()
-    # Use the custom formatter for both regular messages and exceptions
-    formatter = CompactTracebackFormatter('%(levelname)s: %(message)s')
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
+    # Records are queued here and printed by a single background writer thread
+    logger.addHandler(_get_queue_handler())
     
     return logger
 
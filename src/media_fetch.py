@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""media_fetch.py
+
+Streaming, resumable downloads of images and userpics.
+
+``fetch_to_file()`` streams the body in CHUNK_SIZE pieces to ``<dest>.part``
+(so memory per download stays bounded however large the file is) and only
+renames it to ``dest`` once the size matches what the server announced:
+
+- an interrupted transfer is resumed with ``Range: bytes=<have>-``, both
+  within the call (RESUME_ATTEMPTS times) and on the next run, since the
+  ``.part`` file is kept
+- a server that ignores Range (200 instead of 206) restarts from scratch
+- Content-Length / Content-Range totals are verified before the rename
+- files larger than ``MEDIA_MAX_MB`` (env, default 100) are refused up front
+  when the size is announced, or aborted once that many bytes arrived
+- every chunk is charged to the "media" bandwidth budget (``MEDIA_MAX_KBPS``)
+"""
+
+# NOTE: This script is now located in src/ and is intended to be run as a module or via Docker.
+# All code is commented for clarity for junior developers.
+
+from __future__ import annotations
+
+import os
+import re
+import sys
+from pathlib import Path
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bandwidth import budget
+from http_client import client
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+RESUME_ATTEMPTS = 3
+CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+
+
+class MediaTooLarge(ValueError):
+    """The file exceeds the configured maximum size."""
+
+
+class IncompleteDownload(IOError):
+    """The transfer ended before the announced size was received."""
+
+
+def max_media_bytes() -> int:
+    return int(float(os.environ.get("MEDIA_MAX_MB", 100)) * 1024 * 1024)
+
+
+def expected_size(response, offset: int) -> Optional[int]:
+    """Total file size announced by the server, or None if unknown / compressed."""
+    if response.status_code == 206:
+        match = CONTENT_RANGE.match(response.headers.get("Content-Range", ""))
+        if match and match.group(3) != "*":
+            return int(match.group(3))
+        return None
+    if response.headers.get("Content-Encoding", "identity") != "identity":
+        return None  # Content-Length counts compressed bytes; iter_content yields decoded ones
+    length = response.headers.get("Content-Length")
+    return int(length) if length and length.isdigit() else None
+
+
+def fetch_to_file(url: str, dest, cookies=None, headers=None, timeout: float = 15,
+                  max_bytes: Optional[int] = None, http=None, bandwidth=None) -> Path:
+    """Download *url* to *dest* (streamed, resumable, size-checked) and return *dest*."""
+    import requests
+
+    dest = Path(dest)
+    part = dest.with_name(dest.name + ".part")
+    max_bytes = max_media_bytes() if max_bytes is None else max_bytes
+    http = http or client()
+    bandwidth = bandwidth or budget("media")
+
+    for _ in range(RESUME_ATTEMPTS + 1):
+        offset = part.stat().st_size if part.exists() else 0
+        request_headers = dict(headers or {})
+        if offset:
+            request_headers["Range"] = f"bytes={offset}-"
+        try:
+            response = http.get(url, cookies=cookies, headers=request_headers, timeout=timeout, stream=True)
+        except requests.HTTPError as e:
+            if offset and e.response is not None and e.response.status_code == 416:
+                # Our partial file doesn't match the server's; start over
+                part.unlink(missing_ok=True)
+                continue
+            raise
+        with response:
+            if response.status_code != 206:
+                offset = 0  # Range ignored: the body is the whole file
+            total = expected_size(response, offset)
+            if total is not None and total > max_bytes:
+                part.unlink(missing_ok=True)
+                raise MediaTooLarge(f"{url} is {total} bytes (limit {max_bytes})")
+            received = offset
+            try:
+                with open(part, "ab" if offset else "wb") as f:
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        received += len(chunk)
+                        if received > max_bytes:
+                            f.close()
+                            part.unlink(missing_ok=True)
+                            raise MediaTooLarge(f"{url} exceeds {max_bytes} bytes")
+                        f.write(chunk)
+                        bandwidth.consume(len(chunk))
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                logger.debug("Download of %s interrupted at %s bytes (%s)", url, received, e)
+                continue  # resume from what we have
+        if total is not None and received != total:
+            if received < total:
+                continue
+            part.unlink(missing_ok=True)
+            raise IncompleteDownload(f"{url}: got {received} bytes, expected {total}")
+        os.replace(part, dest)
+        return dest
+
+    raise IncompleteDownload(f"{url}: still incomplete after {RESUME_ATTEMPTS} resumes; "
+                             f"kept {part.name} for the next run")
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""media_index.py
+
+Canonical media URLs and a persistent URL → local-file index.
+
+The same picture is referenced in many spellings: http vs https, the
+``ic.pics.livejournal.com`` mirror of ``pics.livejournal.com``, a trailing
+slash, ``%7E`` vs ``~``. ``canonical_url()`` collapses them, so each image is
+downloaded once and later posts get a hard link (or copy) of the file.
+
+``MediaIndex`` also hands out local file names. Two different images with the
+same basename in one ``media/`` folder no longer overwrite each other: the
+second gets a short hash of its canonical URL appended (``photo-1a2b3c4d.jpg``).
+The index is kept in ``batch-downloads/media-index.json``.
+"""
+
+# NOTE: This script is now located in src/ and is intended to be run as a module or via Docker.
+# All code is commented for clarity for junior developers.
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import parse_qsl, quote, unquote, urlencode, urlsplit, urlunsplit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+DEFAULT_PATH = "batch-downloads/media-index.json"
+# Hosts that serve the same files under another name
+HOST_ALIASES = {
+    "ic.pics.livejournal.com": "pics.livejournal.com",
+    "l-userpic.livejournal.com": "userpic.livejournal.com",
+}
+DEFAULT_PORTS = {"http": 80, "https": 443}
+PATH_SAFE = "/:@!$&'()*+,;=~-._"
+UNSAFE_NAME = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+
+
+def canonical_url(url: str) -> str:
+    """One spelling per image: https, lower-case host, aliases folded, path re-encoded."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower().rstrip(".")
+    host = HOST_ALIASES.get(host, host)
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    if scheme in DEFAULT_PORTS:
+        scheme = "https"
+    path = quote(unquote(parts.path), safe=PATH_SAFE) or "/"
+    if len(path) > 1:
+        path = path.rstrip("/")
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, path, query, ""))
+
+
+def media_name(url: str) -> str:
+    """File name for an image: the decoded basename of its path, made filesystem-safe."""
+    name = UNSAFE_NAME.sub("_", os.path.basename(unquote(urlsplit(url).path).rstrip("/")))
+    return name.strip(". ") or "image"
+
+
+def link_or_copy(source: Path, dest: Path):
+    """Hard-link *source* to *dest* (same bytes, no extra space), copying if links fail."""
+    try:
+        os.link(source, dest)
+    except OSError:
+        shutil.copyfile(source, dest)
+
+
+class MediaIndex:
+    def __init__(self, root: str | os.PathLike = ".", path: Optional[str | os.PathLike] = None):
+        self.root = Path(root)
+        self.path = Path(path) if path else self.root / DEFAULT_PATH
+        self.files: Dict[str, str] = {}   # file relative to root → canonical URL
+        self.by_url: Dict[str, str] = {}  # canonical URL → first file holding it
+        self.reused = 0
+        self._load()
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        try:
+            self.files = json.loads(self.path.read_text(encoding="utf-8")).get("files", {})
+        except ValueError:
+            logger.warning("Ignoring unreadable media index %s", self.path)
+            return
+        for rel, canon in self.files.items():
+            self.by_url.setdefault(canon, rel)
+
+    def _rel(self, path: Path) -> str:
+        return Path(os.path.relpath(path, self.root)).as_posix()
+
+    def assign(self, url: str, media_dir: Path) -> Path:
+        """Local file for *url* in *media_dir*, renamed if another image already has its name."""
+        canon = canonical_url(url)
+        name = media_name(url)
+        dest = Path(media_dir) / name
+        owner = self.files.get(self._rel(dest))
+        if owner is not None and owner != canon:
+            stem, ext = os.path.splitext(name)
+            dest = Path(media_dir) / f"{stem}-{hashlib.sha1(canon.encode('utf-8')).hexdigest()[:8]}{ext}"
+        # A file from before the index existed is adopted by the first URL that names it
+        self.files[self._rel(dest)] = canon
+        return dest
+
+    def existing(self, url: str) -> Optional[Path]:
+        """A file already holding *url*'s image, if any survived on disk."""
+        rel = self.by_url.get(canonical_url(url))
+        if rel and (self.root / rel).exists():
+            return self.root / rel
+        return None
+
+    def record(self, url: str, dest: Path):
+        """Note that *dest* now holds *url*'s image."""
+        if self.existing(url) is None:
+            self.by_url[canonical_url(url)] = self._rel(dest)
+
+    def provide(self, url: str, dest: Path) -> bool:
+        """Fill *dest* from an earlier copy of the same image; False if it must be downloaded."""
+        source = self.existing(url)
+        if source is None or source == dest:
+            return False
+        link_or_copy(source, dest)
+        self.reused += 1
+        return True
+
+    def save(self):
+        # Names handed out for downloads that failed are released again
+        files = {rel: canon for rel, canon in self.files.items() if (self.root / rel).exists()}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": files}, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+        logger.info("Media index: %s files, %s images reused instead of downloaded", len(files), self.reused)
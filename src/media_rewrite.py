@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""media_rewrite.py
+
+Download a post's embedded images and point its ``<img src>`` at the local
+copies, in the same pass that writes the post.
+
+``MediaRewriter`` bundles the pieces every image download goes through (the
+dead-media cache, the URL → file index and the per-host scheduler):
+
+    with MediaRewriter(root) as media:
+        queued = media.queue(post_dir / "media", meta["images"])   # starts downloads
+        ...                                                      # other work meanwhile
+        rewrite_post_images(post, comments, meta, media.settle(queued))
+
+export.py uses it while writing post.json (``--images``); grab_images.py uses
+it as a repair pass over posts that still reference remote images.
+"""
+
+# NOTE: This script is now located in src/ and is intended to be run as a module or via Docker.
+# All code is commented for clarity for junior developers.
+
+from __future__ import annotations
+
+import contextlib
+import os
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from body_scan import rewrite_images
+from dead_media import DeadMediaCache
+from logger import setup_logger
+from media_index import MediaIndex, canonical_url, link_or_copy
+from media_scheduler import MediaScheduler
+
+logger = setup_logger(__name__)
+
+LOCAL_PREFIX = "media/"  # src of an image already rewritten to the post's media/ folder
+
+
+def media_key(src: str) -> str:
+    """Key shared by every spelling of an image URL (the query is ignored, as before)."""
+    return canonical_url(src.split("?")[0])
+
+
+def is_remote(src: str) -> bool:
+    # Case-insensitive, like canonical_url: HTTP://h/a.png is the same image as http://h/a.png
+    return urlsplit(src).scheme.lower() in ("http", "https")
+
+
+class MediaRewriter:
+    def __init__(self, root: str | os.PathLike = ".", progress=None):
+        self.root = Path(root)
+        (self.root / "images").mkdir(parents=True, exist_ok=True)
+        self.progress = progress
+        self.dead = DeadMediaCache(self.root / "batch-downloads" / "dead-media.json")
+        self.index = MediaIndex(self.root)
+        self.scheduler = MediaScheduler()
+
+    def __enter__(self):
+        self.scheduler.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            self.scheduler.__exit__(*exc)
+        finally:
+            self.dead.save()
+            self.index.save()
+        return False
+
+    def _download(self, url, fname):
+        from media_fetch import fetch_to_file
+
+        with self.progress.request() if self.progress else contextlib.nullcontext():
+            return fetch_to_file(url, fname, timeout=15)
+
+    def queue(self, media_dir: Path, srcs: Iterable[str]) -> list:
+        """Start downloading the remote images among *srcs*; returns what settle() needs."""
+        queued = []
+        for src in srcs:
+            if not is_remote(src):
+                continue
+            url = src.split("?")[0]
+            media_dir.mkdir(parents=True, exist_ok=True)
+            fname = self.index.assign(url, media_dir)
+            future = None
+            # Equivalent URLs share one download; a copy from another post is linked in
+            if not fname.exists() and not self.index.provide(url, fname):
+                kind = self.dead.check(url)
+                if kind:
+                    logger.info("Skipping known-dead image (%s): %s", kind, url)
+                    continue
+                future = self.scheduler.submit(url, canonical_url(url), self._download, url, fname)
+            queued.append((url, fname, future))
+        return queued
+
+    def settle(self, queued: list) -> Dict[str, str]:
+        """Wait for queued downloads; returns media_key → local src for the ones on disk."""
+        local = {}
+        for url, fname, future in queued:
+            if future is not None:
+                try:
+                    path = future.result()
+                    if path != fname and not fname.exists():
+                        link_or_copy(path, fname)  # fetched once for another post
+                    logger.info("Downloaded: %s", fname)
+                    self.dead.forget(url)
+                except Exception as e:
+                    logger.warning("Failed to download %s: %s", url, e)
+                    self.dead.record(url, e)
+                    continue
+            self.index.record(url, fname)
+            local[media_key(url)] = LOCAL_PREFIX + fname.name
+        return local
+
+
+def rewrite_post_images(texts: Iterable[tuple], meta: Optional[dict], local: Dict[str, str]) -> bool:
+    """Rewrite <img src> in each (holder dict, key) text; returns True if anything changed."""
+    if not local:
+        return False
+
+    def lookup(src):
+        return local.get(media_key(src)) if is_remote(src) else None
+
+    changed = False
+    for holder, key in texts:
+        text = holder.get(key)
+        new = rewrite_images(text, lookup)
+        if new != text:
+            holder[key] = new
+            changed = True
+    if meta is not None:
+        meta["images"] = [lookup(src) or src for src in meta["images"]]
+    return changed
+
+
+def post_texts(post: dict, comments: Iterable[dict] = ()) -> list:
+    """(holder, key) pairs for the subject and body of a post and its comments."""
+    return [(d, k) for d in (post, *comments) for k in ("subject", "body") if d.get(k)]
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""media_scheduler.py
+
+Fair, host-aware scheduling of media downloads.
+
+Images cluster on a few hosts (pics.livejournal.com, imgur, photobucket, ...)
+plus a long tail. ``MediaScheduler`` keeps one queue per host and a pool of
+worker threads that take jobs round-robin across hosts, never running more
+than ``per_host`` downloads against one host at a time. A slow host then only
+slows its own queue while the other hosts keep the workers busy.
+
+While the scheduler is open, ``socket.getaddrinfo`` is memoised (DNSCache),
+so each host is resolved once per DNS_TTL instead of once per image, and a
+host that doesn't resolve fails the burst of its queued images at once. A
+failure is only reused for DNS_NEGATIVE_TTL seconds, so a resolver hiccup
+doesn't fail every later image of the host.
+
+``MEDIA_WORKERS`` (env, default 8) and ``MEDIA_PER_HOST`` (default 2) size it.
+
+    with MediaScheduler() as scheduler:
+        future = scheduler.submit(url, dest, fetch_to_file, url, dest, timeout=15)
+        future.result()
+"""
+
+# NOTE: This script is now located in src/ and is intended to be run as a module or via Docker.
+# All code is commented for clarity for junior developers.
+
+from __future__ import annotations
+
+import os
+import socket
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+DNS_TTL = 300.0  # seconds a lookup is reused
+DNS_NEGATIVE_TTL = 5.0  # seconds a failed lookup is reused
+
+
+class DNSCache:
+    """Memoise socket.getaddrinfo while installed; failures only briefly."""
+
+    def __init__(self, ttl: float = DNS_TTL, clock=time.monotonic, negative_ttl: float = DNS_NEGATIVE_TTL):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+        self.entries: Dict[tuple, tuple] = {}  # args → (expires, result or exception)
+        self.lookups = 0
+        self._resolve = socket.getaddrinfo
+        self._lock = threading.Lock()
+
+    def getaddrinfo(self, *args, **kwargs):
+        key = args + tuple(sorted(kwargs.items()))
+        with self._lock:
+            entry = self.entries.get(key)
+        if entry is None or entry[0] < self.clock():
+            ttl = self.ttl
+            try:
+                result = self._resolve(*args, **kwargs)
+            except socket.gaierror as e:
+                result, ttl = e, self.negative_ttl
+            self.lookups += 1
+            entry = (self.clock() + ttl, result)
+            with self._lock:
+                self.entries[key] = entry
+        if isinstance(entry[1], socket.gaierror):
+            raise entry[1]
+        return entry[1]
+
+    def install(self):
+        self._resolve = socket.getaddrinfo
+        socket.getaddrinfo = self.getaddrinfo
+
+    def uninstall(self):
+        if socket.getaddrinfo == self.getaddrinfo:
+            socket.getaddrinfo = self._resolve
+
+
+class MediaScheduler:
+    def __init__(self, workers: Optional[int] = None, per_host: Optional[int] = None, dns: Optional[DNSCache] = None):
+        self.workers = int(os.environ.get("MEDIA_WORKERS", 8)) if workers is None else workers
+        self.per_host = int(os.environ.get("MEDIA_PER_HOST", 2)) if per_host is None else per_host
+        self.dns = dns or DNSCache()
+        self.queues: "OrderedDict[str, deque]" = OrderedDict()  # host → jobs, in round-robin order
+        self.active: Dict[str, int] = {}
+        self.jobs: Dict[str, Future] = {}  # key → future, so a shared image is fetched once
+        self._cond = threading.Condition()
+        self._open = False
+        self._closed = False
+        self._threads = []
+
+    def __enter__(self):
+        self.dns.install()
+        self._open = True
+        return self
+
+    def _start(self):
+        """Start the worker threads on first submit (lock held).
+
+        Starting late lets a process pool created inside the ``with`` block
+        fork its workers before any download thread exists.
+        """
+        for i in range(max(1, self.workers)):
+            t = threading.Thread(target=self._work, name=f"media-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def __exit__(self, *exc):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join()
+        self.dns.uninstall()
+        return False
+
+    def submit(self, url: str, key, fn: Callable, *args, **kwargs) -> Future:
+        """Queue fn(*args, **kwargs) under url's host; the same key is only run once."""
+        host = urlparse(url).hostname or ""
+        with self._cond:
+            if key in self.jobs:
+                return self.jobs[key]
+            if self._open and not self._threads:
+                self._start()
+            future = Future()
+            self.jobs[key] = future
+            self.queues.setdefault(host, deque()).append((future, fn, args, kwargs))
+            self._cond.notify()
+        return future
+
+    def _next_job(self):
+        """First host in round-robin order with queued work and a free slot (lock held)."""
+        for host, queue in self.queues.items():
+            if queue and self.active.get(host, 0) < self.per_host:
+                job = queue.popleft()
+                self.active[host] = self.active.get(host, 0) + 1
+                self.queues.move_to_end(host)  # the next pick starts at the following host
+                if not queue:
+                    del self.queues[host]
+                return host, job
+        return None
+
+    def _work(self):
+        while True:
+            with self._cond:
+                picked = self._next_job()
+                while picked is None:
+                    if self._closed and not any(self.queues.values()):
+                        return
+                    self._cond.wait()
+                    picked = self._next_job()
+            host, (future, fn, args, kwargs) = picked
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args, **kwargs))
+                except BaseException as e:
+                    future.set_exception(e)
+            with self._cond:
+                self.active[host] -= 1
+                self._cond.notify_all()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""offline.py
+
+Rebuild the post and comment lists from what earlier runs saved under
+``batch-downloads/``, without logging in or fetching anything
+(``export.py --offline``):
+
+    posts-xml/YYYY-MM.xml           export_do.bml month pages → posts
+    posts-index.json                entries edited or added by --sync
+    posts-deleted.json              ids --sync saw deleted on LiveJournal
+    comments-xml/*.xml              export_comments.bml comment_body pages → comments
+    comments-json/usermap.json      poster id → username (plus users/user_map.json)
+    comments-json/all.json          comment states and icons recorded by later runs
+
+The result is what export.main would have passed to ``combine()`` after a
+download, so a renderer change or a new output format costs local CPU only.
+friend-groups.json is left as it is.
+
+With ``jobs > 1`` the pages are parsed in a process pool; results stream
+back in page order (oldest month first, then comment pages), so the output
+is identical to a serial load.
+"""
+
+# NOTE: This script is now located in src/ and is intended to be run as a module or via Docker.
+# All code is commented for clarity for junior developers.
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import sys
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+# Imported up front so forked parser workers inherit them
+from download_comments import parse_comment_body
+from download_posts import xml_to_json
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+BATCH = Path("batch-downloads")
+POST_PAGE = re.compile(r"^\d{4}-\d{2}\.xml$")
+COMMENT_PAGE = re.compile(r"^(?:comments_|comment_body-)(\d+)\.xml$")
+_USERS: Dict[str, str] = {}  # usermap of a parser worker (set by _init_worker)
+
+
+def _read_json(path: Path, default):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def post_pages(batch: Path = BATCH) -> List[Path]:
+    """Saved month pages, oldest month first."""
+    folder = batch / "posts-xml"
+    return sorted(p for p in folder.glob("*.xml") if POST_PAGE.match(p.name)) if folder.is_dir() else []
+
+
+def comment_pages(batch: Path = BATCH) -> List[Path]:
+    """
+    Saved comment_body pages: the per-post pages of a full download
+    (comments_<id>.xml) first, then the startid pages of --sync runs
+    (comment_body-<startid>.xml), so the newer copy of a comment wins.
+    """
+    folder = batch / "comments-xml"
+    if not folder.is_dir():
+        return []
+    pages = [p for p in folder.glob("*.xml") if COMMENT_PAGE.match(p.name)]
+    return sorted(pages, key=lambda p: (p.name.startswith("comment_body-"), int(COMMENT_PAGE.match(p.name).group(1))))
+
+
+def parse_post_page(path: Path) -> List[dict]:
+    return [xml_to_json(entry) for entry in ET.parse(path).getroot().iter("entry")]
+
+
+def parse_comment_page(path: Path, users: Optional[Dict[str, str]] = None) -> List[dict]:
+    return parse_comment_body(path.read_text(encoding="utf-8"), _USERS if users is None else users)[1]
+
+
+def _init_worker(users: Dict[str, str]):
+    """Give each worker the usermap once instead of pickling it with every page."""
+    global _USERS
+    _USERS = users
+
+
+def parsed(fn: Callable, pages: List[Path], pool=None, jobs: int = 1) -> Iterator[List[dict]]:
+    """fn(page) for each page, in page order; in *pool* when one is given."""
+    if pool is None:
+        return map(fn, pages)
+    return pool.map(fn, pages, chunksize=max(1, len(pages) // (jobs * 4)))
+
+
+def load_users(batch: Path = BATCH) -> Dict[str, str]:
+    """Poster id → username from every saved user map."""
+    users = {str(k): v for k, v in _read_json(Path("users/user_map.json"), {}).items()}
+    users.update(_read_json(batch / "comments-json" / "usermap.json", {}))
+    return users
+
+
+def load_posts(batch: Path = BATCH, pool=None, jobs: int = 1) -> List[dict]:
+    """Posts of the saved month pages, with later --sync changes applied."""
+    posts: Dict[str, dict] = {}
+    for page_posts in parsed(parse_post_page, post_pages(batch), pool, jobs):
+        for post in page_posts:
+            posts[post["id"]] = post
+    # posts-index.json holds the newest copy of each post: edited entries
+    # replace their month-page copy and new ones are appended. It may cover
+    # fewer months than the pages (--start/--end), so only posts --sync
+    # recorded as deleted are dropped.
+    for post in _read_json(batch / "posts-index.json", []):
+        posts[post["id"]] = post
+    for pid in _read_json(batch / "posts-deleted.json", []):
+        posts.pop(pid, None)
+    return list(posts.values())
+
+
+def load_comments(users: Dict[str, str], batch: Path = BATCH, pool=None, jobs: int = 1) -> List[dict]:
+    """
+    Comments of the saved comment_body pages, newest copy of each id, in id order.
+
+    With a *pool*, its workers must have been started with ``_init_worker(users)``.
+    """
+    comments: Dict[int, dict] = {}
+    parse = parse_comment_page if pool is not None else lambda page: parse_comment_page(page, users)
+    for page_comments in parsed(parse, comment_pages(batch), pool, jobs):
+        for comment in page_comments:
+            comments[comment["id"]] = comment
+    # all.json carries what later runs learned (state changes, icon paths)
+    for comment in _read_json(batch / "comments-json" / "all.json", []):
+        comments[comment["id"]] = dict(comments.get(comment["id"], {}), **comment)
+    return sorted(comments.values(), key=lambda c: c["id"])
+
+
+def load_archive(batch: Path = BATCH, jobs: int = 1) -> Tuple[List[dict], List[dict]]:
+    """``(posts, comments)`` rebuilt from *batch* alone, parsed by *jobs* processes."""
+    from concurrent.futures import ProcessPoolExecutor
+
+    months = post_pages(batch)
+    if not months and not (batch / "posts-index.json").exists():
+        raise FileNotFoundError(f"no saved posts under {batch}/ (run a normal export first)")
+    users = load_users(batch)
+    pool = None
+    pages = len(months) + len(comment_pages(batch))
+    if jobs > 1 and pages > 1:
+        pool = ProcessPoolExecutor(max_workers=min(jobs, pages), initializer=_init_worker, initargs=(users,))
+    try:
+        posts = load_posts(batch, pool, jobs)
+        comments = load_comments(users, batch, pool, jobs)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    logger.info("Offline: %s posts and %s comments from %s/", len(posts), len(comments), batch)
+    return posts, comments
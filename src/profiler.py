@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""profiler.py
+
+Optional per-stage profiling for backup runs (enabled with ``--profile``).
+
+Each stage of a run (post fetch, comment fetch, combine/render, image rewrite)
+is wrapped in ``profiler.stage(name)``. When profiling is enabled this writes,
+into ``<dest>/profile/``:
+
+    <stage>.prof          cProfile dump (open with ``python -m pstats`` or snakeviz)
+    <stage>-alloc.txt     top-N tracemalloc allocation sites for the stage
+    summary.json          wall time, traced memory peak and peak RSS per stage
+
+When profiling is disabled ``stage()`` is a no-op, so call sites never need to
+check the flag themselves.
+"""
+
+# NOTE: This script is now located in src/ and is intended to be run as a module or via Docker.
+# All code is commented for clarity for junior developers.
+
+from __future__ import annotations
+
+import cProfile
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+PROFILE_DIR = "profile"
+DEFAULT_TOP_N = 25
+
+
+def peak_rss_kb() -> Optional[int]:
+    """Return the peak resident set size of this process in KiB (None if unknown)."""
+    try:
+        import resource
+    except ImportError:  # Windows has no resource module
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    if sys.platform == "darwin":
+        peak //= 1024
+    return peak
+
+
+class StageProfiler:
+    def __init__(self, dest: str | os.PathLike = ".", enabled: bool = False, top_n: int = DEFAULT_TOP_N):
+        self.enabled = enabled
+        self.top_n = top_n
+        self.out_dir = Path(dest) / PROFILE_DIR
+        self.results: Dict[str, dict] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        """Profile everything executed inside the ``with`` block as stage *name*."""
+        if not self.enabled:
+            yield
+            return
+
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+
+        profile = cProfile.Profile()
+        t0 = time.perf_counter()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            elapsed = time.perf_counter() - t0
+            after = tracemalloc.take_snapshot()
+            _, traced_peak = tracemalloc.get_traced_memory()
+            if started_tracing:
+                tracemalloc.stop()
+            self._write_stage(name, profile, before, after, elapsed, traced_peak)
+
+    def _write_stage(self, name, profile, before, after, elapsed, traced_peak):
+        prof_path = self.out_dir / f"{name}.prof"
+        profile.dump_stats(prof_path)
+
+        # Allocation sites that grew during the stage, largest first
+        stats = after.compare_to(before, "lineno")[: self.top_n]
+        alloc_path = self.out_dir / f"{name}-alloc.txt"
+        with open(alloc_path, "w", encoding="utf-8") as f:
+            f.write(f"Top {len(stats)} allocation sites for stage '{name}'\n")
+            for stat in stats:
+                f.write(f"{stat}\n")
+
+        self.results[name] = {
+            "seconds": round(elapsed, 3),
+            "traced_peak_kb": traced_peak // 1024,
+            "peak_rss_kb": peak_rss_kb(),
+            "cprofile": prof_path.name,
+            "allocations": alloc_path.name,
+        }
+        logger.info("Profiled stage %s: %.1fs, traced peak %s KiB", name, elapsed, traced_peak // 1024)
+        self.write_summary()
+
+    def write_summary(self):
+        """Merge this run's stage results into ``profile/summary.json``.
+
+        export.py and grab_images.py run as separate processes, so the summary
+        is merged rather than overwritten.
+        """
+        if not self.enabled or not self.results:
+            return
+        summary_path = self.out_dir / "summary.json"
+        summary = {}
+        if summary_path.exists():
+            try:
+                summary = json.loads(summary_path.read_text(encoding="utf-8"))
+            except ValueError:
+                summary = {}
+        summary.update(self.results)
+        summary_path.write_text(json.dumps(summary, indent=2), encoding="utf-8")
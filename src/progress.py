@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""progress.py
+
+One progress surface for every long-running stage (months of posts, per-post
+comments, user info, images).
+
+Typical usage:
+
+    progress = StageProgress("posts", total=len(months), unit="months")
+    for month in months:
+        with progress.request():
+            xml = fetch_month_posts(...)
+        progress.advance()
+    progress.close()
+
+Each stage reports items done/remaining, throughput, requests in flight and an
+ETA. In a terminal this is a live tqdm bar; in non-interactive output (Docker
+logs, cron) it is a single status line printed every PROGRESS_INTERVAL seconds.
+PROGRESS_MODE=auto|bar|line|off overrides the detection.
+"""
+
+# NOTE: This script is now located in src/ and is intended to be run as a module or via Docker.
+# All code is commented for clarity for junior developers.
+
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+DEFAULT_INTERVAL = 30.0
+
+
+def format_duration(seconds: Optional[float]) -> str:
+    """Format a number of seconds as e.g. ``1h02m``, ``3m05s`` or ``42s``."""
+    if seconds is None:
+        return "?"
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{(seconds % 3600) // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+def _resolve_mode(stream) -> str:
+    mode = os.getenv("PROGRESS_MODE", "auto").lower()
+    if mode in ("bar", "line", "off"):
+        return mode
+    return "bar" if hasattr(stream, "isatty") and stream.isatty() else "line"
+
+
+class StageProgress:
+    def __init__(self, stage: str, total: Optional[int] = None, unit: str = "items",
+                 stream=None, mode: Optional[str] = None, interval: Optional[float] = None):
+        self.stage = stage
+        self.total = total
+        self.unit = unit
+        self.done = 0
+        self.in_flight = 0
+        self.stream = stream or sys.stderr
+        self.mode = mode or _resolve_mode(self.stream)
+        self.interval = interval if interval is not None else float(os.getenv("PROGRESS_INTERVAL", DEFAULT_INTERVAL))
+        self.started = time.monotonic()
+        self._last_line = self.started
+        self._lock = threading.Lock()
+        self._bar = None
+        if self.mode == "bar":
+            import tqdm  # only needed for interactive terminals
+            self._bar = tqdm.tqdm(total=total, desc=stage, unit=f" {unit}", file=self.stream)
+
+    # ── counters ────────────────────────────────────────────────────────── #
+    def set_total(self, total: Optional[int]):
+        """Update the planned amount of work (e.g. once the image queue is known)."""
+        with self._lock:
+            self.total = total
+            if self._bar is not None:
+                self._bar.total = total
+                self._bar.refresh()
+
+    def advance(self, n: int = 1):
+        with self._lock:
+            self.done += n
+            if self._bar is not None:
+                self._bar.update(n)
+                self._bar.set_postfix_str(f"{self.in_flight} in flight", refresh=False)
+            elif self.mode == "line" and time.monotonic() - self._last_line >= self.interval:
+                self._print_line()
+
+    @contextmanager
+    def request(self):
+        """Count a network request as in flight for the duration of the block."""
+        with self._lock:
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    # ── reporting ───────────────────────────────────────────────────────── #
+    def rate(self) -> float:
+        elapsed = time.monotonic() - self.started
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def eta(self) -> Optional[float]:
+        """Seconds until the planned work is done, or None if it can't be estimated yet."""
+        if self.total is None or self.done == 0:
+            return None
+        rate = self.rate()
+        if rate <= 0:
+            return None
+        return max(self.total - self.done, 0) / rate
+
+    def status_line(self) -> str:
+        if self.total:
+            pct = 100 * self.done / self.total
+            count = f"{self.done}/{self.total} {self.unit} ({pct:.0f}%), {max(self.total - self.done, 0)} remaining"
+        else:
+            count = f"{self.done} {self.unit}"
+        return (
+            f"[{self.stage}] {count}, {self.rate():.2f} {self.unit}/s, "
+            f"{self.in_flight} in flight, ETA {format_duration(self.eta())}"
+        )
+
+    def _print_line(self):
+        self._last_line = time.monotonic()
+        print(self.status_line(), file=self.stream, flush=True)
+
+    def close(self):
+        with self._lock:
+            if self._bar is not None:
+                self._bar.close()
+                self._bar = None
+            elif self.mode == "line":
+                self._print_line()
+            self.mode = "off"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""render.py
+
+Shared HTML→Markdown and Markdown→HTML conversion for the export formats.
+
+``RenderEngine`` keeps one ``markdown.Markdown`` instance for the whole run
+(``reset()`` between documents) and memoizes every conversion by a hash of
+its input. ``html2text.HTML2Text`` keeps parser state between ``handle()``
+calls (list/table/line-break bookkeeping), so a fresh one is built for each
+conversion that misses the cache; otherwise a post's markdown would depend on
+which posts were converted before it. The memo is kept:
+
+- in memory, so repeated quotes, signatures and "+1" replies convert once
+- on disk (``batch-downloads/render-cache.json``), so re-rendering an unchanged
+  archive to md/html skips the converters entirely
+
+The on-disk cache is tagged with the converter library versions and is
+discarded automatically when either library (or CACHE_VERSION) changes.
+It is capped at CACHE_MAX_ENTRIES: when a save would exceed that, entries
+not used by this run (old versions of edited posts and comments, mostly)
+are dropped, oldest first. Runs over part of the archive (``--sync``,
+``--start/--end``) leave the rest of the cache alone while under the cap.
+"""
+
+# NOTE: This script is now located in src/ and is intended to be run as a module or via Docker.
+# All code is commented for clarity for junior developers.
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Set
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+CACHE_VERSION = 2  # 2: entries converted by a reused HTML2Text are dropped
+CACHE_MAX_ENTRIES = 200_000  # ~ the conversions of a large journal's posts and comments
+
+
+def content_key(kind: str, text: str) -> str:
+    """Cache key for converting *text* with converter *kind*."""
+    return f"{kind}:{hashlib.sha1(text.encode('utf-8')).hexdigest()}"
+
+
+class RenderEngine:
+    def __init__(self, cache_path: Optional[str | os.PathLike] = None):
+        self.cache_path = Path(cache_path) if cache_path else None
+        self.cache: Dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+        self._md = None
+        self._version = None
+        self._loaded = False
+        self._dirty = False
+        self._new: Dict[str, str] = {}
+        self.used: Set[str] = set()  # keys looked up this run (hits and misses)
+
+    # ── converters (created on first use) ──────────────────────────────── #
+    def _html2text(self):
+        """A new converter per document: HTML2Text can't be reset between handle() calls."""
+        import html2text
+        h = html2text.HTML2Text()
+        h.body_width = 0
+        h.unicode_snob = True
+        return h
+
+    def _markdown(self):
+        if self._md is None:
+            import markdown
+            self._md = markdown.Markdown()
+        return self._md
+
+    def version(self) -> str:
+        """Identify the converter libraries, so cached output of old versions is dropped."""
+        if self._version is None:
+            import html2text, markdown
+            h2t_version = html2text.__version__
+            if isinstance(h2t_version, tuple):
+                h2t_version = ".".join(map(str, h2t_version))
+            self._version = f"{CACHE_VERSION}/html2text-{h2t_version}/markdown-{markdown.__version__}"
+        return self._version
+
+    # ── conversions ────────────────────────────────────────────────────── #
+    def html_to_markdown(self, html: str) -> str:
+        return self._convert("h2t", html, lambda text: self._html2text().handle(text))
+
+    def markdown_to_html(self, text: str) -> str:
+        return self._convert("md", text, lambda text: self._markdown().reset().convert(text))
+
+    def _convert(self, kind, text, convert):
+        self.load()
+        key = content_key(kind, text)
+        self.used.add(key)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+        result = convert(text)
+        self.cache[key] = result
+        self._new[key] = result
+        self._dirty = True
+        return result
+
+    # ── sharing with worker processes ──────────────────────────────────── #
+    def drain_new(self) -> Dict[str, str]:
+        """Return (and forget) conversions made since the last call.
+
+        Render workers send these back so the parent can persist them.
+        """
+        new, self._new = self._new, {}
+        return new
+
+    def drain_used(self) -> Set[str]:
+        """Return (and forget) the keys looked up since the last call, for merge()."""
+        used, self.used = self.used, set()
+        return used
+
+    def merge(self, entries: Dict[str, str], used: Iterable[str] = ()):
+        """Add conversions made by another process (and the keys it used) to this cache."""
+        self.used.update(entries)
+        self.used.update(used)
+        fresh = {k: v for k, v in entries.items() if k not in self.cache}
+        if fresh:
+            self.cache.update(fresh)
+            self._dirty = True
+
+    # ── persistence ────────────────────────────────────────────────────── #
+    def load(self):
+        """Read the disk cache (once). Called automatically before the first conversion."""
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.cache_path or not self.cache_path.exists():
+            return
+        try:
+            data = json.loads(self.cache_path.read_text(encoding="utf-8"))
+        except ValueError:
+            logger.warning("Ignoring unreadable render cache %s", self.cache_path)
+            return
+        if data.get("version") != self.version():
+            logger.info("Render cache %s is from other converter versions, starting fresh", self.cache_path)
+            return
+        self.cache.update(data.get("entries", {}))
+        logger.debug("Loaded %s cached conversions from %s", len(self.cache), self.cache_path)
+
+    def prune(self, limit: Optional[int] = None) -> int:
+        """Drop unused entries, oldest first, down to *limit* (CACHE_MAX_ENTRIES); returns how many."""
+        limit = CACHE_MAX_ENTRIES if limit is None else limit
+        # Entries used by this run move to the end, so the front holds the longest unused
+        unused = {k: v for k, v in self.cache.items() if k not in self.used}
+        self.cache = {**unused, **{k: v for k, v in self.cache.items() if k in self.used}}
+        excess = min(len(self.cache) - limit, len(unused))
+        if excess <= 0:
+            return 0
+        for key in list(unused)[:excess]:
+            del self.cache[key]
+        return excess
+
+    def save(self):
+        """Write the cache to disk if anything new was converted."""
+        if not self.cache_path or not self._dirty:
+            return
+        dropped = self.prune()
+        if dropped:
+            logger.info("Render cache: dropped %s entries unused by this run", dropped)
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.cache_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.version(), "entries": self.cache}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.cache_path)
+        self._dirty = False
+        logger.info("Render cache: %s hits, %s conversions, %s entries saved", self.hits, self.misses, len(self.cache))
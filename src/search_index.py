@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""search_index.py
+
+Precomputed client-side search for an exported archive (``--format search``).
+
+While combine() writes posts, every post and its comments are tokenized into
+an inverted index (term → post numbers). The index is written to ``search/``:
+
+    search/index.html            static search page (no server needed)
+    search/docs.js               title, date and link of every post
+    search/shards/<hex>.js       postings of all terms sharing a 2-char prefix
+
+The page loads ``docs.js`` plus only the shards for the prefixes typed, so a
+query touches a few small files even for a 20-year journal. Shards are plain
+``<script>`` files rather than JSON so the page also works from ``file://``
+where browsers block fetch(). Postings are delta-encoded sorted post numbers.
+
+``search/.manifest.json`` lists the post id of each doc. A rerun over part
+of the archive (``months=(start, end)``) reads the previous docs and shards
+back and keeps the entries of posts outside that range, as the site does.
+"""
+
+# NOTE: This script is now located in src/ and is intended to be run as a module or via Docker.
+# All code is commented for clarity for junior developers.
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+PREFIX_LEN = 2
+MANIFEST = ".manifest.json"
+# Markdown link/image targets are URLs, not words the user wrote
+LINK_TARGET = re.compile(r"\]\([^)]*\)")
+WORD = re.compile(r"\w{2,}")
+
+
+def tokenize(text: str) -> set[str]:
+    """Lower-cased words of at least two characters (matches the page's JS tokenizer)."""
+    return set(WORD.findall(LINK_TARGET.sub("]", text).lower()))
+
+
+def shard_name(term: str) -> str:
+    """File name of the shard holding *term*: hex of its UTF-8 prefix (URL/filesystem safe)."""
+    return term[:PREFIX_LEN].encode("utf-8").hex()
+
+
+def delta_encode(numbers: Iterable[int]) -> List[int]:
+    out, last = [], 0
+    for n in sorted(numbers):
+        out.append(n - last)
+        last = n
+    return out
+
+
+class SearchIndex:
+    def __init__(self, root: str | os.PathLike = "search", months: Optional[tuple] = None):
+        self.root = Path(root)
+        self.months = months  # (first, last) "YYYY-MM" of the posts given; None = the whole archive
+        self.docs: List[list] = []
+        self.pids: List[Optional[str]] = []
+        self.postings: Dict[str, List[int]] = {}
+
+    def add_post(self, title: str, date: str, url: str, texts: Iterable[str], pid: Optional[str] = None):
+        """Index one post; *texts* are the normalized post body and comment bodies."""
+        doc = len(self.docs)
+        self.docs.append([title, date, url])
+        self.pids.append(pid)
+        terms = set()
+        for text in texts:
+            terms |= tokenize(text)
+        for term in terms:
+            # Docs are added in order, so each list stays sorted without a set
+            self.postings.setdefault(term, []).append(doc)
+
+    def write(self):
+        if self.months is not None:
+            self._keep_previous()
+        shard_dir = self.root / "shards"
+        shard_dir.mkdir(parents=True, exist_ok=True)
+        shards: Dict[str, Dict[str, List[int]]] = {}
+        for term, docs in self.postings.items():
+            shards.setdefault(shard_name(term), {})[term] = delta_encode(docs)
+        for name, terms in shards.items():
+            self._write_js(shard_dir / f"{name}.js", f"LJSearch.shard({json.dumps(name)},", terms)
+        # Shards of a previous run whose prefixes no longer occur
+        for old in shard_dir.glob("*.js"):
+            if old.stem not in shards:
+                old.unlink()
+        self._write_js(self.root / "docs.js", "LJSearch.docs(", self.docs)
+        with open(self.root / MANIFEST, "w", encoding="utf-8") as f:
+            json.dump(self.pids, f)
+        with open(self.root / "index.html", "w", encoding="utf-8") as f:
+            f.write(SEARCH_PAGE)
+        logger.info("Search index: %s posts, %s terms in %s shards → %s",
+                    len(self.docs), len(self.postings), len(shards), self.root)
+
+    def in_range(self, month: str) -> bool:
+        return self.months is None or self.months[0] <= month <= self.months[1]
+
+    def _keep_previous(self):
+        """Append the docs (and postings) of a previous build outside the rebuilt range."""
+        old_docs = self._read_js(self.root / "docs.js", "LJSearch.docs(")
+        try:
+            with open(self.root / MANIFEST, encoding="utf-8") as f:
+                old_pids = json.load(f)
+        except (OSError, ValueError):
+            old_pids = None
+        if not old_docs or not old_pids or len(old_pids) != len(old_docs):
+            return
+        current = set(self.pids)
+        renumber: Dict[int, int] = {}
+        for n, (doc, pid) in enumerate(zip(old_docs, old_pids)):
+            if pid is not None and pid not in current and not self.in_range(doc[1][:7]):
+                renumber[n] = len(self.docs)
+                self.docs.append(doc)
+                self.pids.append(pid)
+        if not renumber:
+            return
+        for shard in sorted((self.root / "shards").glob("*.js")):
+            terms = self._read_js(shard, f"LJSearch.shard({json.dumps(shard.stem)},") or {}
+            for term, deltas in terms.items():
+                n = 0
+                for delta in deltas:
+                    n += delta
+                    # Kept docs are numbered after this run's, in their old order: lists stay sorted
+                    if n in renumber:
+                        self.postings.setdefault(term, []).append(renumber[n])
+        logger.info("Search index: kept %s posts outside %s..%s", len(renumber), *self.months)
+
+    @staticmethod
+    def _read_js(path, call):
+        try:
+            text = path.read_text(encoding="utf-8")
+        except OSError:
+            return None
+        if not (text.startswith(call) and text.endswith(");\n")):
+            return None
+        try:
+            return json.loads(text[len(call):-3])
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _write_js(path, call, payload):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(call)
+            json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+            f.write(");\n")
+
+
+SEARCH_PAGE = """<!doctype html>
+<meta charset='utf-8'>
+<title>Search</title>
+<input id=q type=search placeholder='Search posts and comments' autofocus size=50>
+<p id=status></p>
+<ol id=results></ol>
+<script>
+const LJSearch = {docsList: null, shards: {},
+  docs(list) { this.docsList = list; },
+  shard(name, terms) { this.shards[name] = terms; }};
+
+function load(src) {
+  return new Promise(resolve => {
+    const s = document.createElement('script');
+    s.src = src; s.onload = resolve; s.onerror = resolve;
+    document.head.appendChild(s);
+  });
+}
+function shardName(term) {
+  return Array.from(new TextEncoder().encode(Array.from(term).slice(0, %(prefix)d).join('')))
+    .map(b => b.toString(16).padStart(2, '0')).join('');
+}
+async function lookup(term) {
+  const name = shardName(term);
+  if (!(name in LJSearch.shards)) {
+    await load('shards/' + name + '.js');
+    if (!(name in LJSearch.shards)) LJSearch.shards[name] = {};
+  }
+  // Prefix match: "photo" also finds "photos", "photograph"
+  const docs = new Set();
+  for (const [t, deltas] of Object.entries(LJSearch.shards[name])) {
+    if (!t.startsWith(term)) continue;
+    let n = 0;
+    for (const d of deltas) { n += d; docs.add(n); }
+  }
+  return docs;
+}
+async function search() {
+  const terms = (document.getElementById('q').value.toLowerCase().match(/[\\p{L}\\p{N}_]{2,}/gu) || []);
+  const out = document.getElementById('results');
+  out.innerHTML = '';
+  if (!terms.length) { document.getElementById('status').textContent = ''; return; }
+  if (!LJSearch.docsList) await load('docs.js');
+  let hits = null;
+  for (const term of terms) {
+    const docs = await lookup(term);
+    hits = hits ? new Set([...hits].filter(d => docs.has(d))) : docs;
+  }
+  const sorted = [...hits].sort((a, b) => LJSearch.docsList[b][1].localeCompare(LJSearch.docsList[a][1]));
+  document.getElementById('status').textContent = sorted.length + ' posts';
+  for (const d of sorted.slice(0, 200)) {
+    const [title, date, url] = LJSearch.docsList[d];
+    const li = document.createElement('li');
+    const a = document.createElement('a');
+    a.href = url; a.textContent = title;
+    li.append(a, ' ', date);
+    out.appendChild(li);
+  }
+}
+let timer;
+document.getElementById('q').addEventListener('input', () => { clearTimeout(timer); timer = setTimeout(search, 150); });
+</script>
+""" % {"prefix": PREFIX_LEN}
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""site_builder.py
+
+Incremental static-site output (``--format site``).
+
+Builds a browsable archive under ``site/``:
+
+    site/index.html, page-2.html, ...          all posts, newest first
+    site/<YYYY>/index.html                     posts of one year
+    site/<YYYY>/<MM>/index.html                posts of one month
+    site/<YYYY>/<MM>/<postID>.html             post + comments, prev/next links
+    site/tags/<tag>/index.html                 posts with one tag
+
+Every page is rebuilt only when its inputs change. ``site/.manifest.json``
+records, per page, a hash of everything the page was built from (the source
+post and comment hashes, its prev/next neighbours, the entries of an index
+page). On a rerun unchanged pages are skipped, so a single new comment
+rebuilds one post page instead of the whole site.
+
+A rerun over part of the archive (``months=(start, end)``, export.py
+``--start/--end``) keeps the pages of posts outside that range: their index
+entries come from the manifest, and only pages of in-range posts are pruned.
+
+Tags come from a post's ``tags``/``taglist`` (set for posts fetched by
+``--sync``, from getevents) or, failing that, from the legacy tag badge
+images in the body (the ones json_to_markdown turns into ``tags:``).
+export_do.bml, used by a full export, doesn't return LiveJournal tags.
+"""
+
+# NOTE: This script is now located in src/ and is intended to be run as a module or via Docker.
+# All code is commented for clarity for junior developers.
+
+from __future__ import annotations
+
+import hashlib
+import html
+import json
+import os
+import posixpath
+import re
+import sys
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from body_scan import attrs_of
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Bump when the page layout changes, so every page is rebuilt once
+SITE_VERSION = 1
+PER_PAGE = 20
+MANIFEST = ".manifest.json"
+# <img alt="tag" src="http://utx.ambience.ru/img/..."> badges of old tagging services
+TAG_BADGE = re.compile(r"<img\b([^>]*utx\.ambience\.ru/img/[^>]*)>", re.I)
+
+
+def content_hash(obj) -> str:
+    """Stable hash of any JSON-serializable value."""
+    data = json.dumps(obj, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+def post_tags(post: dict) -> List[str]:
+    """Tags of a post, from a ``tags`` list, a comma-separated ``taglist`` or tag badges in the body."""
+    tags = post.get("tags")
+    if isinstance(tags, list):
+        return [t for t in tags if t]
+    taglist = post.get("taglist") or ""
+    tags = [t.strip() for t in taglist.split(",") if t.strip()]
+    if not tags and post.get("body") and "ambience.ru" in post["body"]:
+        for match in TAG_BADGE.finditer(post["body"]):
+            tag = attrs_of(match.group(1)).get("alt", "").strip()
+            if tag and tag not in tags:
+                tags.append(tag)
+    return tags
+
+
+def tag_slug(tag: str) -> str:
+    return re.sub(r"\W+", "-", tag.lower()).strip("-") or "tag"
+
+
+class SiteBuilder:
+    def __init__(self, root: str | os.PathLike = "site", per_page: int = PER_PAGE, months: Optional[tuple] = None):
+        self.root = Path(root)
+        self.per_page = per_page
+        self.months = months  # (first, last) "YYYY-MM" of the posts given; None = the whole archive
+        self.entries: List[dict] = []
+        self.built = 0
+        self.skipped = 0
+
+    def add_post(self, post: dict, comments: Optional[list]):
+        """Register a post (normalized) and its flat comment list."""
+        date = post.get("eventtime") or post["date"]
+        comments = sorted(comments or [], key=lambda c: c["id"])
+        self.entries.append({
+            "pid": str(post["id"]),
+            "date": date,
+            "title": post.get("subject") or date,
+            "tags": post_tags(post),
+            "path": f"{date[:4]}/{date[5:7]}/{post['id']}.html",
+            "month": post["date"][:7],
+            "post": post,
+            "comments": comments,
+            "post_hash": content_hash(post),
+            "comments_hash": content_hash(comments),
+        })
+
+    # ── building ───────────────────────────────────────────────────────── #
+    def build(self, render_body: Callable[[dict, list], str]):
+        """
+        Write every page whose inputs changed.
+
+        ``render_body(post, comments)`` returns the HTML fragment for a post
+        page (article + comments); it is only called for pages being rebuilt.
+        """
+        old_manifest = self._load_manifest()
+        manifest: Dict[str, dict] = {}
+        # Oldest first for prev/next; indexes list newest first
+        entries = sorted(self.entries + self._kept_entries(old_manifest), key=lambda e: (e["date"], e["pid"]))
+
+        for i, entry in enumerate(entries):
+            if entry.get("kept"):
+                # Outside the rebuilt range: no post to render, keep the page as it is
+                manifest[entry["path"]] = old_manifest[entry["path"]]
+                self.skipped += 1
+                continue
+            prev_e = entries[i - 1] if i > 0 else None
+            next_e = entries[i + 1] if i + 1 < len(entries) else None
+            nav = {
+                "prev": prev_e and (prev_e["path"], prev_e["title"]),
+                "next": next_e and (next_e["path"], next_e["title"]),
+            }
+            sources = {
+                "post": entry["pid"],
+                "entry": {k: entry[k] for k in ("date", "title", "tags", "month")},
+                "post_hash": entry["post_hash"],
+                "comments_hash": entry["comments_hash"],
+                "nav": content_hash(nav),
+            }
+            self._write_page(entry["path"], sources, old_manifest, manifest,
+                             lambda e=entry, n=nav: self._post_page(e, n, render_body))
+
+        newest = list(reversed(entries))
+        self._write_index("", "All posts", newest, old_manifest, manifest)
+        for year in sorted({e["date"][:4] for e in entries}):
+            in_year = [e for e in newest if e["date"][:4] == year]
+            self._write_index(f"{year}/", year, in_year, old_manifest, manifest)
+            for month in sorted({e["date"][5:7] for e in in_year}):
+                in_month = [e for e in in_year if e["date"][5:7] == month]
+                self._write_index(f"{year}/{month}/", f"{year}-{month}", in_month, old_manifest, manifest)
+        tags = sorted({t for e in entries for t in e["tags"]})
+        for tag in tags:
+            tagged = [e for e in newest if tag in e["tags"]]
+            self._write_index(f"tags/{tag_slug(tag)}/", f"Tag: {tag}", tagged, old_manifest, manifest)
+
+        self._remove_stale(old_manifest, manifest)
+        self._save_manifest(manifest)
+        logger.info("Static site: %s pages built, %s unchanged → %s", self.built, self.skipped, self.root)
+
+    def _write_index(self, prefix, title, entries, old_manifest, manifest):
+        pages = [entries[i:i + self.per_page] for i in range(0, len(entries), self.per_page)] or [[]]
+        for n, chunk in enumerate(pages, start=1):
+            path = f"{prefix}index.html" if n == 1 else f"{prefix}page-{n}.html"
+            sources = {
+                "posts": [e["pid"] for e in chunk],
+                "entries": content_hash([(e["path"], e["title"], e["date"]) for e in chunk]),
+                "page": [n, len(pages)],
+            }
+            self._write_page(path, sources, old_manifest, manifest,
+                             lambda p=path, c=chunk, n=n, t=len(pages): self._index_page(p, title, c, n, t, prefix))
+
+    def _write_page(self, path, sources, old_manifest, manifest, render):
+        page_hash = content_hash([SITE_VERSION, sources])
+        manifest[path] = {"hash": page_hash, "sources": sources}
+        target = self.root / path
+        if old_manifest.get(path, {}).get("hash") == page_hash and target.exists():
+            self.skipped += 1
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        with open(target, "w", encoding="utf-8") as f:
+            f.write(render())
+        self.built += 1
+
+    # ── page templates ─────────────────────────────────────────────────── #
+    @staticmethod
+    def _link(from_path, to_path):
+        return posixpath.relpath(to_path, posixpath.dirname(from_path) or ".")
+
+    def _layout(self, path, title, body):
+        home = self._link(path, "index.html")
+        return (
+            "<!doctype html>\n<meta charset='utf-8'>\n"
+            f"<title>{html.escape(title)}</title>\n"
+            f"<nav><a href='{home}'>Archive</a></nav>\n"
+            f"{body}\n"
+        )
+
+    def _post_page(self, entry, nav, render_body):
+        path = entry["path"]
+        links = []
+        if nav["prev"]:
+            links.append(f"<a rel='prev' href='{self._link(path, nav['prev'][0])}'>← {html.escape(nav['prev'][1])}</a>")
+        if nav["next"]:
+            links.append(f"<a rel='next' href='{self._link(path, nav['next'][0])}'>{html.escape(nav['next'][1])} →</a>")
+        tags = "".join(
+            f" <a href='{self._link(path, f'tags/{tag_slug(t)}/index.html')}'>{html.escape(t)}</a>" for t in entry["tags"]
+        )
+        body = render_body(entry["post"], entry["comments"])
+        if tags:
+            body += f"\n<p class=tags>Tags:{tags}</p>"
+        body += f"\n<nav class=pager>{' | '.join(links)}</nav>"
+        return self._layout(path, entry["title"], body)
+
+    def _index_page(self, path, title, chunk, page, pages, prefix):
+        items = "\n".join(
+            f"<li><a href='{self._link(path, e['path'])}'>{html.escape(e['title'])}</a> <small>{e['date']}</small></li>"
+            for e in chunk
+        )
+        pager = []
+        if page > 1:
+            prev_path = f"{prefix}index.html" if page == 2 else f"{prefix}page-{page - 1}.html"
+            pager.append(f"<a rel='prev' href='{self._link(path, prev_path)}'>← newer</a>")
+        if page < pages:
+            pager.append(f"<a rel='next' href='{self._link(path, f'{prefix}page-{page + 1}.html')}'>older →</a>")
+        body = (
+            f"<h1>{html.escape(title)}</h1>\n<ul>\n{items}\n</ul>\n"
+            f"<nav class=pager>{' | '.join(pager)}</nav>"
+        )
+        return self._layout(path, title, body)
+
+    # ── manifest ───────────────────────────────────────────────────────── #
+    def _load_manifest(self) -> Dict[str, dict]:
+        path = self.root / MANIFEST
+        if not path.exists():
+            return {}
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except ValueError:
+            logger.warning("Ignoring unreadable site manifest %s; rebuilding every page", path)
+            return {}
+
+    def _save_manifest(self, manifest):
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / MANIFEST, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+    def in_range(self, month: str) -> bool:
+        return self.months is None or self.months[0] <= month <= self.months[1]
+
+    def _kept_entries(self, old_manifest) -> List[dict]:
+        """Index entries of previously built post pages outside the rebuilt range."""
+        if self.months is None:
+            return []
+        current = {e["pid"] for e in self.entries}
+        kept = []
+        for path, record in old_manifest.items():
+            sources = record.get("sources", {})
+            entry = sources.get("entry")
+            if entry and sources["post"] not in current and not self.in_range(entry["month"]):
+                kept.append(dict(entry, pid=sources["post"], path=path, kept=True))
+        return kept
+
+    def _remove_stale(self, old_manifest, manifest):
+        """Delete pages from the previous build that no longer exist (e.g. emptied pagination).
+
+        Post pages are only deleted if their post is in the rebuilt range.
+        """
+        for path in set(old_manifest) - set(manifest):
+            month = path[:4] + "-" + path[5:7]
+            if "post" in old_manifest[path].get("sources", {}) and not self.in_range(month):
+                manifest[path] = old_manifest[path]  # built before page entries were recorded; keep it
+                continue
+            (self.root / path).unlink(missing_ok=True)
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""sync_posts.py
+
+Incremental post sync (``export.py --sync``).
+
+A full export records every downloaded post in ``batch-downloads/posts-index.json``
+and a sync cursor in ``batch-downloads/sync-state.json``. The next ``--sync``
+run asks ``LJ.XMLRPC.syncitems`` which journal entries were created or
+edited since that cursor, fetches only those with ``LJ.XMLRPC.getevents``,
+rewrites their post folders in place and merges them into the index.
+
+Without a previous full export there is nothing to sync against, so
+``sync_posts()`` returns None and the caller falls back to a full download.
+"""
+
+# NOTE: This script is now located in src/ and is intended to be run as a module or via Docker.
+# All code is commented for clarity for junior developers.
+
+from __future__ import annotations
+
+import json
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from logger import setup_logger
+from lj_xmlrpc import call
+
+logger = setup_logger(__name__)
+
+POSTS_INDEX = "batch-downloads/posts-index.json"
+SYNC_STATE = "batch-downloads/sync-state.json"
+# Ids of posts --sync saw deleted on LJ; their month pages are kept, so
+# offline.load_posts needs this list to leave them out
+POSTS_DELETED = "batch-downloads/posts-deleted.json"
+GETEVENTS_BATCH = 100
+# The baseline cursor is our own clock, not LJ's; step back so nothing falls in a gap
+BASELINE_MARGIN = timedelta(days=1)
+
+
+# ── state files ─────────────────────────────────────────────────────────── #
+def _read_json(path, default):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_posts_index() -> Dict[str, dict]:
+    return {p["id"]: p for p in _read_json(POSTS_INDEX, [])}
+
+
+def save_posts_index(posts: Iterable[dict]):
+    _write_json(POSTS_INDEX, sorted(posts, key=lambda p: int(p["id"])))
+
+
+def load_deleted() -> Set[str]:
+    return set(_read_json(POSTS_DELETED, []))
+
+
+def save_deleted(ids: Iterable[str]):
+    _write_json(POSTS_DELETED, sorted(ids, key=int))
+
+
+def load_lastsync() -> Optional[str]:
+    return _read_json(SYNC_STATE, {}).get("lastsync")
+
+
+def save_lastsync(lastsync: str):
+    _write_json(SYNC_STATE, {"lastsync": lastsync})
+
+
+def record_full_export(posts: List[dict], now: Optional[datetime] = None):
+    """
+    Remember a full download as the baseline for the next ``--sync`` run.
+
+    The posts are merged into the existing index, so a download limited to a
+    few months (``--start``/``--end``) does not forget the rest of the journal.
+    """
+    now = now or datetime.now(timezone.utc)
+    index = load_posts_index()
+    index.update((p["id"], p) for p in posts)
+    save_posts_index(index.values())
+    deleted = load_deleted()
+    if deleted & index.keys():
+        save_deleted(deleted - index.keys())
+    save_lastsync((now - BASELINE_MARGIN).strftime("%Y-%m-%d %H:%M:%S"))
+
+
+# ── LiveJournal calls ──────────────────────────────────────────────────── #
+def changed_items(cookies, headers, lastsync: str) -> Tuple[Dict[int, str], str]:
+    """
+    Journal entries changed since *lastsync*, as ``{itemid: action}``, plus the
+    new cursor. syncitems returns at most a few hundred items per call, so it
+    is called again from the newest time seen until ``count`` reaches ``total``.
+    """
+    items: Dict[int, str] = {}
+    cursor = lastsync
+    while True:
+        result = call("LJ.XMLRPC.syncitems", {"lastsync": cursor}, cookies, headers)
+        batch = result.get("syncitems", [])
+        for item in batch:
+            kind, _, itemid = item["item"].partition("-")
+            if kind == "L":  # journal entries; C- items are comments
+                items[int(itemid)] = item["action"]
+            cursor = max(cursor, item["time"])
+        if not batch or int(result.get("count", 0)) >= int(result.get("total", 0)):
+            return items, cursor
+
+
+def event_to_json(event: dict) -> dict:
+    """getevents entry → the same shape as download_posts.xml_to_json()."""
+    props = event.get("props") or {}
+    allowmask = event.get("allowmask")
+    return {
+        "id": str(int(event["itemid"]) * 256 + int(event.get("anum", 0))),
+        "date": event.get("logtime") or event["eventtime"],
+        "subject": event.get("subject") or "",
+        "body": event.get("event") or "",
+        "eventtime": event["eventtime"],
+        "security": event.get("security", "public"),
+        "allowmask": None if allowmask is None else str(allowmask),
+        "current_music": props.get("current_music"),
+        "current_mood": props.get("current_mood"),
+        "taglist": props.get("taglist", ""),
+    }
+
+
+def fetch_events(itemids: List[int], cookies, headers) -> List[dict]:
+    posts = []
+    for i in range(0, len(itemids), GETEVENTS_BATCH):
+        batch = itemids[i:i + GETEVENTS_BATCH]
+        result = call("LJ.XMLRPC.getevents", {
+            "selecttype": "multiple",
+            "itemids": ",".join(map(str, batch)),
+            "lineendings": "unix",
+        }, cookies, headers)
+        posts.extend(event_to_json(e) for e in result.get("events", []))
+    return posts
+
+
+# ── sync ───────────────────────────────────────────────────────────────── #
+def sync_posts(cookies, headers) -> Optional[Tuple[List[dict], Set[int]]]:
+    """
+    Bring the archive's posts up to date.
+
+    Returns ``(all_posts, changed_itemids)`` or None when no earlier full
+    export exists. Post folders of changed entries are rewritten in place.
+    """
+    from download_posts import save_post
+
+    lastsync = load_lastsync()
+    index = load_posts_index()
+    if not lastsync or not index:
+        logger.info("No previous export to sync against; running a full download")
+        return None
+
+    items, cursor = changed_items(cookies, headers, lastsync)
+    logger.info("Sync: %s entries changed since %s", len(items), lastsync)
+    fetched = fetch_events(sorted(items), cookies, headers)
+    for post in fetched:
+        save_post(post)
+        index[post["id"]] = post
+
+    # Requested but not returned by getevents: deleted on LJ. Keep the
+    # archived folders, just stop listing the entries.
+    deleted = set(items) - {int(p["id"]) >> 8 for p in fetched}
+    gone = [pid for pid in index if int(pid) >> 8 in deleted]
+    for pid in gone:
+        logger.info("Sync: post %s was deleted on LiveJournal", pid)
+        del index[pid]
+
+    save_posts_index(index.values())
+    if gone:
+        save_deleted(load_deleted().union(gone))
+    save_lastsync(cursor)
+    return list(index.values()), set(items)
@@ -0,0 +1,67 @@
+import unittest
+from unittest.mock import MagicMock
+import sys
+import os
+
+import requests
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import bandwidth
+import http_client
+
+class FakeTime:
+    """Clock whose sleep() advances it, like real time."""
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+    def __call__(self):
+        return self.now
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+class TestTokenBucket(unittest.TestCase):
+    def test_unlimited_never_waits(self):
+        bucket = bandwidth.TokenBucket(0)
+        self.assertEqual(bucket.consume(10 ** 9), 0.0)
+
+    def test_sustained_rate_is_capped(self):
+        t = FakeTime()
+        bucket = bandwidth.TokenBucket(1000, sleep=t.sleep, clock=t)
+        for _ in range(10):
+            bucket.consume(500)
+        # 5000 bytes at 1000 B/s, with the first second's burst already in the bucket
+        self.assertAlmostEqual(t.now, 4.0)
+
+    def test_idle_time_refills_only_one_second(self):
+        t = FakeTime()
+        bucket = bandwidth.TokenBucket(1000, sleep=t.sleep, clock=t)
+        bucket.consume(1000)
+        t.now += 60
+        self.assertEqual(bucket.consume(1000), 0.0)
+        self.assertAlmostEqual(bucket.consume(1000), 1.0)
+
+    def test_budget_reads_environment(self):
+        os.environ['API_MAX_KBPS'] = '2'
+        try:
+            bandwidth._buckets.pop('api', None)
+            self.assertEqual(bandwidth.budget('api').rate, 2048)
+        finally:
+            del os.environ['API_MAX_KBPS']
+            bandwidth._buckets.pop('api', None)
+
+    def test_client_charges_buffered_responses_to_api_budget(self):
+        r = requests.Response()
+        r.status_code = 200
+        r._content = b'x' * 300
+        session = MagicMock()
+        session.get.return_value = r
+        api = MagicMock(rate=100)
+        client = http_client.HTTPClient(session=session, retries=0, api_budget=api)
+        client.get('https://example.com/x')
+        api.consume.assert_called_once_with(300)
+        client.get('https://example.com/x', stream=True)
+        api.consume.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main()
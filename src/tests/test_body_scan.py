@@ -0,0 +1,44 @@
+import unittest
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+from body_scan import scan_body, post_meta, journal_link
+
+class TestBodyScan(unittest.TestCase):
+    def test_one_pass_collects_everything(self):
+        body = (
+            '<p>Hi <lj user="alice"> and <lj comm=cats></p>\n'
+            '<img src="http://pics.livejournal.com/a/1.jpg"><IMG SRC=\'https://ic.pics.livejournal.com/a/1.jpg\'>\n'
+            'see http://example.com/photo.png and <a href="http://example.com/big.JPG?x=1">big</a>\n'
+            '<a href="https://bob.livejournal.com/1234.html">old post</a>\n'
+            '<a href="https://www.livejournal.com/talkread.bml?journal=bob&amp;itemid=5">talk</a>\n'
+            '<lj-embed id="7"/><iframe src="https://www.youtube.com/embed/xyz"></iframe>'
+        )
+        meta = scan_body(body)
+        self.assertEqual(meta['images'], ['http://pics.livejournal.com/a/1.jpg'])
+        self.assertEqual(meta['image_links'], ['http://example.com/photo.png', 'http://example.com/big.JPG?x=1'])
+        self.assertEqual(meta['users'], ['alice', 'cats'])
+        self.assertEqual([l.get('ditemid') or l.get('itemid') for l in meta['links']], [1234, 5])
+        self.assertEqual(meta['embeds'], [{'tag': 'lj-embed', 'src': '7'},
+                                          {'tag': 'iframe', 'src': 'https://www.youtube.com/embed/xyz'}])
+
+    def test_url_inside_img_is_not_counted_twice(self):
+        meta = scan_body('<img src="http://a.example/x.gif">')
+        self.assertEqual(meta['image_links'], [])
+
+    def test_journal_link_forms(self):
+        self.assertEqual(journal_link('http://www.livejournal.com/users/some-one/99.html'),
+                         {'url': 'http://www.livejournal.com/users/some-one/99.html', 'journal': 'some_one', 'ditemid': 99})
+        self.assertEqual(journal_link('https://some-one.livejournal.com/99.html?thread=3#t3')['journal'], 'some_one')
+        self.assertIsNone(journal_link('https://bob.livejournal.com/profile'))
+        self.assertIsNone(journal_link('https://notlivejournal.com/1.html'))
+
+    def test_post_meta_merges_comments(self):
+        meta = post_meta({'subject': '<lj user=a>', 'body': '<img src="http://h/1.jpg">'},
+                         [{'body': '<img src="https://h/1.jpg"><lj user=b>'}, {'body': None}])
+        self.assertEqual(meta['images'], ['http://h/1.jpg'])
+        self.assertEqual(meta['users'], ['a', 'b'])
+
+if __name__ == '__main__':
+    unittest.main()
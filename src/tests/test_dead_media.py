@@ -0,0 +1,78 @@
+import unittest
+import tempfile
+import sys
+import os
+from pathlib import Path
+
+import requests
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import dead_media
+
+def http_error(status):
+    r = requests.Response()
+    r.status_code = status
+    return requests.HTTPError(f'{status}', response=r)
+
+class TestFailureKind(unittest.TestCase):
+    def test_kinds(self):
+        self.assertEqual(dead_media.failure_kind(http_error(404)), '404')
+        self.assertEqual(dead_media.failure_kind(http_error(410)), '410')
+        self.assertIsNone(dead_media.failure_kind(http_error(503)))
+        self.assertEqual(dead_media.failure_kind(requests.Timeout('read timed out')), 'timeout')
+        self.assertIsNone(dead_media.failure_kind(RuntimeError('other')))
+
+    def test_wrapped_connection_errors(self):
+        dns = requests.ConnectionError(OSError("Failed to resolve 'gone.example' ([Errno -2] Name or service not known)"))
+        self.assertEqual(dead_media.failure_kind(dns), 'dns')
+        refused = requests.ConnectionError()
+        refused.__context__ = ConnectionRefusedError(111, 'Connection refused')
+        self.assertEqual(dead_media.failure_kind(refused), 'refused')
+
+class TestDeadMediaCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / 'dead-media.json'
+        self.now = 1_000_000.0
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def cache(self):
+        return dead_media.DeadMediaCache(self.path, recheck_days=30, clock=lambda: self.now)
+
+    def test_host_failure_skips_every_url_on_host(self):
+        cache = self.cache()
+        cache.record('http://gone.example/a.jpg', requests.ConnectionError(OSError('Name or service not known')))
+        cache.save()
+        cache = self.cache()
+        self.assertEqual(cache.check('http://gone.example/b.jpg'), 'dns')
+        self.assertIsNone(cache.check('http://alive.example/a.jpg'))
+
+    def test_timeout_only_skips_that_url(self):
+        cache = self.cache()
+        cache.record('http://slow.example/big.jpg', requests.Timeout())
+        self.assertEqual(cache.check('http://slow.example/big.jpg'), 'timeout')
+        self.assertIsNone(cache.check('http://slow.example/small.jpg'))
+
+    def test_url_failure_only_skips_that_url(self):
+        cache = self.cache()
+        cache.record('http://host.example/a.jpg', http_error(404))
+        self.assertEqual(cache.check('http://host.example/a.jpg'), '404')
+        self.assertIsNone(cache.check('http://host.example/b.jpg'))
+
+    def test_entries_expire_after_recheck_interval(self):
+        cache = self.cache()
+        cache.record('http://host.example/a.jpg', http_error(410))
+        self.now += 31 * 86400
+        self.assertIsNone(cache.check('http://host.example/a.jpg'))
+
+    def test_success_forgets_and_transient_errors_are_not_cached(self):
+        cache = self.cache()
+        self.assertIsNone(cache.record('http://host.example/a.jpg', http_error(500)))
+        cache.record('http://host.example/a.jpg', http_error(404))
+        cache.forget('http://host.example/a.jpg')
+        self.assertIsNone(cache.check('http://host.example/a.jpg'))
+
+if __name__ == '__main__':
+    unittest.main()
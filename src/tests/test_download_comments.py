@@ -3,6 +3,8 @@ from unittest.mock import patch, mock_open, MagicMock
 import xml.etree.ElementTree as ET
 import sys
 import os
+import json
+import tempfile
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
 import download_comments
@@ -41,5 +43,94 @@ class TestDownloadComments(unittest.TestCase):
         self.assertEqual(local_max_id, 456)
         self.assertEqual(comments[0]['author'], 'alice')
 
+class TestSyncComments(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        self.posts = [{'id': str(1 << 8 | 5), 'date': '2020-01-01 10:00:00'}, {'id': str(2 << 8 | 7), 'date': '2020-01-02 10:00:00'}]
+        os.makedirs('posts/2020/01/2020-01-01-10-00-00-261')
+        os.makedirs('posts/2020/01/2020-01-02-10-00-00-519')
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def serve(self, comments, page=2):
+        """Fake export_comments.bml: meta and body pages of *page* comments each."""
+        requests = []
+        def fetch(params, cookies, headers):
+            requests.append((params['get'], params['startid']))
+            ids = sorted(i for i in comments if i >= params['startid'])[:page]
+            maxid = max(comments)
+            if params['get'] == 'comment_meta':
+                rows = ''.join(f"<comment id='{i}' jitemid='{comments[i][0]}' state='{comments[i][1]}'/>" for i in ids)
+                return f"<livejournal><maxid>{maxid}</maxid><comments>{rows}</comments><usermaps><usermap id='9' user='bob'/></usermaps></livejournal>"
+            rows = ''.join(
+                f"<comment id='{i}' jitemid='{comments[i][0]}' posterid='9'{' state=%r' % comments[i][1] if comments[i][1] else ''}>"
+                f"<body>{comments[i][2]}</body></comment>" for i in ids)
+            return f"<livejournal><comments>{rows}</comments></livejournal>"
+        return requests, fetch
+
+    def test_first_run_fetches_everything_then_only_changes(self):
+        comments = {1: (1, '', 'a'), 2: (1, '', 'b'), 3: (2, '', 'c')}
+        # Userpics are resolved like in a full download (no network here)
+        userpic = patch.multiple('download_comments.UserpicManager',
+                                 get_userpic_url=MagicMock(return_value='http://pics.example/9.jpg'),
+                                 download_userpic=MagicMock(return_value='images/icons/9/None.jpg'))
+        userpic.start()
+        self.addCleanup(userpic.stop)
+        requests, fetch = self.serve(comments)
+        with patch('download_comments.fetch_xml', side_effect=fetch):
+            all_comments, changed = download_comments.sync_comments({}, {}, self.posts)
+        self.assertEqual([c['id'] for c in all_comments], [1, 2, 3])
+        self.assertEqual(changed, {1, 2})
+        self.assertEqual(all_comments[0]['author'], 'bob')
+        self.assertEqual(all_comments[0]['icon_path'], 'images/icons/9/None.jpg')
+
+        # Comment 2 deleted, comment 4 added on post 2
+        comments.update({2: (1, 'D', ''), 4: (2, '', 'd')})
+        requests, fetch = self.serve(comments)
+        with patch('download_comments.fetch_xml', side_effect=fetch):
+            all_comments, changed = download_comments.sync_comments({}, {}, self.posts)
+        self.assertEqual(changed, {1, 2})
+        self.assertEqual([r for r in requests if r[0] == 'comment_body'], [('comment_body', 2), ('comment_body', 4)])
+        self.assertEqual({c['id']: c.get('state') for c in all_comments}[2], 'D')
+        saved = json.load(open('posts/2020/01/2020-01-02-10-00-00-519/comments.json'))
+        self.assertEqual([c['id'] for c in saved], [3, 4])
+
+        # Nothing changed: only the meta walk, no bodies
+        requests, fetch = self.serve(comments)
+        with patch('download_comments.fetch_xml', side_effect=fetch):
+            _, changed = download_comments.sync_comments({}, {}, self.posts)
+        self.assertEqual(changed, set())
+        self.assertTrue(all(r[0] == 'comment_meta' for r in requests))
+
+    def test_full_download_records_the_sync_baseline(self):
+        comments = {1: (1, '', 'a'), 2: (1, '', 'b'), 3: (2, '', 'c')}
+        userpic = patch.multiple('download_comments.UserpicManager',
+                                 get_userpic_url=MagicMock(return_value=None))
+        userpic.start()
+        self.addCleanup(userpic.stop)
+        os.makedirs('batch-downloads/posts-json')
+        for jitemid in (1, 2):
+            open(f'batch-downloads/posts-json/{jitemid}.json', 'w').close()
+
+        def per_post(post_id, cookies, headers):
+            return [{'id': cid, 'jitemid': j, 'children': [], 'body': body}
+                    for cid, (j, _, body) in comments.items() if j == int(post_id)]
+
+        _, fetch = self.serve(comments)
+        with patch('download_comments.fetch_xml', side_effect=fetch), \
+                patch('download_comments.get_comments_for_post', side_effect=per_post), \
+                patch('download_comments.time.sleep'):
+            download_comments.download_comments({}, {})
+        # The first --sync after a full download fetches no bodies
+        requests, fetch = self.serve(comments)
+        with patch('download_comments.fetch_xml', side_effect=fetch):
+            _, changed = download_comments.sync_comments({}, {}, self.posts)
+        self.assertEqual(changed, set())
+        self.assertTrue(all(r[0] == 'comment_meta' for r in requests))
+
 if __name__ == '__main__':
     unittest.main()
@@ -114,3 +114,53 @@ def test_download_posts_prompts_for_dates():
 
     # Verify we got no posts
     assert len(posts) == 0, "Expected no posts for this period"
+
+def test_plan_months_spans_year_boundary():
+    """plan_months lists every month in the range, inclusive."""
+    from download_posts import plan_months
+    assert plan_months(datetime(2012, 11, 1), datetime(2013, 2, 1)) == [(2012, 11), (2012, 12), (2013, 1), (2013, 2)]
+
+def test_discover_active_months_uses_daycounts(monkeypatch):
+    """Only months with a non-zero getdaycounts entry are fetched."""
+    import download_posts
+    monkeypatch.setattr(download_posts, 'fetch_active_months', lambda cookies, headers: {(2013, 7)})
+    months = download_posts.plan_months(datetime(2013, 1, 1), datetime(2013, 12, 1))
+    assert download_posts.discover_active_months(months, {}, {}) == [(2013, 7)]
+
+def test_discover_active_months_falls_back_to_empty_cache(monkeypatch, tmp_path):
+    """Without getdaycounts, months known to be empty are skipped, except recent ones."""
+    import download_posts
+    def fail(cookies, headers):
+        raise RuntimeError('no xmlrpc')
+    monkeypatch.setattr(download_posts, 'fetch_active_months', fail)
+    monkeypatch.setattr(download_posts, 'MONTH_INDEX', str(tmp_path / 'month-index.json'))
+    checked = datetime(2013, 3, 10).timestamp()
+    download_posts.save_empty_months({'2013-01': checked, '2013-02': checked, '2013-03': checked})
+    months = download_posts.plan_months(datetime(2013, 1, 1), datetime(2013, 4, 1))
+    plan = download_posts.discover_active_months(months, {}, {}, today=datetime(2013, 3, 15))
+    assert plan == [(2013, 2), (2013, 3), (2013, 4)]
+
+def test_empty_daycounts_falls_back_to_empty_cache(monkeypatch, tmp_path):
+    """A getdaycounts answer without days is treated as a failure, not as an empty journal."""
+    import download_posts
+    import lj_xmlrpc
+    monkeypatch.setattr(download_posts, 'MONTH_INDEX', str(tmp_path / 'month-index.json'))
+    months = download_posts.plan_months(datetime(2013, 1, 1), datetime(2013, 3, 1))
+    for result in ({}, {'daycounts': []}):
+        monkeypatch.setattr(lj_xmlrpc, 'call', lambda method, params, cookies, headers: result)
+        assert download_posts.discover_active_months(months, {}, {}, today=datetime(2014, 1, 1)) == months
+
+def test_known_empty_months_expire(monkeypatch, tmp_path):
+    """An empty-month record older than EMPTY_MONTH_RECHECK_DAYS is fetched again (backdated posts)."""
+    import download_posts
+    def fail(cookies, headers):
+        raise RuntimeError('no xmlrpc')
+    monkeypatch.setattr(download_posts, 'fetch_active_months', fail)
+    monkeypatch.setattr(download_posts, 'MONTH_INDEX', str(tmp_path / 'month-index.json'))
+    monkeypatch.setenv('EMPTY_MONTH_RECHECK_DAYS', '30')
+    download_posts.save_empty_months({'2010-01': datetime(2013, 1, 1).timestamp(), '2010-02': datetime(2013, 3, 1).timestamp()})
+    months = download_posts.plan_months(datetime(2010, 1, 1), datetime(2010, 2, 1))
+    assert download_posts.discover_active_months(months, {}, {}, today=datetime(2013, 3, 15)) == [(2010, 1)]
+    # Records from before check times were kept are rechecked once
+    (tmp_path / 'month-index.json').write_text('{"empty": ["2010-02"]}')
+    assert download_posts.discover_active_months(months, {}, {}, today=datetime(2013, 3, 15)) == [(2010, 1), (2010, 2)]
@@ -1,10 +1,16 @@
 import unittest
+import unittest.mock
+import json
+import subprocess
+import tempfile
 import sys
 import os
 from datetime import datetime
+from pathlib import Path
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
 import export
+import render
 
 class TestExportHelpers(unittest.TestCase):
     def test_month_ok(self):
@@ -17,6 +23,9 @@ class TestExportHelpers(unittest.TestCase):
         export.fix_user_links(js)
         self.assertEqual(js['subject'], 'bob')
         self.assertEqual(js['body'], 'alice')
+        untouched = {'body': '<lj user="x">'}
+        export.fix_user_links(untouched, users=[])
+        self.assertEqual(untouched['body'], '<lj user="x">')
 
     def test_get_slug(self):
         js = {'subject': 'Hello World!', 'id': '123'}
@@ -29,5 +38,179 @@ class TestExportHelpers(unittest.TestCase):
         self.assertIn('<h1>Test</h1>', html)
         self.assertIn('Body', html)
 
+    def test_nest_comments_sorts_once(self):
+        cmts = {
+            3: {'id': 3, 'parentid': 1, 'body': 'c'},
+            1: {'id': 1, 'body': 'a'},
+            2: {'id': 2, 'parentid': 1, 'body': 'b'},
+        }
+        root = export.nest_comments(cmts)
+        self.assertEqual([c['id'] for c in root], [1])
+        self.assertEqual([c['id'] for c in root[0]['children']], [2, 3])
+
+    def test_comments_to_html_nesting(self):
+        root = export.nest_comments({
+            1: {'id': 1, 'author': 'alice'},
+            2: {'id': 2, 'parentid': 1, 'author': 'bob', 'state': 'D'},
+            3: {'id': 3, 'parentid': 1, 'author': 'carol'},
+        })
+        html = export.comments_to_html(root)
+        self.assertEqual(html, (
+            "<ul>\n<li><h3>alice: </h3>\n<a id='comment-1'></a>\n"
+            "<ul>\n\n<li><h3>carol: </h3>\n<a id='comment-3'></a>\n</li>\n</ul>\n</li>\n</ul>"
+        ))
+
+    def test_deep_thread_does_not_recurse(self):
+        depth = 5 * sys.getrecursionlimit()
+        cmts = {i: {'id': i, 'parentid': i - 1} for i in range(2, depth + 1)}
+        cmts[1] = {'id': 1}
+        root = export.nest_comments(cmts)
+        html = export.comments_to_html(root)
+        self.assertEqual(html.count('<li>'), depth)
+        self.assertEqual(len(list(export.iter_comments(root))), depth)
+        self.assertTrue(export.json_dumps_tree(root).startswith('[\n  {\n    "id": 1,'))
+
+    def test_json_dumps_tree_matches_json(self):
+        obj = {'id': '1', 'post': {'subject': 'é', 'tags': [], 'meta': {}}, 'comments': [{'id': 2, 'children': [{'id': 3}]}], 'n': None}
+        self.assertEqual(export._json_dumps_stack(obj), json.dumps(obj, ensure_ascii=False, indent=2))
+        # Shallow documents take the plain json.dumps path
+        with unittest.mock.patch.object(export, '_json_dumps_stack', side_effect=AssertionError('fallback used')):
+            self.assertEqual(export.json_dumps_tree(obj), json.dumps(obj, ensure_ascii=False, indent=2))
+
+    def test_parse_formats(self):
+        self.assertEqual(export.parse_formats('json'), ['json'])
+        self.assertEqual(export.parse_formats(['md', 'json,html']), ['json', 'html', 'md'])
+        with self.assertRaises(ValueError):
+            export.parse_formats(['json', 'pdf'])
+
+    def test_combine_writes_all_formats_in_one_pass(self):
+        posts = [{'id': str(5 << 8), 'date': '2020-02-03 04:05:06', 'subject': 'Hi <lj user="bob">', 'body': 'Hello\nthere'}]
+        comments = [
+            {'id': 1, 'jitemid': 5, 'author': 'alice', 'body': 'first'},
+            {'id': 2, 'jitemid': 5, 'parentid': 1, 'author': 'carol', 'body': 'reply'},
+        ]
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                with unittest.mock.patch.object(export, 'comments_to_html', wraps=export.comments_to_html) as render:
+                    export.combine(posts, comments, ['json', 'html', 'md'])
+                self.assertEqual(render.call_count, 1)
+                post_json = json.loads(next(Path('posts').rglob('post.json')).read_text())
+                self.assertEqual(post_json['post']['body'], 'Hello\nthere')
+                self.assertEqual(post_json['meta']['users'], ['bob'])
+                html = Path('posts-html/2020-02/1280.html').read_text()
+                self.assertIn('<h1>Hi bob</h1>', html)
+                self.assertIn("comment-2", html)
+                self.assertIn('title: Hi bob', Path('posts-markdown/2020-02/1280.md').read_text())
+                self.assertTrue(Path('comments-markdown/Hi-bob.md').exists())
+            finally:
+                os.chdir(cwd)
+                export.SLUGS.clear()
+
+    def test_parallel_render_matches_serial(self):
+        # Tables, lists and quotes in every order: converter state must not leak between documents
+        bodies = ['<table><tr><td>a {n}</td><td>b</td></tr></table>', '<ol><li>one {n}<li>two</ol>',
+                  '<blockquote>quoted {n}<br>line</blockquote>', '<ul><li>x {n}</li></ul><p>after</p>']
+
+        def run(jobs):
+            posts = [{'id': str(i << 8), 'date': f'2020-0{1 + i % 3}-01 00:00:00', 'subject': 'Same title',
+                      'body': bodies[i % 4].format(n=i) + bodies[(i * 3 + 1) % 4].format(n=i)} for i in range(1, 30)]
+            comments = [{'id': j, 'jitemid': 1 + j % 29, 'author': 'a', 'body': bodies[j % 4].format(n=j)} for j in range(1, 60)]
+            cwd = os.getcwd()
+            with tempfile.TemporaryDirectory() as tmp:
+                os.chdir(tmp)
+                try:
+                    export.SLUGS.clear()
+                    # A fresh engine per run, so nothing converted in one run is reused by the other
+                    export.RENDER = render.RenderEngine('batch-downloads/render-cache.json')
+                    export.combine(posts, comments, ['html', 'md'], jobs=jobs)
+                    return {str(p): p.read_text() for p in sorted(Path('.').rglob('*.*')) if 'batch-downloads' not in p.parts}
+                finally:
+                    os.chdir(cwd)
+                    export.SLUGS.clear()
+        engine = export.RENDER
+        try:
+            serial = run(1)
+            self.assertEqual(run(4), serial)
+        finally:
+            export.RENDER = engine
+        self.assertIn('comments-markdown/Same-title.md', serial)
+        self.assertIn('comments-markdown/Same-title-512.md', serial)
+
+    def test_combine_site_format(self):
+        posts = [{'id': '256', 'date': '2020-01-01 00:00:00', 'subject': 'Hi', 'body': 'text'}]
+        comments = [{'id': 1, 'jitemid': 1, 'author': 'a', 'body': 'first'}]
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                export.combine(posts, comments, ['site'])
+                page = Path('site/2020/01/256.html').read_text()
+                self.assertIn('<h1>Hi</h1>', page)
+                self.assertIn("<a id='comment-1'></a>", page)
+                self.assertTrue(Path('site/index.html').exists())
+                self.assertFalse(Path('posts').exists())
+            finally:
+                os.chdir(cwd)
+
+    def test_combine_search_format(self):
+        posts = [{'id': '256', 'date': '2020-01-01 00:00:00', 'subject': 'Hi', 'body': '<b>Sunny</b> day'}]
+        comments = [{'id': 1, 'jitemid': 1, 'author': 'a', 'body': 'lovely weather'}]
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                export.combine(posts, comments, ['site', 'search'])
+                docs = Path('search/docs.js').read_text()
+                self.assertIn('"../site/2020/01/256.html"', docs)
+                self.assertIn('"sunny":[0]', Path('search/shards/%s.js' % 'su'.encode().hex()).read_text())
+                self.assertIn('"weather":[0]', Path('search/shards/%s.js' % 'we'.encode().hex()).read_text())
+            finally:
+                os.chdir(cwd)
+
+    def test_post_link_uses_each_writers_folder(self):
+        post = {'id': '512', 'date': '2014-02-01 10:00:00', 'eventtime': '2009-05-01 10:00:00'}
+        self.assertEqual(export.post_link('512', post, ['site', 'html']), 'site/2009/05/512.html')
+        self.assertEqual(export.post_link('512', post, ['html']), 'posts-html/2014-02/512.html')
+        self.assertEqual(export.post_link('512', post, ['md']), 'posts-markdown/2014-02/512.md')
+        self.assertEqual(export.post_link('512', post, ['json']), 'posts/2009/05/2009-05-01-10-00-512/post.json')
+
+    def test_narrower_search_rerun_keeps_other_months(self):
+        jan = {'id': '256', 'date': '2020-01-01 00:00:00', 'subject': 'Jan', 'body': 'sunny'}
+        feb = {'id': '512', 'date': '2020-02-01 00:00:00', 'subject': 'Feb', 'body': 'rainy'}
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                export.combine([dict(jan), dict(feb)], [], ['html', 'search'])
+                export.combine([dict(feb, body='snowy')], [], ['html', 'search'], months=('2020-02', '2020-02'))
+                docs = Path('search/docs.js').read_text()
+                self.assertIn('"Jan"', docs)
+                self.assertIn('"sunny":[1]', Path('search/shards/%s.js' % 'su'.encode().hex()).read_text())
+                self.assertIn('"snowy":[0]', Path('search/shards/%s.js' % 'sn'.encode().hex()).read_text())
+                self.assertFalse(Path('search/shards/%s.js' % 'ra'.encode().hex()).exists())
+            finally:
+                os.chdir(cwd)
+
+    def test_combine_changed_limits_per_post_writes(self):
+        posts = [{'id': str(i << 8), 'date': '2020-01-01 00:00:00', 'subject': f'P{i}', 'body': 'b'} for i in (1, 2)]
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                export.combine(posts, [], ['json', 'html', 'site'], changed={2})
+                self.assertEqual([p.name for p in Path('posts-html').rglob('*.html')], ['512.html'])
+                self.assertEqual(len(list(Path('posts').rglob('post.json'))), 1)
+                self.assertTrue(Path('site/2020/01/256.html').exists())
+            finally:
+                os.chdir(cwd)
+
+    def test_import_does_not_load_heavy_dependencies(self):
+        src_dir = os.path.dirname(os.path.abspath(export.__file__))
+        code = "import sys, export; print([m for m in ('requests', 'html2text', 'markdown', 'bs4') if m in sys.modules])"
+        out = subprocess.run([sys.executable, '-c', code], cwd=src_dir, capture_output=True, text=True, check=True)
+        self.assertEqual(out.stdout.strip(), '[]')
+
 if __name__ == '__main__':
     unittest.main()
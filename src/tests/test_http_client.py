@@ -0,0 +1,95 @@
+import unittest
+from unittest.mock import MagicMock
+import sys
+import os
+
+import requests
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import http_client
+
+def response(status, headers=None):
+    r = requests.Response()
+    r.status_code = status
+    r.headers.update(headers or {})
+    r.url = 'https://example.com/x'
+    return r
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    def __call__(self):
+        return self.now
+
+class TestHTTPClient(unittest.TestCase):
+    def make(self, *results, retries=3):
+        self.session = MagicMock()
+        self.session.get.side_effect = list(results)
+        self.sleeps = []
+        self.clock = FakeClock()
+        return http_client.HTTPClient(session=self.session, retries=retries, sleep=self.sleeps.append,
+                                      rng=lambda: 1.0, clock=self.clock)
+
+    def test_retries_transient_errors_with_backoff(self):
+        ok = response(200)
+        client = self.make(requests.ConnectionError('reset'), response(503), ok)
+        self.assertIs(client.get('https://example.com/x'), ok)
+        self.assertEqual(self.sleeps, [1.0, 2.0])
+
+    def test_honours_retry_after(self):
+        client = self.make(response(429, {'Retry-After': '7'}), response(200))
+        client.get('https://example.com/x')
+        self.assertEqual(self.sleeps, [7.0])
+
+    def test_hard_4xx_is_not_retried(self):
+        client = self.make(response(404))
+        with self.assertRaises(requests.HTTPError):
+            client.get('https://example.com/x')
+        self.assertEqual(self.session.get.call_count, 1)
+
+    def test_gives_up_after_retries(self):
+        client = self.make(*[requests.Timeout('slow')] * 3, retries=2)
+        with self.assertRaises(requests.Timeout):
+            client.get('https://example.com/x')
+        self.assertEqual(self.session.get.call_count, 3)
+
+    def test_circuit_opens_per_host_and_recovers(self):
+        client = self.make(*[requests.ConnectionError('down')] * 5, response(200), response(200), retries=0)
+        for _ in range(http_client.BREAKER_THRESHOLD):
+            with self.assertRaises(requests.ConnectionError):
+                client.get('https://dead.example/a')
+        with self.assertRaises(http_client.CircuitOpenError):
+            client.get('https://dead.example/b')
+        self.assertEqual(self.session.get.call_count, 5)  # no request while open
+        client.get('https://alive.example/c')             # other hosts unaffected
+        self.clock.now += http_client.BREAKER_COOLDOWN
+        client.get('https://dead.example/d')              # trial request succeeds, circuit closes
+        self.assertTrue(client.breaker('https://dead.example/').allow())
+
+    def test_retries_above_breaker_threshold_are_all_used(self):
+        retries = http_client.BREAKER_THRESHOLD + 3
+        client = self.make(*[requests.ConnectionError('refused')] * retries, response(200), retries=retries)
+        self.assertEqual(client.get('https://flaky.example/x').status_code, 200)
+        self.assertEqual(self.session.get.call_count, retries + 1)
+
+    def test_one_exhausted_request_does_not_open_circuit(self):
+        client = self.make(*[requests.ConnectionError('down')] * 5, response(200), retries=4)
+        with self.assertRaises(requests.ConnectionError):
+            client.get('https://flaky.example/a')
+        self.assertEqual(client.get('https://flaky.example/b').status_code, 200)
+
+    def test_api_host_waits_out_open_circuit(self):
+        client = self.make(*[requests.ConnectionError('down')] * 5, response(200), retries=0)
+        client.sleep = lambda s: (self.sleeps.append(s), setattr(self.clock, 'now', self.clock.now + s))
+        for _ in range(http_client.BREAKER_THRESHOLD):
+            with self.assertRaises(requests.ConnectionError):
+                client.get('https://www.livejournal.com/export_do.bml')
+        self.assertEqual(client.get('https://www.livejournal.com/export_do.bml').status_code, 200)
+        self.assertEqual(self.sleeps, [http_client.BREAKER_COOLDOWN])
+
+    def test_retry_after_http_date(self):
+        self.assertEqual(http_client.retry_after(response(503, {'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'})), 0.0)
+        self.assertIsNone(http_client.retry_after(response(503)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+import tempfile
+import sys
+import os
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import export
+from body_scan import scan_body
+from link_index import LinkIndex, local_href, localize_links
+
+FIRST = {'id': str(3 * 256 + 7), 'date': '2013-07-01 10:00:00', 'subject': 'First', 'body': 'one'}
+
+class TestLinkIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = LinkIndex('some-one')
+        self.index.add(FIRST)
+
+    def test_resolves_ditemid_and_itemid_forms(self):
+        body = ('<a href="https://some-one.livejournal.com/775.html?thread=2561#t2561">a</a>'
+                '<a href="http://www.livejournal.com/users/some_one/775.html">b</a>'
+                '<a href="https://www.livejournal.com/talkread.bml?journal=some_one&itemid=3">c</a>'
+                '<a href="https://other.livejournal.com/775.html">d</a>'
+                '<a href="https://some-one.livejournal.com/999.html">e</a>')
+        targets = self.index.targets(scan_body(body)['links'])
+        self.assertEqual(len(targets), 3)
+        hrefs = {local_href(t, 'html', 2) for t in targets.values()}
+        self.assertEqual(hrefs, {'../../posts-html/2013-07/775.html#comment-10', '../../posts-html/2013-07/775.html'})
+
+    def test_localize_links_copies(self):
+        post = {'body': '<a href="https://some-one.livejournal.com/775.html">x</a>'}
+        comments = [{'id': 1, 'body': None}]
+        targets = self.index.targets(scan_body(post['body'])['links'])
+        new_post, new_comments = localize_links(post, comments, targets, 'site', 3)
+        self.assertEqual(new_post['body'], '<a href="../../../site/2013/07/775.html">x</a>')
+        self.assertIn('livejournal.com', post['body'])
+        self.assertIsNot(new_comments[0], comments[0])
+
+    def test_backdated_post_keeps_its_logtime_folder_except_on_the_site(self):
+        self.index.add({'id': '1281', 'date': '2014-02-01 10:00:00', 'eventtime': '2009-05-01 10:00:00',
+                        'subject': 'Backdated', 'body': ''})
+        target = self.index.targets(scan_body('<a href="https://some-one.livejournal.com/1281.html">x</a>')['links'])
+        target = next(iter(target.values()))
+        self.assertEqual(local_href(target, 'html', 2), '../../posts-html/2014-02/1281.html')
+        self.assertEqual(local_href(target, 'md', 2), '../../posts-markdown/2014-02/1281.md')
+        self.assertEqual(local_href(target, 'site', 3), '../../../site/2009/05/1281.html')
+
+    def test_combine_rewrites_links_between_posts(self):
+        second = {'id': str(4 * 256 + 1), 'date': '2013-08-01 10:00:00', 'subject': 'Second',
+                  'body': 'see <a href="https://some-one.livejournal.com/775.html">first</a>'}
+        comments = [{'id': 1, 'jitemid': 4, 'body': '<a href="https://some-one.livejournal.com/775.html">it</a>'}]
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                export.combine([dict(FIRST), second], comments, ['json', 'html', 'md'], journal='some-one')
+                html = Path('posts-html/2013-08/1025.html').read_text()
+                self.assertEqual(html.count('href="../../posts-html/2013-07/775.html"'), 2)
+                self.assertIn('(../../posts-markdown/2013-07/775.md)', Path('posts-markdown/2013-08/1025.md').read_text())
+                self.assertIn('href="../posts-markdown/2013-07/775.md"', Path('comments-markdown/Second.md').read_text())
+                # post.json keeps the original URLs
+                self.assertIn('some-one.livejournal.com', next(Path('posts').rglob('*-1025/post.json')).read_text())
+            finally:
+                os.chdir(cwd)
+                export.SLUGS.clear()
+
+if __name__ == '__main__':
+    unittest.main()
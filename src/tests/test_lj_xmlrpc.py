@@ -0,0 +1,36 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import xmlrpc.client
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import lj_xmlrpc
+
+def response(body):
+    r = MagicMock()
+    r.content = body.encode('utf-8')
+    return r
+
+class TestCall(unittest.TestCase):
+    @patch('requests.post')
+    def test_struct_request_and_decoded_result(self, mock_post):
+        mock_post.return_value = response(xmlrpc.client.dumps(
+            ({'daycounts': [{'date': '2013-07-01', 'count': 2}], 'name': xmlrpc.client.Binary('Привет'.encode())},),
+            methodresponse=True))
+        result = lj_xmlrpc.call('LJ.XMLRPC.getdaycounts', {'usejournal': 'bob'}, {'c': '1'}, {'User-Agent': 'x'})
+        self.assertEqual(result['daycounts'], [{'date': '2013-07-01', 'count': 2}])
+        self.assertEqual(result['name'], 'Привет')
+        (params,), method = xmlrpc.client.loads(mock_post.call_args.kwargs['data'])
+        self.assertEqual(method, 'LJ.XMLRPC.getdaycounts')
+        self.assertEqual(params, {'auth_method': 'cookie', 'ver': 1, 'usejournal': 'bob'})
+        self.assertEqual(mock_post.call_args.kwargs['headers']['X-LJ-Auth'], 'cookie')
+
+    @patch('requests.post')
+    def test_fault_raises_rpc_error(self, mock_post):
+        mock_post.return_value = response(xmlrpc.client.dumps(xmlrpc.client.Fault(101, 'Invalid password'), methodresponse=True))
+        with self.assertRaises(lj_xmlrpc.RPCError):
+            lj_xmlrpc.call('LJ.XMLRPC.getdaycounts', {}, {}, {})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+from unittest.mock import patch
+import logging
+import sys
+import threading
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import logger as lj_logger
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+class TestLogger(unittest.TestCase):
+    def setUp(self):
+        self.log = lj_logger.setup_logger('test_logger_module', level=3)
+        self.recorder = RecordingHandler()
+        self.log.handlers = [self.recorder]
+        lj_logger._payload_counters.clear()
+
+    def test_queued_handler_defers_formatting(self):
+        class Expensive:
+            threads = []
+            def __str__(self):
+                Expensive.threads.append(threading.get_ident())
+                return 'expensive'
+            __repr__ = __str__
+        log = lj_logger.setup_logger('test_logger_deferred', level=3)
+        log.propagate = False  # pytest's capture handler on the root logger formats in this thread
+        with patch('builtins.print'):
+            log.debug("payload %s", Expensive())
+            lj_logger.flush_logs()
+        self.assertEqual(len(Expensive.threads), 1)  # the record was emitted...
+        self.assertNotEqual(Expensive.threads[0], threading.get_ident())  # ...and formatted by the writer
+
+    def test_queued_handler_snapshots_mutable_args(self):
+        handler = lj_logger._get_queue_handler()
+        items = ['a']
+        record = logging.LogRecord('x', logging.INFO, __file__, 1, 'items %s', (items,), None)
+        handler.prepare(record)
+        items.append('b')
+        self.assertEqual(record.getMessage(), "items ['a']")
+        lj_logger.flush_logs()
+
+    def test_queued_handler_does_not_prepare_record(self):
+        handler = lj_logger._get_queue_handler()
+        record = logging.LogRecord('x', logging.INFO, __file__, 1, 'a %s', ('b',), None)
+        self.assertIs(handler.prepare(record), record)
+        self.assertEqual(record.args, ('b',))
+        lj_logger.flush_logs()
+
+    def test_log_payload_is_capped(self):
+        with patch.object(lj_logger, 'PAYLOAD_SAMPLE_EVERY', 1), patch.object(lj_logger, 'PAYLOAD_MAX_CHARS', 10):
+            lj_logger.log_payload(self.log, 'x' * 50, 'API Response for post %s', 7)
+        message = self.recorder.records[0].getMessage()
+        self.assertTrue(message.startswith('API Response for post 7: xxxxxxxxxx…'))
+        self.assertIn('40 more chars', message)
+
+    def test_log_payload_is_sampled(self):
+        with patch.object(lj_logger, 'PAYLOAD_SAMPLE_EVERY', 3):
+            for i in range(7):
+                lj_logger.log_payload(self.log, 'body', 'API Response for post %s', i)
+        self.assertEqual([r.args[0] for r in self.recorder.records], [0, 3, 6])
+
+    def test_log_payload_skipped_when_debug_off(self):
+        self.log.setLevel(logging.INFO)
+        lj_logger.log_payload(self.log, 'body', 'API Response for post %s', 1)
+        self.assertEqual(self.recorder.records, [])
+
+if __name__ == '__main__':
+    unittest.main()
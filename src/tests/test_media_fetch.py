@@ -0,0 +1,113 @@
+import unittest
+import tempfile
+import io
+import sys
+import os
+from pathlib import Path
+
+import requests
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import media_fetch
+from http_client import HTTPClient
+
+DATA = bytes(range(256)) * 40  # 10240 bytes
+
+def response(status, body, headers=None, fail_after=None):
+    """A streamed requests.Response; fail_after cuts the body with a ChunkedEncodingError."""
+    r = requests.Response()
+    r.status_code = status
+    r.headers.update(headers or {})
+    r.url = 'http://img.example/pic.jpg'
+    r.raw = io.BytesIO()
+
+    def chunks(size):
+        sent = 0
+        while sent < len(body):
+            if fail_after is not None and sent >= fail_after:
+                raise requests.exceptions.ChunkedEncodingError('connection broken')
+            yield body[sent:sent + size]
+            sent += size
+    r.iter_content = chunks
+    return r
+
+class FakeSession:
+    """Serves DATA, honouring Range; the first `drops` responses are cut short."""
+    def __init__(self, drops=0, ranges=True, length=True):
+        self.drops = drops
+        self.ranges = ranges
+        self.length = length
+        self.requests = []
+
+    def get(self, url, headers=None, **kwargs):
+        self.requests.append(dict(headers or {}))
+        start = 0
+        rng = (headers or {}).get('Range')
+        if rng and self.ranges:
+            start = int(rng.split('=')[1].rstrip('-'))
+        body = DATA[start:]
+        if rng and self.ranges:
+            hdrs = {'Content-Range': f'bytes {start}-{len(DATA) - 1}/{len(DATA)}'}
+            status = 206
+        else:
+            hdrs = {'Content-Length': str(len(DATA))} if self.length else {}
+            status = 200
+        fail_after = None
+        if self.drops:
+            self.drops -= 1
+            fail_after = 1024
+        return response(status, body, hdrs, fail_after)
+
+class TestFetchToFile(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dest = Path(self.tmp.name) / 'pic.jpg'
+        self.chunk = media_fetch.CHUNK_SIZE
+        media_fetch.CHUNK_SIZE = 1024
+
+    def tearDown(self):
+        media_fetch.CHUNK_SIZE = self.chunk
+        self.tmp.cleanup()
+
+    def fetch(self, session, **kwargs):
+        http = HTTPClient(session=session, retries=0, sleep=lambda s: None)
+        return media_fetch.fetch_to_file('http://img.example/pic.jpg', self.dest, http=http, **kwargs)
+
+    def test_plain_download(self):
+        self.fetch(FakeSession())
+        self.assertEqual(self.dest.read_bytes(), DATA)
+        self.assertFalse(self.dest.with_name('pic.jpg.part').exists())
+
+    def test_interrupted_download_resumes_with_range(self):
+        session = FakeSession(drops=1)
+        self.fetch(session)
+        self.assertEqual(self.dest.read_bytes(), DATA)
+        self.assertEqual(session.requests[1], {'Range': 'bytes=1024-'})
+
+    def test_partial_file_from_earlier_run_is_resumed(self):
+        self.dest.with_name('pic.jpg.part').write_bytes(DATA[:3000])
+        session = FakeSession()
+        self.fetch(session)
+        self.assertEqual(session.requests[0], {'Range': 'bytes=3000-'})
+        self.assertEqual(self.dest.read_bytes(), DATA)
+
+    def test_server_ignoring_range_restarts(self):
+        self.dest.with_name('pic.jpg.part').write_bytes(b'junk')
+        self.fetch(FakeSession(ranges=False))
+        self.assertEqual(self.dest.read_bytes(), DATA)
+
+    def test_too_large_is_refused_and_leaves_nothing(self):
+        with self.assertRaises(media_fetch.MediaTooLarge):
+            self.fetch(FakeSession(), max_bytes=1000)
+        with self.assertRaises(media_fetch.MediaTooLarge):
+            self.fetch(FakeSession(length=False), max_bytes=5000)
+        self.assertEqual(list(Path(self.tmp.name).iterdir()), [])
+
+    def test_persistent_failure_keeps_part_for_next_run(self):
+        with self.assertRaises(media_fetch.IncompleteDownload):
+            self.fetch(FakeSession(drops=10))
+        self.assertFalse(self.dest.exists())
+        self.assertTrue(self.dest.with_name('pic.jpg.part').exists())
+
+if __name__ == '__main__':
+    unittest.main()
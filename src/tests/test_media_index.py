@@ -0,0 +1,78 @@
+import unittest
+import tempfile
+import json
+import sys
+import os
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+from media_index import MediaIndex, canonical_url, media_name
+
+class TestCanonicalUrl(unittest.TestCase):
+    def test_equivalent_spellings_collapse(self):
+        variants = [
+            'http://ic.pics.livejournal.com/user/123/456/456_original.jpg',
+            'https://pics.livejournal.com/user/123/456/456_original.jpg',
+            'HTTPS://Pics.LiveJournal.com:443/user/123/456/456_original.jpg/',
+            'https://pics.livejournal.com/user/123/456/%34%35%36_original.jpg#top',
+        ]
+        self.assertEqual({canonical_url(u) for u in variants},
+                         {'https://pics.livejournal.com/user/123/456/456_original.jpg'})
+
+    def test_different_images_stay_different(self):
+        self.assertNotEqual(canonical_url('http://a.example/x.jpg'), canonical_url('http://b.example/x.jpg'))
+        self.assertNotEqual(canonical_url('http://a.example/x.jpg?id=1'), canonical_url('http://a.example/x.jpg?id=2'))
+        self.assertEqual(canonical_url('http://a.example/x?b=2&a=1'), canonical_url('http://a.example/x?a=1&b=2'))
+
+    def test_media_name_is_decoded_and_safe(self):
+        self.assertEqual(media_name('http://a.example/my%20cat.jpg'), 'my cat.jpg')
+        self.assertEqual(media_name('http://a.example/a%2Fb.jpg'), 'b.jpg')
+        self.assertEqual(media_name('http://a.example/'), 'image')
+
+class TestMediaIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.post1 = self.root / 'posts/2013/01/a/media'
+        self.post2 = self.root / 'posts/2013/02/b/media'
+        self.post1.mkdir(parents=True)
+        self.post2.mkdir(parents=True)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_colliding_basenames_get_unique_names(self):
+        index = MediaIndex(self.root)
+        first = index.assign('http://a.example/photo.jpg', self.post1)
+        second = index.assign('http://b.example/photo.jpg', self.post1)
+        again = index.assign('https://a.example/photo.jpg', self.post1)
+        self.assertEqual(first.name, 'photo.jpg')
+        self.assertRegex(second.name, r'^photo-[0-9a-f]{8}\.jpg$')
+        self.assertEqual(again, first)
+
+    def test_equivalent_url_is_linked_not_downloaded(self):
+        index = MediaIndex(self.root)
+        dest = index.assign('http://ic.pics.livejournal.com/u/1.jpg', self.post1)
+        dest.write_bytes(b'img')
+        index.record('http://ic.pics.livejournal.com/u/1.jpg', dest)
+        other = index.assign('https://pics.livejournal.com/u/1.jpg', self.post2)
+        self.assertTrue(index.provide('https://pics.livejournal.com/u/1.jpg', other))
+        self.assertEqual(other.read_bytes(), b'img')
+        self.assertFalse(index.provide('http://elsewhere.example/1.jpg', self.post2 / 'x.jpg'))
+
+    def test_index_persists_and_forgets_failed_names(self):
+        index = MediaIndex(self.root)
+        ok = index.assign('http://a.example/photo.jpg', self.post1)
+        ok.write_bytes(b'a')
+        index.record('http://a.example/photo.jpg', ok)
+        index.assign('http://b.example/gone.jpg', self.post1)  # download failed, no file
+        index.save()
+        saved = json.loads((self.root / 'batch-downloads/media-index.json').read_text())
+        self.assertEqual(list(saved['files']), ['posts/2013/01/a/media/photo.jpg'])
+
+        reloaded = MediaIndex(self.root)
+        self.assertEqual(reloaded.existing('https://a.example/photo.jpg'), ok)
+        self.assertNotEqual(reloaded.assign('http://c.example/photo.jpg', self.post1), ok)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+from unittest.mock import patch
+import tempfile
+import json
+import sys
+import os
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import export
+import grab_images
+import media_fetch
+from body_scan import rewrite_images
+from media_rewrite import MediaRewriter
+
+def fake_fetch(calls):
+    def fetch(url, dest, **kwargs):
+        calls.append(url)
+        if 'gone' in url:
+            raise IOError('boom')
+        Path(dest).write_bytes(url.encode())
+        return Path(dest)
+    return fetch
+
+class TestMediaRewrite(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        self.calls = []
+        self.patch = patch.object(media_fetch, 'fetch_to_file', fake_fetch(self.calls))
+        self.patch.start()
+
+    def tearDown(self):
+        self.patch.stop()
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+        export.SLUGS.clear()
+
+    def test_rewrite_images_only_touches_img_src(self):
+        text = '<img data-src="x" src="http://a/1.jpg"><a href="http://a/1.jpg">l</a><IMG SRC=http://a/2.jpg>'
+        out = rewrite_images(text, {'http://a/1.jpg': 'media/1.jpg'}.get)
+        self.assertEqual(out, '<img data-src="x" src="media/1.jpg"><a href="http://a/1.jpg">l</a><IMG SRC=http://a/2.jpg>')
+
+    def test_combine_writes_post_json_with_local_images(self):
+        posts = [{'id': str(5 << 8), 'date': '2020-02-03 04:05:06', 'subject': 'Hi',
+                  'body': '<img src="http://ic.pics.livejournal.com/u/p.jpg"> <img src="http://gone/q.png">'}]
+        comments = [{'id': 1, 'jitemid': 5, 'body': "<img src='https://pics.livejournal.com/u/p.jpg'>"}]
+        with MediaRewriter(Path('.')) as media:
+            export.combine(posts, comments, ['json'], media=media)
+        post_dir = next(Path('posts').rglob('*-1280'))
+        saved = json.loads((post_dir / 'post.json').read_text())
+        self.assertEqual(saved['post']['body'], '<img src="media/p.jpg"> <img src="http://gone/q.png">')
+        self.assertEqual(saved['comments'][0]['body'], '<img src="media/p.jpg">')
+        self.assertEqual(saved['meta']['images'], ['media/p.jpg', 'http://gone/q.png'])
+        self.assertEqual(self.calls, ['http://ic.pics.livejournal.com/u/p.jpg', 'http://gone/q.png'])
+
+        # The repair pass only retries what is still remote, and leaves finished posts alone
+        self.calls.clear()
+        grab_images.grab_images(Path('.'))
+        self.assertEqual(self.calls, ['http://gone/q.png'])
+
+    def test_upper_case_scheme_is_rewritten_too(self):
+        posts = [{'id': str(6 << 8), 'date': '2020-02-03 04:05:06', 'subject': 'Hi', 'body': '<img src="http://h/a.png">'}]
+        comments = [{'id': 1, 'jitemid': 6, 'body': '<img src="HTTP://h/a.png">'}]
+        with MediaRewriter(Path('.')) as media:
+            export.combine(posts, comments, ['json'], media=media)
+        saved = json.loads((next(Path('posts').rglob('*-1536')) / 'post.json').read_text())
+        self.assertEqual(saved['comments'][0]['body'], '<img src="media/a.png">')
+        self.assertEqual(self.calls, ['http://h/a.png'])
+
+    def test_light_scan_skips_files_without_img(self):
+        Path('plain.json').write_text('not even json, and no image tag')
+        self.assertIsNone(grab_images.scan_post('plain.json', '.'))
+
+    def test_repair_pass_rewrites_legacy_post_files(self):
+        Path('posts-json').mkdir()
+        Path('posts-json/7.json').write_text(json.dumps(
+            {'id': '7', 'body_html': '<p><img src="http://h/a.gif?v=2"></p>'}))
+        grab_images.grab_images(Path('.'), jobs=1)
+        saved = json.loads(Path('posts-json/7.json').read_text())
+        self.assertEqual(saved['body_html'], '<p><img src="media/a.gif"></p>')
+        self.assertTrue(Path('posts/unknown-date/7/media/a.gif').exists())
+        self.assertNotIn('meta', saved)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import unittest
+import socket
+import threading
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import media_scheduler
+from media_scheduler import MediaScheduler, DNSCache
+
+class TestMediaScheduler(unittest.TestCase):
+    def test_round_robin_respects_per_host_limit(self):
+        s = MediaScheduler(workers=0, per_host=1)
+        for url in ('http://a/1', 'http://a/2', 'http://a/3', 'http://b/1', 'http://c/1'):
+            s.submit(url, url, str)
+        picked = [s._next_job()[0] for _ in range(3)]
+        self.assertEqual(picked, ['a', 'b', 'c'])
+        self.assertIsNone(s._next_job())  # a is busy, b and c are drained
+        s.active['a'] -= 1
+        self.assertEqual(s._next_job()[0], 'a')
+
+    def test_same_key_is_fetched_once(self):
+        s = MediaScheduler(workers=0)
+        self.assertIs(s.submit('http://a/x', 'k', str), s.submit('http://a/x', 'k', str))
+
+    def test_slow_host_does_not_block_others(self):
+        lock = threading.Lock()
+        running = {}
+        peak = {}
+        done = []
+
+        def fetch(host, delay):
+            with lock:
+                running[host] = running.get(host, 0) + 1
+                peak[host] = max(peak.get(host, 0), running[host])
+            time.sleep(delay)
+            with lock:
+                running[host] -= 1
+                done.append(host)
+            return host
+
+        with MediaScheduler(workers=4, per_host=2, dns=DNSCache()) as s:
+            slow = [s.submit(f'http://slow/{i}', f'slow{i}', fetch, 'slow', 0.05) for i in range(6)]
+            fast = [s.submit(f'http://fast{i % 3}/{i}', f'fast{i}', fetch, 'fast', 0) for i in range(12)]
+            self.assertEqual([f.result() for f in fast], ['fast'] * 12)
+            self.assertLessEqual(peak['slow'], 2)
+            self.assertLess(done.count('slow'), 6)  # the fast hosts finished first
+            self.assertEqual([f.result() for f in slow], ['slow'] * 6)
+
+    def test_errors_are_delivered_through_the_future(self):
+        def boom():
+            raise ValueError('bad')
+        with MediaScheduler(workers=1, dns=DNSCache()) as s:
+            future = s.submit('http://a/x', 'x', boom)
+            with self.assertRaises(ValueError):
+                future.result()
+
+class TestDNSCache(unittest.TestCase):
+    def test_lookups_and_failures_are_cached(self):
+        calls = []
+
+        def resolve(host, port, *args):
+            calls.append(host)
+            if host == 'gone.example':
+                raise socket.gaierror(-2, 'Name or service not known')
+            return [('addr', host)]
+
+        dns = DNSCache()
+        dns._resolve = resolve
+        self.assertEqual(dns.getaddrinfo('a.example', 80), [('addr', 'a.example')])
+        dns.getaddrinfo('a.example', 80)
+        for _ in range(2):
+            with self.assertRaises(socket.gaierror):
+                dns.getaddrinfo('gone.example', 80)
+        self.assertEqual(calls, ['a.example', 'gone.example'])
+
+    def test_failures_expire_sooner_than_lookups(self):
+        now = [0.0]
+        calls = []
+
+        def resolve(host, port, *args):
+            calls.append(host)
+            if host == 'flaky.example' and calls.count(host) == 1:
+                raise socket.gaierror(-3, 'Temporary failure in name resolution')
+            return [('addr', host)]
+
+        dns = DNSCache(ttl=300, clock=lambda: now[0], negative_ttl=5)
+        dns._resolve = resolve
+        with self.assertRaises(socket.gaierror):
+            dns.getaddrinfo('flaky.example', 80)
+        dns.getaddrinfo('a.example', 80)
+        now[0] = 6
+        self.assertEqual(dns.getaddrinfo('flaky.example', 80), [('addr', 'flaky.example')])
+        dns.getaddrinfo('a.example', 80)
+        self.assertEqual(calls, ['flaky.example', 'a.example', 'flaky.example'])
+
+    def test_install_and_uninstall(self):
+        original = socket.getaddrinfo
+        dns = DNSCache()
+        dns.install()
+        try:
+            self.assertEqual(socket.getaddrinfo, dns.getaddrinfo)
+        finally:
+            dns.uninstall()
+        self.assertIs(socket.getaddrinfo, original)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+import tempfile
+import json
+import sys
+import os
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import offline
+
+def entry(itemid, logtime, subject, body):
+    return (f'<entry><itemid>{itemid}</itemid><eventtime>{logtime}</eventtime><logtime>{logtime}</logtime>'
+            f'<subject>{subject}</subject><event>{body}</event><security>public</security>'
+            f'<allowmask>0</allowmask><current_music></current_music><current_mood></current_mood></entry>')
+
+def comment(cid, jitemid, body, posterid=7, parentid=None, state=None):
+    attrs = f'id="{cid}" jitemid="{jitemid}" posterid="{posterid}"'
+    attrs += f' parentid="{parentid}"' if parentid else ''
+    attrs += f' state="{state}"' if state else ''
+    return f'<comment {attrs}><date>2020-01-05T10:00:00Z</date><body>{body}</body></comment>'
+
+class TestOfflineArchive(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        self.batch = Path('batch-downloads')
+        for sub in ('posts-xml', 'comments-xml', 'comments-json'):
+            (self.batch / sub).mkdir(parents=True)
+        self.write('posts-xml/2020-02.xml', '<livejournal>' + entry(513, '2020-02-01 09:00:00', 'Feb', 'second') + '</livejournal>')
+        self.write('posts-xml/2020-01.xml', '<livejournal>' + entry(257, '2020-01-01 09:00:00', 'Jan', 'first') + '</livejournal>')
+        self.write('comments-xml/comments_257.xml', '<livejournal><comments>'
+                   + comment(1, 1, 'old reply') + comment(2, 1, 'answer', posterid=8, parentid=1)
+                   + '</comments></livejournal>')
+        self.write('comments-xml/comment_body-1.xml', '<livejournal><comments>'
+                   + comment(1, 1, 'edited reply') + '</comments></livejournal>')
+        self.write('comments-xml/notes.xml', '<unrelated/>')
+        self.write('comments-json/usermap.json', json.dumps({'7': 'alice'}))
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def write(self, rel, text):
+        (self.batch / rel).write_text(text, encoding='utf-8')
+
+    def test_rebuilds_posts_in_month_order_and_comments_with_authors(self):
+        posts, comments = offline.load_archive()
+        self.assertEqual([p['id'] for p in posts], ['257', '513'])
+        self.assertEqual(posts[0]['body'], 'first')
+        self.assertEqual([c['id'] for c in comments], [1, 2])
+        self.assertEqual(comments[0]['body'], 'edited reply')  # the --sync page is newer
+        self.assertEqual(comments[0]['author'], 'alice')
+        self.assertEqual(comments[1]['author'], 'deleted-user')
+        self.assertEqual(comments[1]['parentid'], 1)
+
+    def test_sync_records_override_the_raw_pages(self):
+        self.write('posts-index.json', json.dumps([
+            {'id': '513', 'date': '2020-02-01 09:00:00', 'subject': 'Feb', 'body': 'edited'},
+            {'id': '769', 'date': '2020-03-01 09:00:00', 'subject': 'Mar', 'body': 'new'},
+        ]))
+        self.write('comments-json/all.json', json.dumps([{'id': 2, 'jitemid': 1, 'children': [], 'state': 'D'}]))
+        posts, comments = offline.load_archive()
+        self.assertEqual([(p['id'], p['body']) for p in posts], [('257', 'first'), ('513', 'edited'), ('769', 'new')])
+        self.assertEqual(comments[1]['state'], 'D')
+        self.assertEqual(comments[1]['body'], 'answer')
+
+    def test_only_posts_recorded_as_deleted_are_dropped(self):
+        self.write('posts-index.json', json.dumps([{'id': '513', 'date': '2020-02-01 09:00:00', 'subject': 'Feb', 'body': 'x'}]))
+        self.write('posts-deleted.json', json.dumps(['513']))
+        posts, _ = offline.load_archive()
+        self.assertEqual([p['id'] for p in posts], ['257'])
+
+    def test_process_pool_matches_serial_load(self):
+        for month in range(3, 13):
+            self.write(f'posts-xml/2020-{month:02d}.xml',
+                       '<livejournal>' + entry(month << 8 | 1, f'2020-{month:02d}-01 09:00:00', 'M', 'b') + '</livejournal>')
+        for cid in range(3, 20):
+            self.write(f'comments-xml/comment_body-{cid}.xml',
+                       '<livejournal><comments>' + comment(cid, cid % 4 + 1, f'c{cid}') + '</comments></livejournal>')
+        serial = offline.load_archive(jobs=1)
+        pooled = offline.load_archive(jobs=3)
+        self.assertEqual(pooled, serial)
+        self.assertEqual([p['id'] for p in pooled[0]][:3], ['257', '513', str(3 << 8 | 1)])
+        self.assertEqual(pooled[1][0]['author'], 'alice')  # usermap reaches the workers
+
+    def test_missing_archive_is_an_error(self):
+        os.chdir(self.cwd)
+        with tempfile.TemporaryDirectory() as empty:
+            with self.assertRaises(FileNotFoundError):
+                offline.load_archive(Path(empty) / 'batch-downloads')
+
+if __name__ == '__main__':
+    unittest.main()
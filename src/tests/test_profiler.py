@@ -0,0 +1,41 @@
+import unittest
+import tempfile
+import json
+import sys
+import os
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import profiler
+
+class TestStageProfiler(unittest.TestCase):
+    def test_disabled_writes_nothing(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            prof = profiler.StageProfiler(tmp, enabled=False)
+            with prof.stage("post-fetch"):
+                sum(range(1000))
+            self.assertFalse((Path(tmp) / "profile").exists())
+
+    def test_stage_writes_reports(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            prof = profiler.StageProfiler(tmp, enabled=True, top_n=5)
+            with prof.stage("combine"):
+                data = [str(i) * 10 for i in range(10000)]
+            out = Path(tmp) / "profile"
+            self.assertTrue((out / "combine.prof").exists())
+            self.assertTrue((out / "combine-alloc.txt").exists())
+            summary = json.loads((out / "summary.json").read_text())
+            self.assertIn("combine", summary)
+            self.assertIn("peak_rss_kb", summary["combine"])
+
+    def test_summary_is_merged_across_runs(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with profiler.StageProfiler(tmp, enabled=True).stage("post-fetch"):
+                pass
+            with profiler.StageProfiler(tmp, enabled=True).stage("image-rewrite"):
+                pass
+            summary = json.loads((Path(tmp) / "profile" / "summary.json").read_text())
+            self.assertEqual(set(summary), {"post-fetch", "image-rewrite"})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+from unittest.mock import patch
+import io
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import progress
+
+class TestStageProgress(unittest.TestCase):
+    def test_format_duration(self):
+        self.assertEqual(progress.format_duration(None), '?')
+        self.assertEqual(progress.format_duration(42), '42s')
+        self.assertEqual(progress.format_duration(185), '3m05s')
+        self.assertEqual(progress.format_duration(3720), '1h02m')
+
+    def test_status_line_reports_remaining_and_eta(self):
+        p = progress.StageProgress('posts', total=10, unit='months', stream=io.StringIO(), mode='line', interval=3600)
+        with patch('progress.time.monotonic', return_value=p.started + 4):
+            p.advance(2)
+            line = p.status_line()
+        self.assertIn('[posts] 2/10 months (20%), 8 remaining', line)
+        self.assertIn('0.50 months/s', line)
+        self.assertIn('ETA 16s', line)
+
+    def test_eta_unknown_without_total(self):
+        p = progress.StageProgress('images', stream=io.StringIO(), mode='off')
+        p.advance()
+        self.assertIsNone(p.eta())
+        self.assertIn('ETA ?', p.status_line())
+
+    def test_request_tracks_in_flight(self):
+        p = progress.StageProgress('comments', total=1, stream=io.StringIO(), mode='off')
+        with p.request():
+            self.assertEqual(p.in_flight, 1)
+        self.assertEqual(p.in_flight, 0)
+
+    def test_line_mode_prints_periodically_and_on_close(self):
+        out = io.StringIO()
+        p = progress.StageProgress('posts', total=3, stream=out, mode='line', interval=0)
+        p.advance()
+        p.close()
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[-1].startswith('[posts] 1/3'))
+
+    @patch.dict(os.environ, {'PROGRESS_MODE': 'off'})
+    def test_mode_override(self):
+        p = progress.StageProgress('posts', total=1, stream=io.StringIO())
+        self.assertEqual(p.mode, 'off')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import unittest
+from unittest.mock import patch
+import tempfile
+import json
+import sys
+import os
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import render
+
+class TestRenderEngine(unittest.TestCase):
+    def test_html_to_markdown(self):
+        engine = render.RenderEngine()
+        self.assertEqual(engine.html_to_markdown('<p>hello <b>world</b></p>').strip(), 'hello **world**')
+
+    def test_html_to_markdown_does_not_depend_on_earlier_documents(self):
+        engine = render.RenderEngine()
+        engine.html_to_markdown('<table><tr><td>a</td></tr></table>')
+        self.assertEqual(engine.html_to_markdown('<ol><li>one<li>two'),
+                         render.RenderEngine().html_to_markdown('<ol><li>one<li>two'))
+        self.assertEqual(engine.html_to_markdown('<ol><li>one<li>two').strip(), '1. one\n  2. two')
+
+    def test_markdown_to_html_reuses_instance(self):
+        engine = render.RenderEngine()
+        self.assertEqual(engine.markdown_to_html('*a*'), '<p><em>a</em></p>')
+        md = engine._md
+        self.assertEqual(engine.markdown_to_html('- b'), '<ul>\n<li>b</li>\n</ul>')
+        self.assertIs(engine._md, md)
+
+    def test_repeated_content_is_memoized(self):
+        engine = render.RenderEngine()
+        for _ in range(3):
+            engine.markdown_to_html('+1')
+        self.assertEqual((engine.hits, engine.misses), (2, 1))
+
+    def test_disk_cache_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'render-cache.json'
+            first = render.RenderEngine(path)
+            html = first.markdown_to_html('quoted text')
+            first.save()
+            second = render.RenderEngine(path)
+            with patch.object(second, '_markdown', side_effect=AssertionError('converter should not run')):
+                self.assertEqual(second.markdown_to_html('quoted text'), html)
+            self.assertEqual(second.hits, 1)
+
+    def test_disk_cache_dropped_on_version_change(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'render-cache.json'
+            key = render.content_key('md', 'x')
+            path.write_text(json.dumps({'version': 'old', 'entries': {key: 'stale'}}))
+            engine = render.RenderEngine(path)
+            self.assertEqual(engine.markdown_to_html('x'), '<p>x</p>')
+
+    def test_drain_and_merge_worker_conversions(self):
+        worker = render.RenderEngine()
+        html = worker.markdown_to_html('from a worker')
+        entries = worker.drain_new()
+        self.assertEqual(list(entries.values()), [html])
+        self.assertEqual(worker.drain_new(), {})
+        parent = render.RenderEngine()
+        parent.merge(entries)
+        with patch.object(parent, '_markdown', side_effect=AssertionError('converter should not run')):
+            self.assertEqual(parent.markdown_to_html('from a worker'), html)
+
+    def test_save_drops_entries_unused_this_run_beyond_the_cap(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'render-cache.json'
+            first = render.RenderEngine(path)
+            for text in ('old', 'older edit', 'kept'):
+                first.markdown_to_html(text)
+            first.save()
+            second = render.RenderEngine(path)
+            second.markdown_to_html('kept')
+            second.markdown_to_html('new')
+            with patch.object(render, 'CACHE_MAX_ENTRIES', 3):
+                second.save()
+            saved = json.loads(path.read_text())['entries']
+            self.assertEqual(list(saved), [render.content_key('md', t) for t in ('older edit', 'kept', 'new')])
+
+    def test_worker_hits_count_as_used(self):
+        worker = render.RenderEngine()
+        worker.cache[render.content_key('md', 'x')] = '<p>x</p>'
+        worker._loaded = True
+        worker.markdown_to_html('x')
+        parent = render.RenderEngine()
+        parent.merge(worker.drain_new(), worker.drain_used())
+        self.assertEqual(parent.used, {render.content_key('md', 'x')})
+        self.assertEqual(worker.used, set())
+
+    def test_save_without_changes_writes_nothing(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'render-cache.json'
+            render.RenderEngine(path).save()
+            self.assertFalse(path.exists())
+
+if __name__ == '__main__':
+    unittest.main()
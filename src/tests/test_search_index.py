@@ -0,0 +1,46 @@
+import unittest
+import tempfile
+import json
+import sys
+import os
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import search_index
+
+def read_js(path, call):
+    text = path.read_text(encoding='utf-8')
+    assert text.startswith(call) and text.endswith(');\n')
+    return json.loads(text[len(call):-3])
+
+class TestSearchIndex(unittest.TestCase):
+    def test_tokenize_drops_link_targets_and_short_words(self):
+        terms = search_index.tokenize('A [Кошка](http://example.com/cat.jpg) ate 2 fish_sticks')
+        self.assertEqual(terms, {'кошка', 'ate', 'fish_sticks'})
+
+    def test_shard_name_is_hex_prefix(self):
+        self.assertEqual(search_index.shard_name('cats'), 'ca'.encode().hex())
+        self.assertEqual(search_index.shard_name('кот'), 'ко'.encode('utf-8').hex())
+
+    def test_delta_encode(self):
+        self.assertEqual(search_index.delta_encode([7, 2, 3]), [2, 1, 4])
+
+    def test_write_shards_docs_and_page(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp) / 'search'
+            index = search_index.SearchIndex(root)
+            index.add_post('One', '2010-01-01 00:00:00', '../a.html', ['cats and dogs'])
+            index.add_post('Two', '2011-01-01 00:00:00', '../b.html', ['cats', 'reply about cars'])
+            (root / 'shards').mkdir(parents=True)
+            (root / 'shards' / 'ffff.js').write_text('stale')
+            index.write()
+            shard = read_js(root / 'shards' / f"{search_index.shard_name('ca')}.js",
+                            f'LJSearch.shard("{search_index.shard_name("ca")}",')
+            self.assertEqual(shard, {'cats': [0, 1], 'cars': [1]})
+            docs = read_js(root / 'docs.js', 'LJSearch.docs(')
+            self.assertEqual(docs[1], ['Two', '2011-01-01 00:00:00', '../b.html'])
+            self.assertTrue((root / 'index.html').exists())
+            self.assertFalse((root / 'shards' / 'ffff.js').exists())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import unittest
+import tempfile
+import json
+import sys
+import os
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import site_builder
+
+def make_post(pid, date, subject='', taglist=''):
+    return {'id': str(pid), 'date': date, 'subject': subject, 'body': f'body {pid}', 'taglist': taglist}
+
+class TestSiteBuilder(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name) / 'site'
+        self.rendered = []
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def render_body(self, post, comments):
+        self.rendered.append(post['id'])
+        return f"<article>{post['body']}</article><p>{len(comments)} comments</p>"
+
+    def build(self, posts, comments=None, per_page=20, months=None):
+        builder = site_builder.SiteBuilder(self.root, per_page=per_page, months=months)
+        for post in posts:
+            builder.add_post(post, (comments or {}).get(post['id']))
+        builder.build(self.render_body)
+        return builder
+
+    def posts(self):
+        return [
+            make_post(256, '2010-01-05 10:00:00', 'First', 'cats, travel'),
+            make_post(512, '2010-02-07 11:00:00', 'Second', 'cats'),
+            make_post(768, '2011-03-01 12:00:00', 'Third'),
+        ]
+
+    def test_layout_and_navigation(self):
+        self.build(self.posts())
+        for page in ('index.html', '2010/index.html', '2010/01/index.html', '2011/03/index.html',
+                     '2010/02/512.html', 'tags/cats/index.html', 'tags/travel/index.html'):
+            self.assertTrue((self.root / page).exists(), page)
+        middle = (self.root / '2010/02/512.html').read_text()
+        self.assertIn("rel='prev' href='../01/256.html'", middle)
+        self.assertIn("rel='next' href='../../2011/03/768.html'", middle)
+        self.assertIn("href='../../tags/cats/index.html'", middle)
+        index = (self.root / 'index.html').read_text()
+        self.assertLess(index.index('Third'), index.index('First'))
+
+    def test_pagination(self):
+        self.build(self.posts(), per_page=2)
+        self.assertIn("href='page-2.html'", (self.root / 'index.html').read_text())
+        page2 = (self.root / 'page-2.html').read_text()
+        self.assertIn('First', page2)
+        self.assertIn("rel='prev' href='index.html'", page2)
+
+    def test_rerun_rebuilds_only_changed_pages(self):
+        self.build(self.posts())
+        self.rendered.clear()
+        builder = self.build(self.posts(), comments={'512': [{'id': 1, 'jitemid': 2, 'body': 'new'}]})
+        self.assertEqual(self.rendered, ['512'])
+        self.assertEqual(builder.built, 1)
+        self.assertIn('1 comments', (self.root / '2010/02/512.html').read_text())
+        manifest = json.loads((self.root / site_builder.MANIFEST).read_text())
+        self.assertEqual(manifest['2010/02/512.html']['sources']['post'], '512')
+
+    def test_new_post_updates_neighbours_and_indexes(self):
+        self.build(self.posts())
+        self.rendered.clear()
+        builder = self.build(self.posts() + [make_post(1024, '2012-01-01 00:00:00', 'Fourth')])
+        self.assertEqual(sorted(self.rendered), ['1024', '768'])
+        self.assertTrue((self.root / '2012/01/index.html').exists())
+        self.assertIn('Fourth', (self.root / 'index.html').read_text())
+        self.assertGreater(builder.skipped, 0)
+
+    def test_stale_pages_removed(self):
+        self.build(self.posts(), per_page=2)
+        self.build(self.posts()[:2], per_page=2)
+        self.assertFalse((self.root / 'page-2.html').exists())
+        self.assertFalse((self.root / '2011/03/768.html').exists())
+
+    def test_narrower_rerun_keeps_pages_outside_the_range(self):
+        self.build(self.posts())
+        self.rendered.clear()
+        builder = self.build(self.posts()[1:2], months=('2010-02', '2010-02'))
+        self.assertEqual(self.rendered, [])
+        self.assertGreater(builder.skipped, 0)
+        for page in ('2010/01/256.html', '2011/03/768.html', '2010/01/index.html', 'tags/travel/index.html'):
+            self.assertTrue((self.root / page).exists(), page)
+        index = (self.root / 'index.html').read_text()
+        self.assertIn('First', index)
+        self.assertIn('Third', index)
+        # A post gone from the rebuilt range is still pruned
+        self.build([], months=('2010-02', '2010-02'))
+        self.assertFalse((self.root / '2010/02/512.html').exists())
+        self.assertTrue((self.root / '2010/01/256.html').exists())
+
+    def test_tags_from_badges_when_post_has_no_taglist(self):
+        body = ('<a href="http://utx.ambience.ru/t/1"><img alt="cats" src="http://utx.ambience.ru/img/1.png"></a>'
+                '<a href="http://utx.ambience.ru/t/2"><img src="http://utx.ambience.ru/img/2.png" alt="travel"></a>')
+        post = {'id': '256', 'date': '2010-01-05 10:00:00', 'subject': 'x', 'body': body}
+        self.assertEqual(site_builder.post_tags(post), ['cats', 'travel'])
+        self.assertEqual(site_builder.post_tags(dict(post, taglist='dogs')), ['dogs'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+from unittest.mock import patch
+import tempfile
+import json
+import sys
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import sync_posts
+
+def event(itemid, anum, subject, eventtime='2013-07-01 10:00:00'):
+    return {'itemid': itemid, 'anum': anum, 'subject': subject, 'event': f'body {itemid}',
+            'eventtime': eventtime, 'props': {'taglist': 'cats, dogs'}}
+
+class TestSyncPosts(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_event_to_json_matches_export_shape(self):
+        post = sync_posts.event_to_json(event(3, 7, 'Hi'))
+        self.assertEqual(post['id'], str(3 * 256 + 7))
+        self.assertEqual(post['date'], '2013-07-01 10:00:00')
+        self.assertEqual(post['taglist'], 'cats, dogs')
+        self.assertEqual(post['body'], 'body 3')
+
+    def test_changed_items_pages_until_total(self):
+        pages = [
+            {'syncitems': [{'item': 'L-1', 'action': 'create', 'time': '2020-01-01 00:00:00'},
+                           {'item': 'C-9', 'action': 'update', 'time': '2020-01-02 00:00:00'}], 'count': 2, 'total': 3},
+            {'syncitems': [{'item': 'L-2', 'action': 'update', 'time': '2020-01-03 00:00:00'}], 'count': 1, 'total': 1},
+        ]
+        with patch.object(sync_posts, 'call', side_effect=pages) as rpc:
+            items, cursor = sync_posts.changed_items({}, {}, '2019-12-31 00:00:00')
+        self.assertEqual(items, {1: 'create', 2: 'update'})
+        self.assertEqual(cursor, '2020-01-03 00:00:00')
+        self.assertEqual(rpc.call_args_list[1].args[1], {'lastsync': '2020-01-02 00:00:00'})
+
+    def test_without_baseline_returns_none(self):
+        with patch.object(sync_posts, 'call') as rpc:
+            self.assertIsNone(sync_posts.sync_posts({}, {}))
+        rpc.assert_not_called()
+
+    def test_sync_updates_changed_posts_only(self):
+        old = {'id': str(1 * 256 + 5), 'date': '2013-06-01 09:00:00', 'subject': 'Old', 'body': 'x'}
+        kept = {'id': str(2 * 256 + 1), 'date': '2013-06-02 09:00:00', 'subject': 'Kept', 'body': 'y'}
+        gone = {'id': str(4 * 256 + 1), 'date': '2013-06-03 09:00:00', 'subject': 'Gone', 'body': 'z'}
+        sync_posts.record_full_export([old, kept, gone], now=datetime(2020, 1, 2, tzinfo=timezone.utc))
+        self.assertEqual(sync_posts.load_lastsync(), '2020-01-01 00:00:00')
+
+        def rpc(method, params, cookies, headers):
+            if method == 'LJ.XMLRPC.syncitems':
+                return {'syncitems': [
+                    {'item': 'L-1', 'action': 'update', 'time': '2020-01-05 00:00:00'},
+                    {'item': 'L-3', 'action': 'create', 'time': '2020-01-06 00:00:00'},
+                    {'item': 'L-4', 'action': 'del', 'time': '2020-01-06 00:00:00'},
+                ], 'count': 3, 'total': 3}
+            self.assertEqual(params['itemids'], '1,3,4')
+            return {'events': [event(1, 5, 'Edited', '2013-06-01 09:00:00'), event(3, 9, 'New')]}
+
+        with patch.object(sync_posts, 'call', side_effect=rpc):
+            posts, changed = sync_posts.sync_posts({}, {})
+        self.assertEqual(changed, {1, 3, 4})
+        by_id = {p['id']: p['subject'] for p in posts}
+        self.assertEqual(by_id, {old['id']: 'Edited', kept['id']: 'Kept', str(3 * 256 + 9): 'New'})
+        self.assertEqual(sync_posts.load_lastsync(), '2020-01-06 00:00:00')
+        saved = json.loads(next(Path('posts').rglob(f"*-{old['id']}/post.json")).read_text())
+        self.assertEqual(saved['subject'], 'Edited')
+        self.assertEqual(sync_posts.load_deleted(), {gone['id']})
+
+    def test_narrower_full_export_keeps_earlier_posts(self):
+        jan = {'id': '257', 'date': '2013-01-01 09:00:00', 'subject': 'Jan', 'body': 'a'}
+        feb = {'id': '513', 'date': '2013-02-01 09:00:00', 'subject': 'Feb', 'body': 'b'}
+        sync_posts.record_full_export([jan, feb])
+        sync_posts.record_full_export([dict(feb, subject='Feb again')])
+        index = sync_posts.load_posts_index()
+        self.assertEqual({pid: p['subject'] for pid, p in index.items()}, {'257': 'Jan', '513': 'Feb again'})
+
+if __name__ == '__main__':
+    unittest.main()